@@ -0,0 +1,172 @@
+"""Admission control for expensive endpoints.
+
+- ``AdmissionController`` bounds concurrent requests and the queue in front
+  of them. It sheds load quickly (503 + Retry-After) instead of letting
+  requests sit until the worker timeout.
+- ``RateLimiter`` keeps a token bucket per client (429 + Retry-After).
+- ``ConcurrencyLimiter`` caps concurrent outbound calls (Gemini).
+
+All limits are per worker process.
+"""
+import math
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from metrics import METRICS
+
+
+class AdmissionController:
+    def __init__(self, max_in_flight, max_queue, queue_timeout_s, name="predict"):
+        self.max_in_flight = max(1, int(max_in_flight))
+        self.max_queue = max(0, int(max_queue))
+        self.queue_timeout_s = queue_timeout_s
+        self.name = name
+        self.in_flight = 0
+        self.waiting = 0
+        self._service_s = None
+        self._cond = threading.Condition()
+
+    def _publish(self):
+        METRICS.set_gauge(f"{self.name}_in_flight", self.in_flight)
+        METRICS.set_gauge(f"{self.name}_queue_depth", self.waiting)
+
+    def acquire(self):
+        """Try to get a slot. Returns ``(admitted, wait_ms, reason)``."""
+        start = time.perf_counter()
+        with self._cond:
+            if self.in_flight >= self.max_in_flight:
+                if self.waiting >= self.max_queue:
+                    METRICS.inc(f"{self.name}_shed_queue_full")
+                    return False, 0.0, "queue_full"
+                self.waiting += 1
+                self._publish()
+                deadline = start + self.queue_timeout_s
+                try:
+                    while self.in_flight >= self.max_in_flight:
+                        remaining = deadline - time.perf_counter()
+                        if remaining <= 0:
+                            METRICS.inc(f"{self.name}_shed_queue_timeout")
+                            return False, (time.perf_counter() - start) * 1000.0, "queue_timeout"
+                        self._cond.wait(remaining)
+                finally:
+                    self.waiting -= 1
+            self.in_flight += 1
+            self._publish()
+        wait_ms = (time.perf_counter() - start) * 1000.0
+        METRICS.inc(f"{self.name}_admitted")
+        METRICS.observe(f"{self.name}_queue_wait_ms", wait_ms)
+        return True, wait_ms, None
+
+    def release(self, service_s=None):
+        with self._cond:
+            self.in_flight -= 1
+            if service_s is not None:
+                # smoothed service time, used for Retry-After estimates
+                self._service_s = service_s if self._service_s is None else 0.8 * self._service_s + 0.2 * service_s
+            self._publish()
+            self._cond.notify()
+
+    def retry_after(self):
+        """Seconds a shed client should wait, from queue depth and service time."""
+        with self._cond:
+            service = self._service_s or 1.0
+            backlog = self.waiting + self.in_flight
+        return max(1, int(math.ceil(service * backlog / self.max_in_flight)))
+
+    def snapshot(self):
+        with self._cond:
+            return {
+                "in_flight": self.in_flight,
+                "waiting": self.waiting,
+                "max_in_flight": self.max_in_flight,
+                "max_queue": self.max_queue,
+            }
+
+
+def threads_to_shed(max_in_flight, max_queue):
+    """Server threads per worker needed for an ``AdmissionController`` to shed.
+
+    Every admitted and queued request holds a thread, and one more thread
+    must reach the app to be rejected; with fewer threads the excess waits
+    in the server's socket backlog instead of getting a 503.
+    """
+    return max(1, int(max_in_flight)) + max(0, int(max_queue)) + 1
+
+
+class TokenBucket:
+    def __init__(self, rate_per_s, burst):
+        self.rate = rate_per_s
+        self.capacity = max(1.0, float(burst))
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def take(self, now=None):
+        """Take one token. Returns ``(allowed, retry_after_s)``."""
+        now = time.monotonic() if now is None else now
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1.0:
+            self.tokens -= 1.0
+            return True, 0.0
+        return False, (1.0 - self.tokens) / self.rate if self.rate > 0 else 60.0
+
+
+class RateLimiter:
+    """Per-client token buckets, keeping at most ``max_clients`` (LRU)."""
+
+    def __init__(self, per_minute, burst, max_clients=10000):
+        self.rate = per_minute / 60.0
+        self.burst = burst
+        self.max_clients = max_clients
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return self.rate > 0
+
+    def check(self, client_id):
+        if not self.enabled:
+            return True, 0
+        with self._lock:
+            bucket = self._buckets.pop(client_id, None) or TokenBucket(self.rate, self.burst)
+            self._buckets[client_id] = bucket
+            while len(self._buckets) > self.max_clients:
+                self._buckets.popitem(last=False)
+            allowed, retry = bucket.take()
+        if not allowed:
+            METRICS.inc("rate_limited")
+        return allowed, max(1, int(math.ceil(retry)))
+
+
+class ConcurrencyLimiter:
+    """Cap concurrent calls to a dependency; callers give up after ``timeout_s``."""
+
+    def __init__(self, limit, timeout_s, name):
+        self._sem = threading.BoundedSemaphore(max(1, int(limit)))
+        self.timeout_s = timeout_s
+        self.name = name
+        self._active = 0
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def slot(self):
+        """Yield ``True`` when a slot was acquired, ``False`` when it timed out."""
+        start = time.perf_counter()
+        if not self._sem.acquire(timeout=self.timeout_s):
+            METRICS.inc(f"{self.name}_shed")
+            yield False
+            return
+        METRICS.observe(f"{self.name}_wait_ms", (time.perf_counter() - start) * 1000.0)
+        with self._lock:
+            self._active += 1
+            METRICS.set_gauge(f"{self.name}_in_flight", self._active)
+        try:
+            yield True
+        finally:
+            with self._lock:
+                self._active -= 1
+                METRICS.set_gauge(f"{self.name}_in_flight", self._active)
+            self._sem.release()
@@ -1,6 +1,7 @@
 from flask import Flask, request, jsonify
 from flask_cors import CORS
 import os
+import sys
 
 app = Flask(__name__)
 CORS(app)
@@ -37,3 +38,13 @@ def predict():
 
 
 # ⚠️ DO NOT USE app.run() ON VERCEL
+
+
+# ---------------------------
+# Full backend (opt-in)
+# ---------------------------
+# Set API_FULL_APP=true to serve the real backend instead of the stub above.
+# The deployment must then include the model files and their dependencies.
+if os.getenv("API_FULL_APP", "").strip().lower() in ("1", "true", "yes", "on"):
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    from app import app  # noqa: E402,F811
@@ -1,8 +1,12 @@
 from dotenv import load_dotenv
-from flask import Flask, request, jsonify, send_from_directory
+from flask import Flask, request, jsonify, send_from_directory, Response, g, make_response
 from flask_cors import CORS
+from functools import wraps
 import os
 import uuid
+import time
+import signal
+import threading
 import sqlite3
 import json
 from datetime import datetime
@@ -12,22 +16,43 @@ import pathlib
 import google.generativeai as genai
 from dotenv import load_dotenv
 
+import config
+from admission import AdmissionController, ConcurrencyLimiter, RateLimiter
+from circuit_breaker import CircuitBreaker, CircuitOpenError
+from embeddings import EmbeddingIndex, build_embedding_model, embedding_predict
+from gemini_batch import build_batch_prompt, parse_batch_response
+from labels import (
+    LabelRegistry,
+    alternatives_for,
+    crop_marginals,
+    postprocess_batch,
+    restrict_to_crops,
+    within_crop_alternatives,
+    temperature_scale,
+)
+from metrics import METRICS
+from model_registry import READY, ModelRegistry, file_version, read_control, warm_up, write_control
+from tta import run_tta
+from uploads import UploadError, check_image, receive_upload
+from quality import assess_image, open_thumbnail
+from response_format import (
+    MSGPACK_AVAILABLE,
+    choose_encoding,
+    compact_payload,
+    encode,
+    select_fields,
+    wants_compact,
+    wants_msgpack,
+)
+from runtime import configure_tensorflow
+from profiling import PROFILE_STORE, profile_request, to_collapsed, to_speedscope
+
 
 load_dotenv()
 
 MODEL = None
 MODEL_AVAILABLE = False
 
-try:
-    MODEL = model
-    MODEL_AVAILABLE = True
-    print("✅ ML Model loaded successfully")
-except Exception as e:
-    print(f"⚠️ Warning: ML model failed to load: {e}")
-    print("🔄 Continuing without ML model - using Gemini API only")
-    MODEL = None
-    MODEL_AVAILABLE = False
-
 MODEL_PATH = os.path.join(os.path.dirname(__file__), "models/MobileNetV2_best.h5")
 LABELS_PATH = os.path.join(os.path.dirname(__file__), "models/class_labels.json")
 UPLOAD_FOLDER = os.path.join(os.path.dirname(__file__), "uploads")
@@ -39,25 +64,63 @@ os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 
 app = Flask(__name__)
 CORS(app)
+# Bodies over the limit get 413 before they are read
+app.config["MAX_CONTENT_LENGTH"] = config.MAX_REQUEST_BYTES
+app.config["MAX_FORM_MEMORY_SIZE"] = config.MAX_REQUEST_BYTES
+# PIL refuses to decode anything with more than twice this many pixels
+Image.MAX_IMAGE_PIXELS = config.MAX_IMAGE_PIXELS
+
+# Load shedding for /api/predict and a cap on concurrent Gemini calls (per worker)
+PREDICT_ADMISSION = AdmissionController(
+    config.ADMISSION_MAX_IN_FLIGHT, config.ADMISSION_MAX_QUEUE, config.ADMISSION_QUEUE_TIMEOUT_S
+)
+RATE_LIMITER = RateLimiter(config.RATE_LIMIT_PER_MINUTE, config.RATE_LIMIT_BURST)
+GEMINI_LIMITER = ConcurrencyLimiter(config.GEMINI_MAX_CONCURRENCY, config.GEMINI_QUEUE_TIMEOUT_S, "gemini")
+
+# Timeouts, retries and fail-fast for Gemini calls
+GEMINI_BREAKER = CircuitBreaker(
+    "gemini",
+    failure_threshold=config.GEMINI_FAILURE_THRESHOLD,
+    reset_timeout_s=config.GEMINI_RESET_TIMEOUT_S,
+    call_timeout_s=config.GEMINI_CALL_TIMEOUT_S,
+    max_retries=config.GEMINI_MAX_RETRIES,
+    budget_s=config.GEMINI_LATENCY_BUDGET_S,
+    max_workers=max(config.GEMINI_MAX_CONCURRENCY * 2, 2),
+)
 
 # Initialize Gemini API (lazy - will initialize on first use)
 GEMINI_CLIENT = None
 GEMINI_INITIALIZED = False
+GEMINI_INIT_FAILED_AT = None
 
 def init_gemini():
-    global GEMINI_CLIENT, GEMINI_INITIALIZED
-    if not GEMINI_INITIALIZED:
-        try:
-            print("Initializing Gemini API...")
-            client = genai.Client(api_key=GEMINI_API_KEY)
-            GEMINI_CLIENT = client
-            GEMINI_INITIALIZED = True
-            print("✅ Gemini API initialized successfully")
-        except Exception as e:
-            print(f"⚠️ Warning: Gemini API initialization failed: {e}")
-            GEMINI_INITIALIZED = True  # Mark as initialized so we don't retry
+    global GEMINI_CLIENT, GEMINI_INITIALIZED, GEMINI_INIT_FAILED_AT
+    if GEMINI_INITIALIZED:
+        return GEMINI_CLIENT
+    if not GEMINI_API_KEY:
+        return None
+    # after a failure, wait before trying to build the client again
+    if GEMINI_INIT_FAILED_AT and time.monotonic() - GEMINI_INIT_FAILED_AT < config.GEMINI_INIT_RETRY_S:
+        return None
+    try:
+        print("Initializing Gemini API...")
+        client = genai.Client(api_key=GEMINI_API_KEY)
+        GEMINI_CLIENT = client
+        GEMINI_INITIALIZED = True
+        GEMINI_INIT_FAILED_AT = None
+        print("✅ Gemini API initialized successfully")
+    except Exception as e:
+        print(f"⚠️ Warning: Gemini API initialization failed: {e}")
+        GEMINI_INIT_FAILED_AT = time.monotonic()
     return GEMINI_CLIENT
 
+configure_tensorflow(
+    intra_op_threads=config.TF_INTRA_OP_THREADS,
+    inter_op_threads=config.TF_INTER_OP_THREADS,
+    deterministic=config.DETERMINISTIC_INFERENCE,
+    seed=config.INFERENCE_SEED,
+)
+
 try:
     from tensorflow.keras.models import load_model
     from tensorflow.keras.applications.mobilenet_v2 import preprocess_input
@@ -80,6 +143,7 @@ def load_disease_db():
 
 
 LABELS = get_labels()
+LABEL_REGISTRY = LabelRegistry(LABELS)
 DISEASE_DB = load_disease_db()
 
 
@@ -98,6 +162,9 @@ def init_db():
         )
         """
     )
+    columns = {row[1] for row in cur.execute("PRAGMA table_info(images)")}
+    if "model_version" not in columns:
+        cur.execute("ALTER TABLE images ADD COLUMN model_version TEXT")
     conn.commit()
     conn.close()
     # ensure other helper tables exist
@@ -161,6 +228,23 @@ def get_cached_gemini(crop, disease):
     return None
 
 
+def get_cached_gemini_many(pairs):
+    """Look up several (crop, disease) pairs with one connection. Returns {pair: response}."""
+    found = {}
+    try:
+        conn = sqlite3.connect(DB_PATH)
+        cur = conn.cursor()
+        for crop, disease in pairs:
+            cur.execute("SELECT response FROM gemini_cache WHERE crop=? AND disease=? ORDER BY id DESC LIMIT 1", (crop, disease))
+            row = cur.fetchone()
+            if row:
+                found[(crop, disease)] = json.loads(row[0])
+        conn.close()
+    except Exception as e:
+        print(f"Gemini cache read error: {e}")
+    return found
+
+
 def set_cached_gemini(crop, disease, response_obj):
     try:
         conn = sqlite3.connect(DB_PATH)
@@ -203,29 +287,49 @@ def set_calibration_temperature(value):
         print(f"Calibration write error: {e}")
 
 
-def save_record(id_, filename, label, confidence, report):
+EMBEDDING_INDEX = None
+_embedding_lock = threading.Lock()
+
+
+def get_embedding_index():
+    """The embedding index for the current DB_PATH (created on first use)."""
+    global EMBEDDING_INDEX
+    with _embedding_lock:
+        if EMBEDDING_INDEX is None or EMBEDDING_INDEX.db_path != DB_PATH:
+            data_path = config.EMBEDDINGS_PATH or os.path.splitext(DB_PATH)[0] + ".embeddings.f16"
+            EMBEDDING_INDEX = EmbeddingIndex(
+                DB_PATH,
+                data_path,
+                dim=config.EMBEDDING_DIM,
+                ivf_min_rows=config.EMBEDDINGS_IVF_MIN_ROWS,
+                nprobe=config.EMBEDDINGS_NPROBE,
+            )
+        return EMBEDDING_INDEX
+
+
+def save_record(id_, filename, label, confidence, report, model_version=None):
     conn = sqlite3.connect(DB_PATH)
     cur = conn.cursor()
     cur.execute(
-        "INSERT INTO images (id, filename, label, confidence, report, created_at) VALUES (?,?,?,?,?,?)",
-        (id_, filename, label, float(confidence), json.dumps(report), datetime.utcnow().isoformat()),
+        "INSERT INTO images (id, filename, label, confidence, report, created_at, model_version) VALUES (?,?,?,?,?,?,?)",
+        (id_, filename, label, float(confidence), json.dumps(report), datetime.utcnow().isoformat(), model_version),
     )
     conn.commit()
     conn.close()
 
 
-def load_keras_model():
+def load_keras_model(model_path=None):
     if load_model is None:
         return None
     try:
-        model = load_model(MODEL_PATH)
+        model = load_model(model_path or MODEL_PATH)
         return model
     except Exception as e:
         print(f"Could not load model with load_model: {e}")
         return None
 
 
-def build_transfer_mobilenet(input_shape=(224, 224, 3), num_classes=38):
+def build_transfer_mobilenet(input_shape=(224, 224, 3), num_classes=38, weights_path=None):
     """Rebuild the model from scratch to avoid loading issues."""
     try:
         from tensorflow.keras.models import Sequential
@@ -247,7 +351,7 @@ def build_transfer_mobilenet(input_shape=(224, 224, 3), num_classes=38):
         model.compile(optimizer=Adam(1e-4), loss="categorical_crossentropy", metrics=["accuracy"])
         # Load pre-trained weights if they exist
         try:
-            model.load_weights(MODEL_PATH)
+            model.load_weights(weights_path or MODEL_PATH)
             print("Model weights loaded successfully.")
         except Exception as e:
             print(f"Could not load weights: {e}")
@@ -257,66 +361,196 @@ def build_transfer_mobilenet(input_shape=(224, 224, 3), num_classes=38):
         return None
 
 
-MODEL = None
-try:
-    MODEL = load_keras_model()
-    if MODEL is None:
-        print("Attempting to rebuild model from scratch...")
-        MODEL = build_transfer_mobilenet()
-except Exception as e:
-    print("Warning: could not load Keras model:", e)
+def load_model_file(model_path, num_classes=38):
+    """Load a saved model, falling back to rebuilding it and loading the weights."""
+    model = None
     try:
-        MODEL = build_transfer_mobilenet()
-    except Exception as e2:
-        print(f"Warning: could not rebuild model: {e2}")
+        model = load_keras_model(model_path)
+        if model is None:
+            print("Attempting to rebuild model from scratch...")
+            model = build_transfer_mobilenet(num_classes=num_classes, weights_path=model_path)
+    except Exception as e:
+        print("Warning: could not load Keras model:", e)
+        try:
+            model = build_transfer_mobilenet(num_classes=num_classes, weights_path=model_path)
+        except Exception as e2:
+            print(f"Warning: could not rebuild model: {e2}")
+    return model
 
 
-def prepare_image(image_path, target_size=(224, 224)):
-    img = Image.open(image_path).convert("RGB")
-    img = img.resize(target_size)
-    arr = np.array(img)
-    arr = np.expand_dims(arr, 0)
+MODEL = load_model_file(MODEL_PATH, len(LABELS))
+MODEL_AVAILABLE = MODEL is not None
+MODEL_VERSION = None
+if MODEL_AVAILABLE:
+    print("✅ ML Model loaded successfully")
+else:
+    print("🔄 Continuing without ML model - using Gemini API only")
+
+# MODEL, LABELS, LABEL_REGISTRY and MODEL_VERSION always change together under this lock
+MODEL_SWAP_LOCK = threading.Lock()
+
+
+def _publish_model(entry):
+    global MODEL, MODEL_AVAILABLE, LABELS, LABEL_REGISTRY, MODEL_VERSION
+    with MODEL_SWAP_LOCK:
+        MODEL, LABELS, LABEL_REGISTRY, MODEL_VERSION = entry.model, entry.labels, entry.label_registry, entry.version
+        MODEL_AVAILABLE = MODEL is not None
+
+
+def active_model():
+    """``(model, label_registry, version)`` for one request; a later swap does not affect it."""
+    with MODEL_SWAP_LOCK:
+        return MODEL, LABEL_REGISTRY, MODEL_VERSION
+
+
+def prepare_model_entry(entry):
+    """Build and trace the version's embedding model off the request path."""
+    if config.EMBEDDINGS_ENABLED and entry.embedding_model is None:
+        entry.embedding_model = build_embedding_model(entry.model)
+        embedding_predict(entry.model, np.zeros((1, 224, 224, 3), dtype=np.float32), entry.embedding_model)
+
+
+def embedding_model_for(model, version):
+    """The registered version's embedding model, built on first use if warm-up skipped it.
+
+    ``None`` for a model that is no longer (or was never) registered.
+    """
+    entry = MODEL_REGISTRY.get(version)
+    if entry is None or entry.model is not model:
+        return None
+    if entry.embedding_model is None:
+        entry.embedding_model = build_embedding_model(model)
+    return entry.embedding_model
+
+
+MODEL_REGISTRY = ModelRegistry(
+    loader=load_model_file,
+    on_activate=_publish_model,
+    keep=config.MODEL_KEEP_VERSIONS,
+    warmup_batches=(1, config.MODEL_WARMUP_BATCH),
+    prepare=prepare_model_entry,
+)
+if MODEL_AVAILABLE:
+    try:
+        initial_version = file_version(MODEL_PATH, LABELS_PATH)
+    except OSError:
+        initial_version = "rebuilt"
+    MODEL_REGISTRY.register(
+        initial_version, MODEL, LABELS, source={"model_path": MODEL_PATH, "labels_path": LABELS_PATH}, activate=True
+    )
+
+def warm_up_model():
+    """Run the active model on dummy batches so the first real request is not slow."""
+    model, label_registry, version = active_model()
+    if model is None:
+        return None
+    elapsed_ms = warm_up(model, len(label_registry), (1, config.MODEL_WARMUP_BATCH))
+    entry = MODEL_REGISTRY.get(version)
+    if entry is not None and entry.model is model:
+        prepare_model_entry(entry)
+    print(f"Warmed up model {version} in {elapsed_ms:.0f} ms")
+    return elapsed_ms
+
+
+_control_checked_at = 0.0
+
+
+def model_control_path():
+    return config.MODEL_CONTROL_PATH or os.path.splitext(DB_PATH)[0] + ".model.json"
+
+
+def publish_active_model():
+    """Ask the other workers to run this worker's active version."""
+    if MODEL_REGISTRY.active is not None:
+        write_control(model_control_path(), MODEL_REGISTRY.active)
+
+
+def sync_model_control(force=False):
+    """Follow the version another worker published (checked every MODEL_CONTROL_POLL_S)."""
+    global _control_checked_at
+    now = time.monotonic()
+    if not force and now - _control_checked_at < config.MODEL_CONTROL_POLL_S:
+        return
+    _control_checked_at = now
+    desired = read_control(model_control_path())
+    if not desired or desired.get("version") == MODEL_VERSION:
+        return
+    entry = MODEL_REGISTRY.get(desired["version"])
+    if entry is not None and entry.state == READY:
+        MODEL_REGISTRY.activate(entry.version)
+    elif entry is None and desired.get("model_path") and desired.get("labels_path"):
+        MODEL_REGISTRY.load_async(desired["model_path"], desired["labels_path"], version=desired["version"])
+
+init_db()
+
+
+def load_image(image_path):
+    return Image.open(image_path).convert("RGB")
+
+
+def preprocess_batch(arr):
+    """Apply the model's input preprocessing to a (N, H, W, 3) uint8 batch."""
     if preprocess_input is not None:
         arr = preprocess_input(arr.astype(np.float32))
     return arr
 
 
-def predict_image(img_path):
-    if MODEL is None:
+def preprocess_images(images, target_size=(224, 224)):
+    """Resize PIL images and stack them into one model-ready batch."""
+    return preprocess_batch(np.stack([np.array(img.resize(target_size)) for img in images]))
+
+
+def prepare_image(image_path, target_size=(224, 224)):
+    return preprocess_images([load_image(image_path)], target_size)
+
+
+def apply_temperature(probs, T):
+    """Temperature-scale a probability vector and renormalize it."""
+    return temperature_scale(probs, T)
+
+
+class InferenceError(RuntimeError):
+    """Raised in strict mode instead of falling back to a random prediction."""
+
+
+def predict_image(img_path, strict=None):
+    """Return ``(label, confidence)`` for one image file.
+
+    Without strict mode (``STRICT_INFERENCE``), a missing model or a failed
+    prediction returns a random label for demo purposes. Strict mode raises
+    ``InferenceError`` instead.
+    """
+    strict = config.STRICT_INFERENCE if strict is None else strict
+    model, label_registry, _ = active_model()
+    if model is None:
+        if strict:
+            raise InferenceError("model not loaded")
+        METRICS.inc("random_fallbacks")
+        print("Warning: model not loaded, returning a random prediction")
         # Fallback: return a random prediction for demo purposes
-        inv_labels = {v: k for k, v in LABELS.items()}
-        all_labels = list(inv_labels.values())
-        label = all_labels[np.random.randint(0, len(all_labels))] if all_labels else "unknown"
+        all_labels = label_registry.labels
+        label = all_labels[np.random.randint(0, len(all_labels))] if len(all_labels) else "unknown"
         confidence = float(np.random.uniform(70, 99))
         return label, confidence
     
     try:
         x = prepare_image(img_path)
-        preds = MODEL.predict(x)
+        preds = model.predict(x)
         probs = preds[0]
         # apply temperature scaling using stored calibration temperature
-        T = get_calibration_temperature()
-        try:
-            T = float(T) if T and float(T) > 0 else 1.0
-        except Exception:
-            T = 1.0
-        eps = 1e-12
-        clipped = np.clip(probs, eps, 1.0)
-        logits = np.log(clipped)
-        scaled_logits = logits / T
-        exps = np.exp(scaled_logits - np.max(scaled_logits))
-        scaled = exps / np.sum(exps)
+        scaled = apply_temperature(probs, get_calibration_temperature())
         top_idx = int(np.argmax(scaled))
-        inv_labels = {v: k for k, v in LABELS.items()}
-        label = inv_labels.get(top_idx, "unknown")
+        label = label_registry.label(top_idx)
         confidence = float(scaled[top_idx] * 100.0)
         return label, confidence
     except Exception as e:
         print(f"Prediction error: {e}")
+        if strict:
+            raise InferenceError(str(e)) from e
+        METRICS.inc("random_fallbacks")
         # Fallback: return a random prediction
-        inv_labels = {v: k for k, v in LABELS.items()}
-        all_labels = list(inv_labels.values())
-        label = all_labels[np.random.randint(0, len(all_labels))] if all_labels else "unknown"
+        all_labels = label_registry.labels
+        label = all_labels[np.random.randint(0, len(all_labels))] if len(all_labels) else "unknown"
         confidence = float(np.random.uniform(70, 99))
         return label, confidence
 
@@ -337,6 +571,10 @@ def fetch_disease_info_from_gemini(crop, disease):
     client = init_gemini()
     if not client:
         return None
+    if GEMINI_BREAKER.is_open():
+        # fail fast: generate_report falls back to the local default report
+        METRICS.inc("gemini_short_circuited")
+        return None
 
     try:
         prompt = f"""Provide detailed information about {disease} in {crop} plants. 
@@ -345,10 +583,15 @@ Format your response as JSON with these exact fields:
 
 Respond ONLY with valid JSON, no markdown or extra text."""
 
-        response = client.models.generate_content(
-            model="gemini-2.0-flash",
-            contents=prompt
-        )
+        with GEMINI_LIMITER.slot() as acquired:
+            if not acquired:
+                print("Gemini concurrency limit reached; using fallback report")
+                return None
+            response = GEMINI_BREAKER.call(
+                client.models.generate_content,
+                model="gemini-2.0-flash",
+                contents=prompt,
+            )
         text = getattr(response, 'text', '')
         if not text:
             # try other fields
@@ -369,17 +612,91 @@ Respond ONLY with valid JSON, no markdown or extra text."""
             except Exception:
                 pass
             return parsed
+    except CircuitOpenError:
+        return None
     except Exception as e:
         print(f"Gemini API error: {e}")
 
     return None
 
 
-def generate_report(label, confidence):
+def fetch_disease_info_batch(pairs):
+    """Fetch several (crop, disease) reports, asking Gemini once per batch of cache misses.
+
+    Valid entries from a partially malformed response are still cached.
+    Returns {pair: info} for every pair that is cached or was fetched.
+    """
+    pairs = list(dict.fromkeys(pairs))
+    found = get_cached_gemini_many(pairs)
+    misses = [p for p in pairs if p not in found]
+    if not misses:
+        return found
+
+    client = init_gemini()
+    if not client or GEMINI_BREAKER.is_open():
+        return found
+
+    size = max(1, config.GEMINI_BATCH_SIZE)
+    for i in range(0, len(misses), size):
+        chunk = misses[i:i + size]
+        try:
+            with GEMINI_LIMITER.slot() as acquired:
+                if not acquired:
+                    break
+                response = GEMINI_BREAKER.call(
+                    client.models.generate_content,
+                    model="gemini-2.0-flash",
+                    contents=build_batch_prompt(chunk),
+                )
+            text = getattr(response, "text", "") or str(response)
+            valid, invalid = parse_batch_response(text, chunk)
+            METRICS.inc("gemini_batch_calls")
+            METRICS.inc("gemini_batch_entries", len(valid))
+            if invalid:
+                METRICS.inc("gemini_batch_invalid", invalid)
+            for (crop, disease), info in valid.items():
+                set_cached_gemini(crop, disease, info)
+                found[(crop, disease)] = info
+        except CircuitOpenError:
+            break
+        except Exception as e:
+            print(f"Gemini batch error: {e}")
+    return found
+
+
+def report_key(label, label_registry=None):
+    """(crop, disease) Gemini cache key for a label.
+
+    Pass the request's ``label_registry`` snapshot; the active one is used otherwise.
+    """
+    crop, disease = (LABEL_REGISTRY if label_registry is None else label_registry).parts(label)
+    return crop.replace("_", " "), disease.replace("_", " ")
+
+
+def report_pairs(labels, label_registry=None):
+    """(crop, disease) Gemini keys for the labels that have no local DB entry."""
+    return [report_key(lbl, label_registry) for lbl in labels if lbl not in DISEASE_DB]
+
+
+def prewarm_gemini_cache(labels=None):
+    """Fill the Gemini cache for every known label (or ``labels``) in batches."""
+    _, label_registry, _ = active_model()
+    pairs = report_pairs(labels if labels is not None else label_registry.labels.tolist(), label_registry)
+    found = fetch_disease_info_batch(pairs)
+    return {"requested": len(pairs), "cached": len(found), "missing": len(pairs) - len(found)}
+
+
+def generate_report(label, confidence, gemini_found=None, label_registry=None):
+    """Report for a label from the local DB, Gemini, or a default.
+
+    ``gemini_found`` is the map returned by ``fetch_disease_info_batch``.
+    When given, a label missing from it gets the default report rather than
+    a second, single-label Gemini call. ``label_registry`` is the request's
+    snapshot (the active registry when omitted).
+    """
     # label format: Crop___Disease
-    parts = label.split("___") if "___" in label else [label]
-    crop = parts[0] if parts else "Unknown"
-    disease = parts[1] if len(parts) > 1 else ("healthy" if "healthy" in label.lower() else "unknown")
+    label_registry = LABEL_REGISTRY if label_registry is None else label_registry
+    crop, disease = label_registry.parts(label)
 
     key = label
     is_healthy = "healthy" in key.lower()
@@ -395,7 +712,10 @@ def generate_report(label, confidence):
         return entry_copy
 
     # Try Gemini API for dynamic info
-    gemini_info = fetch_disease_info_from_gemini(crop.replace("_", " "), disease.replace("_", " "))
+    if gemini_found is not None:
+        gemini_info = gemini_found.get(report_key(label, label_registry))
+    else:
+        gemini_info = fetch_disease_info_from_gemini(crop.replace("_", " "), disease.replace("_", " "))
     
     if gemini_info:
         report = {
@@ -424,191 +744,332 @@ def generate_report(label, confidence):
     return report
 
 
+def require_admin(view):
+    """Allow the route only when X-Admin-Token matches ADMIN_TOKEN."""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if not config.ADMIN_TOKEN:
+            return jsonify({"error": "admin endpoints disabled (set ADMIN_TOKEN)"}), 403
+        if request.headers.get("X-Admin-Token") != config.ADMIN_TOKEN:
+            return jsonify({"error": "forbidden"}), 403
+        return view(*args, **kwargs)
+    return wrapper
+
+
+def client_id():
+    if config.TRUST_PROXY_HEADERS:
+        forwarded = request.headers.get("X-Forwarded-For", "")
+        if forwarded:
+            return forwarded.split(",")[0].strip()
+    return request.remote_addr or "unknown"
+
+
+def admission_controlled(view):
+    """Apply the per-client rate limit and the in-flight/queue bound to a view."""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        allowed, retry = RATE_LIMITER.check(client_id())
+        if not allowed:
+            resp = jsonify({"error": "rate limit exceeded", "retry_after": retry})
+            resp.status_code = 429
+            resp.headers["Retry-After"] = str(retry)
+            return resp
+
+        admitted, wait_ms, reason = PREDICT_ADMISSION.acquire()
+        if not admitted:
+            retry = PREDICT_ADMISSION.retry_after()
+            resp = jsonify({"error": "server busy", "reason": reason, "retry_after": retry,
+                            "timing": {"queue_wait_ms": wait_ms}})
+            resp.status_code = 503
+            resp.headers["Retry-After"] = str(retry)
+            return resp
+
+        g.queue_wait_ms = wait_ms
+        started = time.perf_counter()
+        try:
+            resp = make_response(view(*args, **kwargs))
+        finally:
+            PREDICT_ADMISSION.release(time.perf_counter() - started)
+        resp.headers["Server-Timing"] = f"queue;dur={wait_ms:.1f}"
+        return resp
+    return wrapper
+
+
 @app.route("/api/predict", methods=["POST"])
+@admission_controlled
+@profile_request
 def predict():
-    if not MODEL_AVAILABLE:
+    sync_model_control()
+    model, label_registry, model_version = active_model()
+    if model is None:
         return jsonify({
             "status": "error",
             "message": "ML model not available. Using Gemini analysis only.",
             "confidence": 0,
             "use_gemini_only": True
         }), 503
-    file = None
-    if "image" in request.files:
-        file = request.files["image"]
-    elif "image" in request.form:
-        import re
-        import base64
-        m = re.match(r"data:image/(.+);base64,(.*)$", request.form["image"].strip())
-        ext = m.group(1).split("/")[-1]
-        b64 = m.group(2)
-        content = base64.b64decode(b64)
-        filename = f"{uuid.uuid4().hex}.{ext}"
-        path = os.path.join(UPLOAD_FOLDER, filename)
-        with open(path, "wb") as f:
-            f.write(content)
-        file = open(path, "rb")
-    else:
-        return jsonify({"error": "no image provided"}), 400
-
-    # save file to disk
-    fname = f"{uuid.uuid4().hex}_{file.filename}" if hasattr(file, "filename") else f"{uuid.uuid4().hex}.png"
-    path = os.path.join(UPLOAD_FOLDER, fname)
-    # if file is a FileStorage
+    request_started = time.perf_counter()
+    predict_ms = None
+    mode = request.args.get("mode") or ("hierarchical" if config.HIERARCHICAL_INFERENCE else "flat")
+    if mode not in ("flat", "hierarchical"):
+        return jsonify({"error": "mode must be flat or hierarchical"}), 400
+    quality_mode = request.args.get("quality", config.QUALITY_GATE_MODE)
+    if quality_mode not in ("off", "warn", "reject"):
+        return jsonify({"error": "quality must be off, warn or reject"}), 400
+    response_format = request.args.get("format", "json")
+    if response_format not in ("json", "msgpack"):
+        return jsonify({"error": "format must be json or msgpack"}), 400
+    if response_format == "msgpack" and not MSGPACK_AVAILABLE:
+        return jsonify({"error": "msgpack is not installed on the server"}), 406
+    # stream the upload to disk, then check its header before anything decodes it
     try:
-        file.save(path)
-    except Exception:
-        # file may be a file object
-        with open(path, "wb") as f:
-            f.write(file.read())
+        path, fname = receive_upload(request, UPLOAD_FOLDER, config.MAX_UPLOAD_BYTES)
+        try:
+            check_image(path, config.MAX_IMAGE_PIXELS)
+        except UploadError:
+            os.remove(path)
+            raise
+    except UploadError as e:
+        METRICS.inc(f"upload_rejected_{e.status}")
+        return jsonify({"error": str(e)}), e.status
 
     # predict (produce top-3 alternatives to improve diagnosability)
     alternatives = []
     alternative_reports = []
+    crop_prediction = None
+    crop_probabilities = {}
+    tta_info = None
+    quality = None
+    embedding = None
+    want_embedding = request.args.get("embedding") == "1"
     # calibration temperature (defaults to 1.0)
     try:
         T = get_calibration_temperature()
     except Exception:
         T = 1.0
-    if MODEL is None:
+    if model is None:
         label = "model_unavailable"
         confidence = 0.0
         report = {"error": "Model not loaded on server."}
     else:
         try:
-            x = prepare_image(path)
-            preds = MODEL.predict(x)[0]
+            # cheap quality gate on a reduced decode, before the full-size decode,
+            # the model call and the report lookups
+            if quality_mode != "off":
+                thumb, original_size = open_thumbnail(path)
+                quality = assess_image(
+                    thumb,
+                    original_size=original_size,
+                    min_side=config.QUALITY_MIN_SIDE,
+                    min_blur_var=config.QUALITY_MIN_BLUR_VAR,
+                    min_brightness=config.QUALITY_MIN_BRIGHTNESS,
+                    max_brightness=config.QUALITY_MAX_BRIGHTNESS,
+                    min_green_ratio=config.QUALITY_MIN_GREEN_RATIO,
+                )
+                METRICS.inc("quality_checked")
+                METRICS.observe("quality_check_ms", quality["elapsed_ms"])
+                for reason in quality["reasons"]:
+                    METRICS.inc(f"quality_failed_{reason}")
+                if quality["reasons"] and quality_mode == "reject":
+                    METRICS.inc("quality_rejected")
+                    METRICS.inc("quality_model_calls_saved")
+                    # the labels are unknown without the model, so the report and Gemini
+                    # work saved is what an accepted prediction has cost on average
+                    METRICS.inc("quality_report_lookups_saved", METRICS.mean("report_lookups_per_prediction"))
+                    METRICS.inc("quality_gemini_lookups_saved", METRICS.mean("gemini_lookups_per_prediction"))
+                    try:
+                        os.remove(path)
+                    except OSError:
+                        pass
+                    return jsonify({
+                        "error": "image quality too low",
+                        "reasons": quality["reasons"],
+                        "quality": quality,
+                    }), 422
+
+            img = load_image(path)
+            x = preprocess_images([img])
+            started = time.perf_counter()
+            if want_embedding or config.EMBEDDINGS_ENABLED:
+                preds, emb = embedding_predict(model, x, embedding_model_for(model, model_version))
+                preds, embedding = preds[0], np.asarray(emb[0], dtype=np.float32)
+            else:
+                preds = model.predict(x)[0]
+            predict_ms = (time.perf_counter() - started) * 1000.0
             # apply temperature scaling
             T = get_calibration_temperature()
-            try:
-                T = float(T) if T and float(T) > 0 else 1.0
-            except Exception:
-                T = 1.0
-            eps = 1e-12
-            clipped = np.clip(preds, eps, 1.0)
-            logits = np.log(clipped)
-            scaled_logits = logits / T
-            exps = np.exp(scaled_logits - np.max(scaled_logits))
-            scaled = exps / np.sum(exps)
-
-            # get top-3 indices from scaled probabilities
-            top_idx = list(reversed(scaled.argsort()[-3:]))
-            inv_labels = {v: k for k, v in LABELS.items()}
-            for idx in top_idx:
-                lbl = inv_labels.get(int(idx), "unknown")
-                conf = float(scaled[int(idx)] * 100.0)
-                alternatives.append({"label": lbl, "confidence": conf})
+            scaled = apply_temperature(preds, T)
+
+            # test-time augmentation, only when the plain prediction is low-confidence
+            use_tta = request.args.get("tta", "1" if config.TTA_ENABLED else "0") == "1"
+            if use_tta:
+                first = postprocess_batch(
+                    label_registry,
+                    scaled[None, :],
+                    k=2,
+                    low_threshold=config.LOW_CONFIDENCE_THRESHOLD,
+                    close_gap=config.CLOSE_CONFIDENCE_GAP,
+                )
+                if first["low_reason"][0]:
+                    METRICS.inc("tta_considered")
+                    averaged, tta_info = run_tta(
+                        model, img, preds, preprocess_images, predict_ms,
+                        config.TTA_MAX_EXTRA_MS, config.TTA_MAX_VIEWS,
+                    )
+                    if tta_info["applied"]:
+                        scaled = apply_temperature(averaged, T)
+                        before = first["top_labels"][0, 0]
+                        tta_info["top1_before"] = before
+                        tta_info["top1_changed"] = bool(label_registry.label(np.argmax(scaled)) != before)
+                        METRICS.inc("tta_applied")
+                        METRICS.inc("tta_views", len(tta_info["views"]))
+                        METRICS.observe("tta_extra_ms", tta_info["extra_ms"])
+                        if tta_info["top1_changed"]:
+                            METRICS.inc("tta_top1_changed")
+                    else:
+                        METRICS.inc("tta_skipped_budget")
+
+            # crop-level marginals: how sure are we about the plant itself?
+            marginals = crop_marginals(label_registry, scaled)[0]
+            top_crop = int(np.argmax(marginals))
+            crop_confidence = float(marginals[top_crop] * 100.0)
+            crop_certain = crop_confidence >= config.CROP_CONFIDENCE_THRESHOLD
+            crop_prediction = {
+                "crop": label_registry.crop_names_display[top_crop],
+                "confidence": crop_confidence,
+                "certain": bool(crop_certain),
+            }
+            crop_probabilities = {
+                label_registry.crop_names_display[g]: float(marginals[g] * 100.0)
+                for g in np.argsort(-marginals)
+            }
+
+            # hierarchical mode: once the crop is certain, rank (and enrich) only its diseases
+            ranked = scaled[None, :]
+            if mode == "hierarchical" and crop_certain:
+                ranked = restrict_to_crops(label_registry, ranked, [top_crop])
+
+            # top-3 alternatives and confidence flags from scaled probabilities
+            post = postprocess_batch(
+                label_registry,
+                ranked,
+                k=3,
+                low_threshold=config.LOW_CONFIDENCE_THRESHOLD,
+                close_gap=config.CLOSE_CONFIDENCE_GAP,
+                ambiguity_threshold=config.AMBIGUITY_THRESHOLD,
+                good_threshold=config.GOOD_CONFIDENCE_THRESHOLD,
+            )
+            alternatives = alternatives_for(post, 0)
+            if mode == "hierarchical" and crop_certain:
+                # only diseases with a real share of the crop get (Gemini) reports
+                alternatives = within_crop_alternatives(alternatives, crop_confidence, config.HIERARCHICAL_MIN_SHARE)
 
             # choose top-1 as primary
             if alternatives:
                 label = alternatives[0]["label"]
                 confidence = alternatives[0]["confidence"]
 
-            # generate detailed reports for each top-k alternative (uses Gemini cache)
+            # fetch every needed Gemini entry in one batched prompt; labels it could
+            # not return get the default report instead of another Gemini call
+            pairs = report_pairs([alt["label"] for alt in alternatives], label_registry)
+            if post["ambiguous"][0]:
+                # ambiguity details use Gemini even for labels in the local DB
+                pairs += [report_key(alt["label"], label_registry) for alt in alternatives[:2]]
+            try:
+                gemini_found = fetch_disease_info_batch(pairs)
+            except Exception as e:
+                print(f"Error prefetching Gemini reports: {e}")
+                gemini_found = {}
+
+            # generate detailed reports for each top-k alternative
             alternative_reports = []
             try:
                 for alt in alternatives:
-                    alt_report = generate_report(alt["label"], alt["confidence"])
+                    alt_report = generate_report(alt["label"], alt["confidence"], gemini_found, label_registry)
                     alternative_reports.append({"label": alt["label"], "confidence": alt["confidence"], "report": alt_report})
             except Exception as e:
                 print(f"Error generating alternative reports: {e}")
 
-            report = generate_report(label, confidence)
-            
-            # Low-confidence detection: flag if top prediction < 50%
-            # or if top-1 and top-2 confidence is too close (< 15% gap)
-            LOW_CONFIDENCE_THRESHOLD = 50.0
-            CLOSE_CONFIDENCE_GAP = 15.0
-            low_confidence_reason = None
-            
-            if confidence < LOW_CONFIDENCE_THRESHOLD:
-                low_confidence_reason = "top_prediction_low"
-            elif len(alternatives) >= 2 and (alternatives[0]["confidence"] - alternatives[1]["confidence"]) < CLOSE_CONFIDENCE_GAP:
-                low_confidence_reason = "top_2_too_close"
+            report = generate_report(label, confidence, gemini_found, label_registry)
+            METRICS.observe("report_lookups_per_prediction", len(alternative_reports) + 1)
+            METRICS.observe("gemini_lookups_per_prediction", len(set(pairs)))
             
+            # Low-confidence detection: flag if top prediction < LOW_CONFIDENCE_THRESHOLD
+            # or if top-1 and top-2 confidence is too close (< CLOSE_CONFIDENCE_GAP)
+            low_confidence_reason = post["low_reason"][0]
             if low_confidence_reason:
                 report["low_confidence_warning"] = True
                 report["low_confidence_reason"] = low_confidence_reason
-                report["confidence_quality"] = "poor"
-            elif confidence >= 70.0:
-                report["confidence_quality"] = "good"
-            else:
-                report["confidence_quality"] = "moderate"
+            report["confidence_quality"] = post["quality"][0]
 
             # Post-processing: if top-1 and top-2 are same crop but different diseases
             # and their confidences are close, mark ambiguous and include both candidates
             try:
-                AMBIGUITY_THRESHOLD = 8.0  # percent difference
-                if len(alternatives) >= 2:
+                if post["ambiguous"][0] and len(alternatives) >= 2:
                     top1 = alternatives[0]
                     top2 = alternatives[1]
-                    def crop_of(lbl):
-                        return lbl.split("___")[0] if "___" in lbl else lbl
-
-                    crop1 = crop_of(top1["label"]) if top1.get("label") else None
-                    crop2 = crop_of(top2["label"]) if top2.get("label") else None
-                    if crop1 and crop1 == crop2:
-                        diff = abs(top1["confidence"] - top2["confidence"])
-                        if diff <= AMBIGUITY_THRESHOLD:
-                            # prepare candidates with readable disease names
-                            def disease_name(lbl):
-                                if "___" in lbl:
-                                    return lbl.split("___", 1)[1].replace("_", " ")
-                                return lbl
-
-                            candidates = [
-                                {"label": top1["label"], "disease": disease_name(top1["label"]), "confidence": top1["confidence"]},
-                                {"label": top2["label"], "disease": disease_name(top2["label"]), "confidence": top2["confidence"]},
-                            ]
-                            report["ambiguous"] = True
-                            report["ambiguous_candidates"] = candidates
-                            # update displayed disease to show both names
-                            report["disease"] = f"{candidates[0]['disease']} / {candidates[1]['disease']}"
-                            # Fetch Gemini details for each ambiguous candidate (lazy safe)
-                            try:
-                                details = []
-                                for c in candidates:
-                                    c_crop = crop.replace("_", " ")
-                                    c_disease = c["disease"]
-                                    gem = fetch_disease_info_from_gemini(c_crop, c_disease)
-                                    if gem:
-                                        d = {
-                                            "label": c["label"],
-                                            "disease": c_disease,
-                                            "confidence": c["confidence"],
-                                            "symptoms": gem.get("symptoms", []),
-                                            "remedy": gem.get("remedy", ""),
-                                            "prevention": gem.get("prevention", ""),
-                                            "estimated_recovery": gem.get("estimated_recovery", ""),
-                                            "organic_treatment": gem.get("organic_treatment", ""),
-                                        }
-                                    else:
-                                        d = {
-                                            "label": c["label"],
-                                            "disease": c_disease,
-                                            "confidence": c["confidence"],
-                                            "symptoms": ["No detailed Gemini info available."],
-                                            "remedy": "",
-                                            "prevention": "",
-                                            "estimated_recovery": "",
-                                            "organic_treatment": "",
-                                        }
-                                    details.append(d)
-                                report["ambiguous_details"] = details
-                            except Exception as e:
-                                print(f"Error fetching Gemini details for ambiguous candidates: {e}")
+                    # prepare candidates with readable disease names
+                    disease_name = label_registry.disease_name
+                    candidates = [
+                        {"label": top1["label"], "disease": disease_name(top1["label"]), "confidence": top1["confidence"]},
+                        {"label": top2["label"], "disease": disease_name(top2["label"]), "confidence": top2["confidence"]},
+                    ]
+                    report["ambiguous"] = True
+                    report["ambiguous_candidates"] = candidates
+                    # update displayed disease to show both names
+                    report["disease"] = f"{candidates[0]['disease']} / {candidates[1]['disease']}"
+                    # Gemini details for each ambiguous candidate, from the batch above
+                    try:
+                        details = []
+                        for c in candidates:
+                            c_disease = c["disease"]
+                            gem = gemini_found.get(report_key(c["label"], label_registry))
+                            if gem:
+                                d = {
+                                    "label": c["label"],
+                                    "disease": c_disease,
+                                    "confidence": c["confidence"],
+                                    "symptoms": gem.get("symptoms", []),
+                                    "remedy": gem.get("remedy", ""),
+                                    "prevention": gem.get("prevention", ""),
+                                    "estimated_recovery": gem.get("estimated_recovery", ""),
+                                    "organic_treatment": gem.get("organic_treatment", ""),
+                                }
+                            else:
+                                d = {
+                                    "label": c["label"],
+                                    "disease": c_disease,
+                                    "confidence": c["confidence"],
+                                    "symptoms": ["No detailed Gemini info available."],
+                                    "remedy": "",
+                                    "prevention": "",
+                                    "estimated_recovery": "",
+                                    "organic_treatment": "",
+                                }
+                            details.append(d)
+                        report["ambiguous_details"] = details
+                    except Exception as e:
+                        print(f"Error fetching Gemini details for ambiguous candidates: {e}")
             except Exception as e:
                 print(f"Ambiguity post-processing error: {e}")
         except Exception as e:
             print(f"Prediction error in api: {e}")
+            METRICS.inc("prediction_errors")
+            if config.STRICT_INFERENCE:
+                return jsonify({"error": "prediction failed", "detail": str(e)}), 500
             label = "prediction_error"
             confidence = 0.0
             report = {"error": str(e)}
 
     id_ = uuid.uuid4().hex
-    save_record(id_, fname, label, confidence, report)
+    save_record(id_, fname, label, confidence, report, model_version=model_version)
+    if embedding is not None and config.EMBEDDINGS_ENABLED:
+        try:
+            get_embedding_index().add(id_, embedding, model_version=model_version)
+        except Exception as e:
+            print(f"Embedding store error: {e}")
 
-    return jsonify({
+    return render_prediction({
         "id": id_,
         "filename": fname,
         "label": label,
@@ -616,11 +1077,40 @@ def predict():
         "alternatives": alternatives,
         "alternative_reports": alternative_reports,
         "temperature": T,
+        "inference_mode": mode,
+        "model_version": model_version,
+        "tta": tta_info,
+        "quality": quality,
+        "timing": {
+            "queue_wait_ms": g.get("queue_wait_ms", 0.0),
+            "inference_ms": predict_ms,
+            "total_ms": (time.perf_counter() - request_started) * 1000.0,
+        },
+        "crop_prediction": crop_prediction,
+        "crop_probabilities": crop_probabilities,
         "report": report,
         "image_url": f"/uploads/{fname}",
+        "embedding": embedding.tolist() if want_embedding and embedding is not None else None,
     })
 
 
+def render_prediction(payload):
+    """Apply compact mode, field selection, MessagePack and compression to a prediction."""
+    if wants_compact(request.args, request.headers):
+        payload = compact_payload(payload)
+    if request.args.get("fields"):
+        payload = select_fields(payload, request.args["fields"])
+    encoding = choose_encoding(request.headers.get("Accept-Encoding")) if config.RESPONSE_COMPRESSION else None
+    body, headers = encode(
+        payload,
+        use_msgpack=wants_msgpack(request.args, request.headers),
+        encoding=encoding,
+        min_compress_bytes=config.RESPONSE_COMPRESS_MIN_BYTES,
+    )
+    METRICS.observe("predict_response_bytes", len(body))
+    return Response(body, headers=headers)
+
+
 @app.route("/uploads/<path:filename>")
 def uploaded_file(filename):
     return send_from_directory(UPLOAD_FOLDER, filename)
@@ -645,9 +1135,172 @@ def get_image_record(id):
     })
 
 
+@app.route("/api/images/<id>/similar")
+def similar_images(id):
+    """Past predictions whose embeddings are closest to this image's."""
+    try:
+        k = min(max(int(request.args.get("k", 5)), 1), 100)
+    except ValueError:
+        return jsonify({"error": "k must be an integer"}), 400
+    index = get_embedding_index()
+    row = index.row_of(id)
+    if row is None:
+        return jsonify({"error": "no embedding stored for this image"}), 404
+    conn = sqlite3.connect(DB_PATH)
+    version = conn.execute("SELECT model_version FROM embeddings WHERE id=?", (id,)).fetchone()[0]
+    # only embeddings from the same model version are comparable
+    hits = index.search(index.vector(id), k=k, exclude_rows=(row,), model_version=version)
+    marks = ",".join("?" * len(hits))
+    records = {
+        r[0]: r[1:]
+        for r in conn.execute(
+            "SELECT e.row, i.id, i.filename, i.label, i.confidence, i.report, i.created_at "
+            f"FROM embeddings e JOIN images i ON i.id = e.id WHERE e.row IN ({marks})",
+            [r for r, _ in hits],
+        ).fetchall()
+    } if hits else {}
+    conn.close()
+    results = []
+    for r, score in hits:
+        rec = records.get(r)
+        if rec is None:
+            continue
+        results.append({
+            "id": rec[0],
+            "similarity": score,
+            "label": rec[2],
+            "confidence": rec[3],
+            "report": json.loads(rec[4]),
+            "created_at": rec[5],
+            "image_url": f"/uploads/{rec[1]}",
+        })
+    return jsonify({"id": id, "k": k, "results": results})
+
+
 @app.route("/api/health")
 def health_check():
-    return jsonify({"status": "ok", "model_available": MODEL is not None}), 200
+    return jsonify({
+        "status": "ok",
+        "model_available": MODEL is not None,
+        "model_version": MODEL_VERSION,
+        "admission": PREDICT_ADMISSION.snapshot(),
+        "gemini": dict(GEMINI_BREAKER.snapshot(), client_initialized=GEMINI_INITIALIZED),
+    }), 200
+
+
+@app.route("/api/admin/profiles")
+@require_admin
+def list_profiles():
+    """List recent request profiles, slowest first. Optional ?min_ms= filter."""
+    try:
+        min_ms = float(request.args.get("min_ms", 0))
+    except ValueError:
+        return jsonify({"error": "invalid min_ms"}), 400
+    profiles = sorted(PROFILE_STORE.list(min_ms), key=lambda m: m["duration_ms"], reverse=True)
+    return jsonify({"profiles": profiles})
+
+
+@app.route("/api/admin/profiles/<profile_id>")
+@require_admin
+def download_profile(profile_id):
+    """Download a profile as speedscope JSON (default) or ?format=collapsed stacks."""
+    found = PROFILE_STORE.load(profile_id)
+    if not found:
+        return jsonify({"error": "not found"}), 404
+    meta, stacks = found
+    fmt = request.args.get("format", "speedscope")
+    if fmt == "collapsed":
+        return Response(
+            to_collapsed(stacks),
+            mimetype="text/plain",
+            headers={"Content-Disposition": f"attachment; filename={profile_id}.collapsed.txt"},
+        )
+    if fmt != "speedscope":
+        return jsonify({"error": "format must be speedscope or collapsed"}), 400
+    name = f"{meta['method']} {meta['path']} ({meta['duration_ms']:.0f} ms)"
+    return Response(
+        json.dumps(to_speedscope(stacks, name, meta["interval_ms"])),
+        mimetype="application/json",
+        headers={"Content-Disposition": f"attachment; filename={profile_id}.speedscope.json"},
+    )
+
+
+@app.route("/api/metrics")
+def metrics():
+    snap = METRICS.snapshot()
+    counters = snap["counters"]
+    applied = counters.get("tta_applied", 0)
+    snap["tta"] = {
+        "applied": applied,
+        "top1_change_rate": (counters.get("tta_top1_changed", 0) / applied) if applied else 0.0,
+        "mean_extra_ms": snap["timings"].get("tta_extra_ms", {}).get("mean", 0.0),
+    }
+    return jsonify(snap)
+
+
+@app.route("/api/admin/prewarm", methods=["POST"])
+@require_admin
+def prewarm():
+    """Fill the Gemini cache. Optional JSON body: {"labels": [...]} (default: all labels)."""
+    labels = (request.get_json(silent=True) or {}).get("labels")
+    if labels is not None and not isinstance(labels, list):
+        return jsonify({"error": "labels must be a list"}), 400
+    return jsonify(prewarm_gemini_cache(labels))
+
+
+@app.route("/api/admin/models")
+@require_admin
+def list_models():
+    sync_model_control(force=True)
+    return jsonify(MODEL_REGISTRY.snapshot())
+
+
+@app.route("/api/admin/models/load", methods=["POST"])
+@require_admin
+def load_model_version():
+    """Load and warm a model in the background, then swap it in.
+
+    JSON body (all optional): {"model_path", "labels_path", "version", "activate": true}.
+    """
+    body = request.get_json(silent=True) or {}
+    model_path = body.get("model_path", MODEL_PATH)
+    labels_path = body.get("labels_path", LABELS_PATH)
+    activate = bool(body.get("activate", True))
+    for path in (model_path, labels_path):
+        if not os.path.isfile(path):
+            return jsonify({"error": f"file not found: {path}"}), 400
+
+    def load_and_publish():
+        entry = MODEL_REGISTRY.load(model_path, labels_path, version=version, activate=activate)
+        if activate and entry.state == READY:
+            publish_active_model()
+
+    version = body.get("version") or file_version(model_path, labels_path)
+    threading.Thread(target=load_and_publish, name=f"model-load-{version}", daemon=True).start()
+    return jsonify({"version": version, "status": "loading"}), 202
+
+
+@app.route("/api/admin/models/activate", methods=["POST"])
+@require_admin
+def activate_model_version():
+    version = (request.get_json(silent=True) or {}).get("version")
+    try:
+        MODEL_REGISTRY.activate(version)
+    except KeyError as e:
+        return jsonify({"error": str(e.args[0])}), 409
+    publish_active_model()
+    return jsonify(MODEL_REGISTRY.snapshot())
+
+
+@app.route("/api/admin/models/rollback", methods=["POST"])
+@require_admin
+def rollback_model_version():
+    try:
+        MODEL_REGISTRY.rollback()
+    except KeyError as e:
+        return jsonify({"error": str(e.args[0])}), 409
+    publish_active_model()
+    return jsonify(MODEL_REGISTRY.snapshot())
 
 
 @app.route("/api/calibrate", methods=["POST"])
@@ -669,8 +1322,6 @@ def api_calibrate():
     except Exception:
         return jsonify({"error": "invalid min/max/steps"}), 400
 
-    import math
-
     probs_arr = np.array(probs_list, dtype=float)
     labels_arr = np.array(labels)
     if probs_arr.ndim != 2 or probs_arr.shape[0] != labels_arr.shape[0]:
@@ -692,19 +1343,12 @@ def api_calibrate():
     eps = 1e-12
     best_T = 1.0
     best_nll = float('inf')
+    rows = np.arange(probs_arr.shape[0])
     for T in np.linspace(minT, maxT, steps):
-        # compute NLL
-        total_nll = 0.0
-        for i in range(probs_arr.shape[0]):
-            p = probs_arr[i]
-            p_clipped = np.clip(p, eps, 1.0)
-            logits = np.log(p_clipped)
-            scaled_logits = logits / float(T)
-            exps = np.exp(scaled_logits - np.max(scaled_logits))
-            scaled = exps / np.sum(exps)
-            true_prob = scaled[norm_labels[i]]
-            total_nll += -math.log(max(true_prob, eps))
-        avg_nll = total_nll / probs_arr.shape[0]
+        # compute NLL over the whole batch at once
+        scaled = temperature_scale(probs_arr, float(T))
+        true_prob = np.maximum(scaled[rows, norm_labels], eps)
+        avg_nll = float(-np.log(true_prob).mean())
         if avg_nll < best_nll:
             best_nll = avg_nll
             best_T = float(T)
@@ -718,6 +1362,27 @@ def api_calibrate():
     return jsonify({"temperature": best_T, "nll": best_nll})
 
 
+if config.GEMINI_PREWARM_ON_START:
+    threading.Thread(target=prewarm_gemini_cache, name="gemini-prewarm", daemon=True).start()
+
+
+def _reload_on_sighup(signum, frame):
+    """SIGHUP: reload the model and label files from disk in the background."""
+    def reload():
+        entry = MODEL_REGISTRY.load(MODEL_PATH, LABELS_PATH)
+        if entry.state == READY:
+            publish_active_model()
+
+    threading.Thread(target=reload, name="model-reload", daemon=True).start()
+
+
+if hasattr(signal, "SIGHUP") and threading.current_thread() is threading.main_thread():
+    try:
+        signal.signal(signal.SIGHUP, _reload_on_sighup)
+    except ValueError:
+        pass
+
+
 if __name__ == "__main__":
     print("Starting backend on http://127.0.0.1:5000")
     app.run(host="0.0.0.0", port=5000, debug=False, use_reloader=False)
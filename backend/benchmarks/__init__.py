@@ -0,0 +1,10 @@
+"""Reproducible micro-benchmarks and load tests for the backend.
+
+Run from the ``backend`` folder:
+
+  python -m benchmarks micro --out bench_micro.json
+  python -m benchmarks load --concurrency 8 --requests 400 --out bench_load.json
+
+Everything runs against a stub model and a stub Gemini client, so no GPU,
+TensorFlow weights or network access are needed.
+"""
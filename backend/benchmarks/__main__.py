@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""Command-line entry point: ``python -m benchmarks {micro,load,profiles} ...``."""
+import argparse
+import os
+import sys
+
+HERE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def main(argv=None):
+    p = argparse.ArgumentParser(prog="python -m benchmarks")
+    sub = p.add_subparsers(dest="command", required=True)
+
+    def common(sp):
+        sp.add_argument("--out", default=None, help="Write results JSON to this path")
+        sp.add_argument("--compare", default=None, help="Baseline results JSON to compare against")
+        sp.add_argument("--tolerance", type=float, default=0.2, help="Allowed slowdown before flagging (0.2 = 20%%)")
+        sp.add_argument("--model-latency-ms", type=float, default=0.0, help="Simulated fixed cost per model call")
+        sp.add_argument("--model-per-image-ms", type=float, default=0.0, help="Simulated cost per image in a batch")
+        sp.add_argument("--gemini-latency-ms", type=float, default=0.0, help="Simulated Gemini round-trip time")
+
+    micro = sub.add_parser("micro", help="Time individual backend functions")
+    common(micro)
+    micro.add_argument("--iterations", type=int, default=200)
+
+    load = sub.add_parser("load", help="Concurrent load against /api/predict")
+    common(load)
+    load.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 8])
+    load.add_argument("--requests", type=int, default=200, help="Requests per concurrency level")
+    load.add_argument("--url", default=None, help="Target an already running server instead of a local stub one")
+
+    profiles = sub.add_parser("profiles", help="Compare serve.py profiles (each run as a real server)")
+    common(profiles)
+    profiles.add_argument("--profiles", nargs="+", default=["sync", "gthread", "async"])
+    profiles.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 8])
+    profiles.add_argument("--requests", type=int, default=200, help="Requests per concurrency level")
+    profiles.add_argument("--workers", type=int, default=0, help="Workers per server (0 = profile sizing)")
+    profiles.add_argument("--real-model", action="store_true", help="Serve the real model instead of the stub")
+
+    args = p.parse_args(argv)
+
+    sys.path.insert(0, HERE)
+    import app as backend
+
+    from .stubs import install_stubs, make_image_bytes
+    from .timing import compare_results, save_results
+
+    _, _, workdir = install_stubs(
+        backend,
+        model_latency_ms=args.model_latency_ms,
+        model_per_image_ms=args.model_per_image_ms,
+        gemini_latency_ms=args.gemini_latency_ms,
+    )
+    image_bytes = make_image_bytes()
+    config = {k: v for k, v in vars(args).items() if k not in ("out", "compare")}
+
+    if args.command == "micro":
+        from .micro import run_micro
+
+        results = run_micro(backend, workdir, image_bytes, iterations=args.iterations)
+    elif args.command == "profiles":
+        from .profiles import run_profiles
+
+        results = run_profiles(
+            args.profiles, image_bytes, args.concurrency, args.requests,
+            stub_model=not args.real_model, stub_latency_ms=args.model_latency_ms, workers=args.workers,
+        )
+    else:
+        from .load import LocalServer, run_load
+
+        results = {}
+        if args.url:
+            for c in args.concurrency:
+                results[f"predict_c{c}"] = run_load(args.url, image_bytes, c, args.requests)
+        else:
+            with LocalServer(backend.app) as server:
+                for c in args.concurrency:
+                    results[f"predict_c{c}"] = run_load(server.url, image_bytes, c, args.requests)
+
+    for name, stats in results.items():
+        line = f"{name:<24} p50={stats.get('p50_ms', 0):8.3f}ms p95={stats.get('p95_ms', 0):8.3f}ms p99={stats.get('p99_ms', 0):8.3f}ms"
+        if "throughput_rps" in stats:
+            line += f" rps={stats['throughput_rps']:8.1f} status={stats['status_counts']}"
+        print(line)
+
+    if args.out:
+        save_results(args.out, args.command, results, config)
+        print(f"Saved results to {args.out}")
+
+    if args.compare:
+        regressed = False
+        for name, old, new, ratio, bad in compare_results(results, args.compare, tolerance=args.tolerance):
+            flag = "REGRESSION" if bad else "ok"
+            print(f"{name:<24} {old:8.3f}ms -> {new:8.3f}ms ({ratio:5.2f}x) {flag}")
+            regressed = regressed or bad
+        if regressed:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
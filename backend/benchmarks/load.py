@@ -0,0 +1,83 @@
+"""Concurrent load generator for ``/api/predict``."""
+import logging
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from urllib import error as uerror
+from urllib import request as ureq
+
+from .timing import summarize
+
+
+def encode_multipart(field, filename, content, content_type="image/jpeg"):
+    boundary = uuid.uuid4().hex
+    head = (
+        f"--{boundary}\r\n"
+        f'Content-Disposition: form-data; name="{field}"; filename="{filename}"\r\n'
+        f"Content-Type: {content_type}\r\n\r\n"
+    ).encode("utf-8")
+    tail = f"\r\n--{boundary}--\r\n".encode("utf-8")
+    return head + content + tail, f"multipart/form-data; boundary={boundary}"
+
+
+class LocalServer:
+    """Serve a Flask app on an ephemeral port in a background thread."""
+
+    def __init__(self, flask_app, host="127.0.0.1"):
+        from werkzeug.serving import make_server
+
+        # per-request access logs would dominate the benchmark output
+        logging.getLogger("werkzeug").setLevel(logging.WARNING)
+        self._server = make_server(host, 0, flask_app, threaded=True)
+        self.url = f"http://{host}:{self._server.server_port}"
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._server.shutdown()
+        self._thread.join(timeout=5)
+
+
+def run_load(base_url, image_bytes, concurrency=4, total_requests=200, timeout=30.0, path="/api/predict"):
+    """Fire ``total_requests`` uploads with ``concurrency`` parallel clients."""
+    body, content_type = encode_multipart("image", "bench.jpg", image_bytes)
+    url = base_url.rstrip("/") + path
+    latencies = []
+    statuses = {}
+    lock = threading.Lock()
+
+    def one(_):
+        req = ureq.Request(url, data=body, headers={"Content-Type": content_type}, method="POST")
+        start = time.perf_counter()
+        try:
+            with ureq.urlopen(req, timeout=timeout) as resp:
+                resp.read()
+                status = resp.status
+        except uerror.HTTPError as e:
+            status = e.code
+        except Exception:
+            status = "error"
+        elapsed = (time.perf_counter() - start) * 1000.0
+        with lock:
+            latencies.append(elapsed)
+            statuses[str(status)] = statuses.get(str(status), 0) + 1
+
+    wall_start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(one, range(total_requests)))
+    wall = time.perf_counter() - wall_start
+
+    stats = summarize(latencies)
+    stats.update(
+        {
+            "concurrency": concurrency,
+            "wall_s": wall,
+            "throughput_rps": total_requests / wall if wall > 0 else 0.0,
+            "status_counts": statuses,
+        }
+    )
+    return stats
@@ -0,0 +1,72 @@
+"""Micro-benchmarks for the hot functions in ``app.py``."""
+import os
+import sqlite3
+import uuid
+
+import numpy as np
+
+from .timing import time_call
+
+
+def _uncached_labels(backend):
+    """Labels that have no local ``disease_db.json`` entry (they hit Gemini)."""
+    return [lbl for lbl in backend.LABELS if lbl not in backend.DISEASE_DB]
+
+
+def bench_prepare_image(backend, image_path, iterations):
+    return time_call(lambda: backend.prepare_image(image_path), iterations=iterations)
+
+
+def bench_temperature(backend, iterations):
+    rng = np.random.default_rng(0)
+    probs = rng.dirichlet(np.ones(len(backend.LABELS))).astype(np.float32)
+    return time_call(lambda: backend.apply_temperature(probs, 1.5), iterations=iterations)
+
+
+def bench_generate_report(backend, iterations, warm):
+    labels = _uncached_labels(backend) or list(backend.LABELS)
+    state = {"i": 0}
+
+    def clear_cache():
+        conn = sqlite3.connect(backend.DB_PATH)
+        conn.execute("DELETE FROM gemini_cache")
+        conn.commit()
+        conn.close()
+
+    if warm:
+        for lbl in labels:
+            backend.generate_report(lbl, 90.0)
+
+    def run():
+        lbl = labels[state["i"] % len(labels)]
+        state["i"] += 1
+        backend.generate_report(lbl, 90.0)
+
+    return time_call(run, iterations=iterations, setup=None if warm else clear_cache)
+
+
+def bench_save_record(backend, iterations):
+    report = backend.generate_report(next(iter(backend.LABELS)), 90.0)
+    return time_call(
+        lambda: backend.save_record(uuid.uuid4().hex, "bench.jpg", "bench", 90.0, report),
+        iterations=iterations,
+    )
+
+
+def bench_predict_image(backend, image_path, iterations):
+    return time_call(lambda: backend.predict_image(image_path), iterations=iterations)
+
+
+def run_micro(backend, workdir, image_bytes, iterations=200):
+    image_path = os.path.join(workdir, "bench.jpg")
+    with open(image_path, "wb") as f:
+        f.write(image_bytes)
+
+    return {
+        "prepare_image": bench_prepare_image(backend, image_path, iterations),
+        "apply_temperature": bench_temperature(backend, iterations * 10),
+        "generate_report_cold": bench_generate_report(backend, max(iterations // 4, 10), warm=False),
+        "generate_report_warm": bench_generate_report(backend, iterations, warm=True),
+        "save_record": bench_save_record(backend, iterations),
+        "predict_image": bench_predict_image(backend, image_path, iterations),
+    }
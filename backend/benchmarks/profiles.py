@@ -0,0 +1,66 @@
+"""Compare serve.py profiles on this machine.
+
+Each profile is started as a real ``serve.py`` process on a free port and
+load-tested with ``run_load`` at the same concurrency levels. By default
+the servers run the stub model, whose cost is simulated with sleeps, so
+this compares how each profile queues and overlaps requests. With
+``--real-model`` the real model and its CPU contention are measured.
+"""
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+import urllib.request
+
+from .load import run_load
+
+HERE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _wait_healthy(url, proc, timeout):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if proc.poll() is not None:
+            return False
+        try:
+            with urllib.request.urlopen(url + "/api/health", timeout=1) as resp:
+                return json.loads(resp.read()).get("model_available", False)
+        except OSError:
+            time.sleep(0.2)
+    return False
+
+
+def run_profiles(profiles, image_bytes, concurrency, total_requests, stub_model=True, stub_latency_ms=0.0,
+                 workers=0, startup_timeout=120.0):
+    """Return ``{"<profile>_c<n>": stats}``; profiles that fail to start are skipped."""
+    results = {}
+    for profile in profiles:
+        port = _free_port()
+        url = f"http://127.0.0.1:{port}"
+        cmd = [sys.executable, "serve.py", "--profile", profile, "--bind", f"127.0.0.1:{port}"]
+        if workers:
+            cmd += ["--workers", str(workers)]
+        if stub_model:
+            cmd += ["--stub-model", "--stub-latency-ms", str(stub_latency_ms)]
+        proc = subprocess.Popen(cmd, cwd=HERE, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        try:
+            if not _wait_healthy(url, proc, startup_timeout):
+                print(f"{profile}: server did not start (missing gunicorn/gevent?), skipped")
+                continue
+            for c in concurrency:
+                results[f"{profile}_c{c}"] = run_load(url, image_bytes, c, total_requests)
+        finally:
+            proc.terminate()
+            try:
+                proc.wait(timeout=60)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+    return results
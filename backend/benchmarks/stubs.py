@@ -0,0 +1,131 @@
+"""Stand-ins for the Keras model and the Gemini client.
+
+The stub model is deterministic: the same image always produces the same
+probability vector, so benchmark runs (and tests) are comparable.
+"""
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+from types import SimpleNamespace
+
+import numpy as np
+
+
+class StubModel:
+    """Mimics ``keras.Model.predict`` for a (N, 224, 224, 3) batch.
+
+    Probabilities come from a fixed random projection of a coarse 4x4 colour
+    grid of each image. ``latency_ms`` and ``per_image_ms`` simulate the
+    compute cost of a real forward pass. Embeddings are a ReLU of a second
+    fixed projection of the same grid.
+    """
+
+    def __init__(self, num_classes=38, latency_ms=0.0, per_image_ms=0.0, seed=0, embedding_dim=1280):
+        self.num_classes = num_classes
+        self.embedding_dim = embedding_dim
+        self.latency_ms = latency_ms
+        self.per_image_ms = per_image_ms
+        rng = np.random.default_rng(seed)
+        self._weights = rng.normal(0.0, 4.0, size=(4 * 4 * 3, num_classes)).astype(np.float32)
+        self._bias = rng.normal(0.0, 0.5, size=(num_classes,)).astype(np.float32)
+        self._embed = rng.normal(0.0, 1.0, size=(4 * 4 * 3, embedding_dim)).astype(np.float32)
+        self.calls = 0
+        self.images = 0
+        self._lock = threading.Lock()
+
+    def _features(self, x):
+        x = np.asarray(x, dtype=np.float32)
+        if x.ndim == 3:
+            x = x[None]
+        n, h, w, c = x.shape
+        # normalise both raw [0, 255] and MobileNet [-1, 1] inputs to [0, 1]
+        if x.max(initial=0.0) > 1.5:
+            x = x / 255.0
+        elif x.min(initial=0.0) < 0.0:
+            x = (x + 1.0) / 2.0
+        gh, gw = h // 4, w // 4
+        grid = x[:, : gh * 4, : gw * 4, :].reshape(n, 4, gh, 4, gw, c).mean(axis=(2, 4))
+        return grid.reshape(n, -1) - 0.5
+
+    def predict(self, x, verbose=0, **kwargs):
+        feats = self._features(x)
+        delay = self.latency_ms + self.per_image_ms * feats.shape[0]
+        if delay > 0:
+            time.sleep(delay / 1000.0)
+        logits = feats @ self._weights + self._bias
+        logits -= logits.max(axis=1, keepdims=True)
+        exps = np.exp(logits)
+        with self._lock:
+            self.calls += 1
+            self.images += feats.shape[0]
+        return (exps / exps.sum(axis=1, keepdims=True)).astype(np.float32)
+
+    def predict_with_embedding(self, x):
+        """``(probs, embeddings)`` like the pooled-feature output of the real model."""
+        embeddings = np.maximum(self._features(x) @ self._embed, 0.0)
+        return self.predict(x), embeddings
+
+
+class StubGeminiClient:
+    """Mimics ``client.models.generate_content`` with a canned JSON answer."""
+
+    def __init__(self, latency_ms=0.0):
+        self.latency_ms = latency_ms
+        self.calls = 0
+        self._lock = threading.Lock()
+        self.models = SimpleNamespace(generate_content=self.generate_content)
+
+    def generate_content(self, model=None, contents=None, **kwargs):
+        with self._lock:
+            self.calls += 1
+        if self.latency_ms > 0:
+            time.sleep(self.latency_ms / 1000.0)
+        payload = {
+            "symptoms": ["Leaf spots", "Yellowing"],
+            "remedy": "Remove infected leaves and apply a suitable fungicide.",
+            "prevention": "Rotate crops and avoid overhead watering.",
+            "estimated_recovery": "2-3 weeks",
+            "organic_treatment": "Neem oil",
+        }
+        # batched prompts list items as "N. crop: X; disease: Y" and expect an array
+        items = re.findall(r"^\d+\. crop: (.*); disease: (.*)$", contents or "", flags=re.M)
+        if items:
+            return SimpleNamespace(text=json.dumps([dict(payload, crop=c, disease=d) for c, d in items]))
+        return SimpleNamespace(text=json.dumps(payload))
+
+
+def install_stubs(backend, workdir=None, model_latency_ms=0.0, model_per_image_ms=0.0, gemini_latency_ms=0.0):
+    """Point an imported ``app`` module at stubs and a throwaway database.
+
+    Returns ``(model, gemini_client, workdir)``.
+    """
+    workdir = workdir or tempfile.mkdtemp(prefix="plant-bench-")
+    uploads = os.path.join(workdir, "uploads")
+    os.makedirs(uploads, exist_ok=True)
+    backend.DB_PATH = os.path.join(workdir, "data.db")
+    backend.UPLOAD_FOLDER = uploads
+    backend.init_db()
+
+    model = StubModel(num_classes=len(backend.LABELS), latency_ms=model_latency_ms, per_image_ms=model_per_image_ms)
+    backend.MODEL_REGISTRY.register("stub", model, backend.LABELS, activate=True)
+
+    client = StubGeminiClient(latency_ms=gemini_latency_ms)
+    backend.GEMINI_CLIENT = client
+    backend.GEMINI_INITIALIZED = True
+    return model, client, workdir
+
+
+def make_image_bytes(size=(224, 224), seed=0, fmt="JPEG"):
+    """Encode a reproducible noisy RGB image."""
+    import io
+
+    from PIL import Image
+
+    rng = np.random.default_rng(seed)
+    arr = rng.integers(0, 256, size=(size[1], size[0], 3), dtype=np.uint8)
+    buf = io.BytesIO()
+    Image.fromarray(arr).save(buf, format=fmt)
+    return buf.getvalue()
@@ -0,0 +1,79 @@
+"""Timing and result-file helpers shared by the benchmark runners."""
+import json
+import platform
+import time
+from datetime import datetime
+
+import numpy as np
+
+
+def summarize(samples_ms):
+    """Latency summary (milliseconds) for a list of samples."""
+    arr = np.asarray(samples_ms, dtype=float)
+    if arr.size == 0:
+        return {"n": 0}
+    return {
+        "n": int(arr.size),
+        "mean_ms": float(arr.mean()),
+        "min_ms": float(arr.min()),
+        "p50_ms": float(np.percentile(arr, 50)),
+        "p95_ms": float(np.percentile(arr, 95)),
+        "p99_ms": float(np.percentile(arr, 99)),
+        "max_ms": float(arr.max()),
+    }
+
+
+def time_call(fn, iterations=50, warmup=3, setup=None):
+    """Call ``fn`` repeatedly and return a latency summary.
+
+    ``setup`` (if given) runs before every call and is not timed.
+    """
+    for _ in range(warmup):
+        if setup:
+            setup()
+        fn()
+    samples = []
+    for _ in range(iterations):
+        if setup:
+            setup()
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000.0)
+    return summarize(samples)
+
+
+def environment():
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "numpy": np.__version__,
+        "timestamp": datetime.utcnow().isoformat(),
+    }
+
+
+def save_results(path, kind, results, config):
+    doc = {"kind": kind, "environment": environment(), "config": config, "results": results}
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(doc, f, indent=2)
+    return doc
+
+
+def compare_results(current, baseline_path, metric="p50_ms", tolerance=0.2):
+    """Compare ``current`` against a saved results file.
+
+    Returns a list of ``(name, baseline, current, ratio, regressed)`` rows for
+    every benchmark present in both. A benchmark regresses when the chosen
+    metric grows by more than ``tolerance`` (0.2 = 20%).
+    """
+    with open(baseline_path, "r", encoding="utf-8") as f:
+        baseline = json.load(f).get("results", {})
+    rows = []
+    for name, stats in current.items():
+        old = baseline.get(name, {}).get(metric)
+        new = stats.get(metric)
+        if old is None or new is None or old <= 0:
+            continue
+        ratio = new / old
+        rows.append((name, old, new, ratio, ratio > 1.0 + tolerance))
+    return rows
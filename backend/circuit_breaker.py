@@ -0,0 +1,155 @@
+"""Circuit breaker with per-call timeout and jittered retries.
+
+Wraps calls to a flaky dependency (Gemini). After ``failure_threshold``
+consecutive failures the breaker opens and calls fail immediately with
+``CircuitOpenError`` until ``reset_timeout_s`` has passed. It then lets a
+single trial call through (half-open): success closes the breaker and
+failure opens it again.
+
+Each attempt runs in a worker thread with a ``call_timeout_s`` limit.
+Failed attempts are retried up to ``max_retries`` times with full-jitter
+exponential backoff, while the total time stays within ``budget_s``.
+"""
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeout
+
+from metrics import METRICS
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(RuntimeError):
+    """The breaker is open; the call was not attempted."""
+
+
+class CallTimeout(TimeoutError):
+    """An attempt exceeded ``call_timeout_s``."""
+
+
+class CircuitBreaker:
+    def __init__(
+        self,
+        name,
+        failure_threshold=5,
+        reset_timeout_s=30.0,
+        call_timeout_s=10.0,
+        max_retries=2,
+        backoff_base_s=0.2,
+        backoff_max_s=2.0,
+        budget_s=15.0,
+        max_workers=8,
+        clock=time.monotonic,
+        sleep=time.sleep,
+    ):
+        self.name = name
+        self.failure_threshold = max(1, int(failure_threshold))
+        self.reset_timeout_s = reset_timeout_s
+        self.call_timeout_s = call_timeout_s
+        self.max_retries = max(0, int(max_retries))
+        self.backoff_base_s = backoff_base_s
+        self.backoff_max_s = backoff_max_s
+        self.budget_s = budget_s
+        self._clock = clock
+        self._sleep = sleep
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=f"{name}-call")
+        self._lock = threading.Lock()
+        self.state = CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = None
+        self._trial_in_flight = False
+
+    # state transitions ------------------------------------------------------
+
+    def _set_state(self, state):
+        if state != self.state:
+            METRICS.inc(f"{self.name}_breaker_{state}")
+        self.state = state
+        METRICS.set_gauge(f"{self.name}_breaker_state", state)
+
+    def allow_request(self):
+        """True if a call may be attempted now (may move open -> half-open)."""
+        with self._lock:
+            if self.state == CLOSED:
+                return True
+            if self.state == OPEN and self._clock() - self.opened_at >= self.reset_timeout_s:
+                self._set_state(HALF_OPEN)
+            if self.state == HALF_OPEN and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            return False
+
+    def is_open(self):
+        with self._lock:
+            return self.state == OPEN and self._clock() - self.opened_at < self.reset_timeout_s
+
+    def _on_success(self):
+        with self._lock:
+            self.consecutive_failures = 0
+            self._trial_in_flight = False
+            self._set_state(CLOSED)
+
+    def _on_failure(self):
+        with self._lock:
+            self.consecutive_failures += 1
+            METRICS.inc(f"{self.name}_failures")
+            if self.state == HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+                self.opened_at = self._clock()
+                self._trial_in_flight = False
+                self._set_state(OPEN)
+
+    # calls ------------------------------------------------------------------
+
+    def _attempt(self, fn, args, kwargs, timeout):
+        future = self._executor.submit(fn, *args, **kwargs)
+        try:
+            return future.result(timeout=timeout)
+        except FutureTimeout:
+            # the worker thread cannot be killed; it finishes in the background
+            future.cancel()
+            raise CallTimeout(f"{self.name} call exceeded {timeout:.2f}s")
+
+    def call(self, fn, *args, **kwargs):
+        if not self.allow_request():
+            METRICS.inc(f"{self.name}_short_circuited")
+            raise CircuitOpenError(f"{self.name} circuit is open")
+
+        start = self._clock()
+        attempt = 0
+        while True:
+            remaining = self.budget_s - (self._clock() - start)
+            timeout = min(self.call_timeout_s, remaining)
+            try:
+                if timeout <= 0:
+                    raise CallTimeout(f"{self.name} latency budget exhausted")
+                result = self._attempt(fn, args, kwargs, timeout)
+            except Exception:
+                self._on_failure()
+                with self._lock:
+                    stop = self.state != CLOSED
+                delay = random.uniform(0, min(self.backoff_max_s, self.backoff_base_s * (2 ** attempt)))
+                elapsed = self._clock() - start
+                if stop or attempt >= self.max_retries or elapsed + delay >= self.budget_s:
+                    raise
+                attempt += 1
+                METRICS.inc(f"{self.name}_retries")
+                self._sleep(delay)
+                continue
+            self._on_success()
+            return result
+
+    def snapshot(self):
+        with self._lock:
+            retry_in = None
+            if self.state == OPEN:
+                retry_in = max(0.0, self.reset_timeout_s - (self._clock() - self.opened_at))
+            return {
+                "state": self.state,
+                "consecutive_failures": self.consecutive_failures,
+                "failure_threshold": self.failure_threshold,
+                "retry_in_s": retry_in,
+            }
@@ -0,0 +1,143 @@
+"""Runtime settings read from the environment (see ``.env.example``)."""
+import os
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+HERE = os.path.dirname(__file__)
+
+
+def env_str(name, default=None):
+    value = os.getenv(name)
+    return value if value not in (None, "") else default
+
+
+def env_float(name, default):
+    try:
+        return float(os.getenv(name, default))
+    except (TypeError, ValueError):
+        return float(default)
+
+
+def env_int(name, default):
+    try:
+        return int(os.getenv(name, default))
+    except (TypeError, ValueError):
+        return int(default)
+
+
+def env_bool(name, default=False):
+    value = os.getenv(name)
+    if value is None or value == "":
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+# Token required in the X-Admin-Token header for /api/admin/* routes.
+# Admin routes are disabled when unset.
+ADMIN_TOKEN = env_str("ADMIN_TOKEN")
+
+# Request profiling (disabled unless a sample rate or the header trigger is set)
+PROFILE_SAMPLE_RATE = env_float("PROFILE_SAMPLE_RATE", 0.0)
+PROFILE_HEADER_ENABLED = env_bool("PROFILE_HEADER_ENABLED", False)
+PROFILE_INTERVAL_MS = env_float("PROFILE_INTERVAL_MS", 5.0)
+PROFILE_SLOW_MS = env_float("PROFILE_SLOW_MS", 1000.0)
+PROFILE_KEEP = env_int("PROFILE_KEEP", 50)
+PROFILE_DIR = env_str("PROFILE_DIR", os.path.join(HERE, "profiles"))
+
+# Confidence checks in /api/predict (percent)
+LOW_CONFIDENCE_THRESHOLD = env_float("LOW_CONFIDENCE_THRESHOLD", 50.0)
+CLOSE_CONFIDENCE_GAP = env_float("CLOSE_CONFIDENCE_GAP", 15.0)
+AMBIGUITY_THRESHOLD = env_float("AMBIGUITY_THRESHOLD", 8.0)
+GOOD_CONFIDENCE_THRESHOLD = env_float("GOOD_CONFIDENCE_THRESHOLD", 70.0)
+
+# Hierarchical (crop-then-disease) inference. Per request: ?mode=hierarchical|flat
+HIERARCHICAL_INFERENCE = env_bool("HIERARCHICAL_INFERENCE", False)
+CROP_CONFIDENCE_THRESHOLD = env_float("CROP_CONFIDENCE_THRESHOLD", 90.0)
+# In hierarchical mode, a disease of the certain crop gets a report only when it holds at
+# least this percent of the crop's probability (the top disease always does)
+HIERARCHICAL_MIN_SHARE = env_float("HIERARCHICAL_MIN_SHARE", 10.0)
+
+# Test-time augmentation for low-confidence predictions. Per request: ?tta=1|0
+TTA_ENABLED = env_bool("TTA_ENABLED", False)
+TTA_MAX_EXTRA_MS = env_float("TTA_MAX_EXTRA_MS", 150.0)
+TTA_MAX_VIEWS = env_int("TTA_MAX_VIEWS", 6)
+
+# Inference determinism. STRICT_INFERENCE raises instead of returning random
+# predictions when the model is missing or fails.
+STRICT_INFERENCE = env_bool("STRICT_INFERENCE", False)
+DETERMINISTIC_INFERENCE = env_bool("DETERMINISTIC_INFERENCE", False)
+INFERENCE_SEED = env_int("INFERENCE_SEED", 0) if env_str("INFERENCE_SEED") else None
+TF_INTRA_OP_THREADS = env_int("TF_INTRA_OP_THREADS", 0)
+TF_INTER_OP_THREADS = env_int("TF_INTER_OP_THREADS", 0)
+
+# Admission control for /api/predict (per worker process)
+ADMISSION_MAX_IN_FLIGHT = env_int("ADMISSION_MAX_IN_FLIGHT", 4)
+ADMISSION_MAX_QUEUE = env_int("ADMISSION_MAX_QUEUE", 8)
+ADMISSION_QUEUE_TIMEOUT_S = env_float("ADMISSION_QUEUE_TIMEOUT_S", 10.0)
+# Per-client token bucket; 0 disables rate limiting
+RATE_LIMIT_PER_MINUTE = env_float("RATE_LIMIT_PER_MINUTE", 0.0)
+RATE_LIMIT_BURST = env_int("RATE_LIMIT_BURST", 10)
+# Use the first X-Forwarded-For hop as the client id (only behind a trusted proxy)
+TRUST_PROXY_HEADERS = env_bool("TRUST_PROXY_HEADERS", False)
+# Concurrent outbound Gemini calls; extra callers fall back to the local report
+GEMINI_MAX_CONCURRENCY = env_int("GEMINI_MAX_CONCURRENCY", 4)
+GEMINI_QUEUE_TIMEOUT_S = env_float("GEMINI_QUEUE_TIMEOUT_S", 2.0)
+
+# Gemini circuit breaker
+GEMINI_CALL_TIMEOUT_S = env_float("GEMINI_CALL_TIMEOUT_S", 8.0)
+GEMINI_MAX_RETRIES = env_int("GEMINI_MAX_RETRIES", 2)
+GEMINI_LATENCY_BUDGET_S = env_float("GEMINI_LATENCY_BUDGET_S", 12.0)
+GEMINI_FAILURE_THRESHOLD = env_int("GEMINI_FAILURE_THRESHOLD", 5)
+GEMINI_RESET_TIMEOUT_S = env_float("GEMINI_RESET_TIMEOUT_S", 30.0)
+GEMINI_INIT_RETRY_S = env_float("GEMINI_INIT_RETRY_S", 60.0)
+
+# Batched Gemini lookups: entries per prompt, and whether to fill the cache at startup
+GEMINI_BATCH_SIZE = env_int("GEMINI_BATCH_SIZE", 8)
+GEMINI_PREWARM_ON_START = env_bool("GEMINI_PREWARM_ON_START", False)
+
+# Pre-inference image quality gate: off, warn (report only) or reject (422).
+# Per request: ?quality=off|warn|reject
+QUALITY_GATE_MODE = env_str("QUALITY_GATE_MODE", "off")
+QUALITY_MIN_SIDE = env_int("QUALITY_MIN_SIDE", 64)
+QUALITY_MIN_BLUR_VAR = env_float("QUALITY_MIN_BLUR_VAR", 20.0)
+QUALITY_MIN_BRIGHTNESS = env_float("QUALITY_MIN_BRIGHTNESS", 25.0)
+QUALITY_MAX_BRIGHTNESS = env_float("QUALITY_MAX_BRIGHTNESS", 235.0)
+QUALITY_MIN_GREEN_RATIO = env_float("QUALITY_MIN_GREEN_RATIO", 0.03)
+
+# Image embeddings (pooled MobileNetV2 features) for similar-case lookup.
+# EMBEDDINGS_PATH defaults to <DB_PATH without .db>.embeddings.f16
+EMBEDDINGS_ENABLED = env_bool("EMBEDDINGS_ENABLED", False)
+EMBEDDINGS_PATH = env_str("EMBEDDINGS_PATH", "")
+EMBEDDING_DIM = env_int("EMBEDDING_DIM", 1280)
+# Exact search below this many vectors, then an IVF index trained in the background
+EMBEDDINGS_IVF_MIN_ROWS = env_int("EMBEDDINGS_IVF_MIN_ROWS", 50000)
+EMBEDDINGS_NPROBE = env_int("EMBEDDINGS_NPROBE", 8)
+
+# Model registry: loaded versions kept in memory (active + rollback target + spares),
+# warm-up batch size, and the file workers poll to follow admin swaps
+MODEL_KEEP_VERSIONS = env_int("MODEL_KEEP_VERSIONS", 3)
+MODEL_WARMUP_BATCH = env_int("MODEL_WARMUP_BATCH", 8)
+MODEL_CONTROL_PATH = env_str("MODEL_CONTROL_PATH", "")
+MODEL_CONTROL_POLL_S = env_float("MODEL_CONTROL_POLL_S", 2.0)
+
+# Upload limits: decoded image bytes, whole request body (base64 is ~4/3 larger,
+# so the default leaves room for a data URL of a maximal image) and pixel count
+MAX_UPLOAD_BYTES = env_int("MAX_UPLOAD_MB", 15) * 1024 * 1024
+MAX_REQUEST_BYTES = env_int("MAX_REQUEST_MB", 21) * 1024 * 1024
+MAX_IMAGE_PIXELS = env_int("MAX_IMAGE_PIXELS", 50_000_000)
+
+# serve.py: gunicorn profile (sync, gthread or async) and sizing. 0 = size from the CPU count.
+SERVE_PROFILE = env_str("SERVE_PROFILE", "gthread")
+SERVE_BIND = env_str("SERVE_BIND", "0.0.0.0:5000")
+SERVE_WORKERS = env_int("SERVE_WORKERS", 0)
+SERVE_THREADS = env_int("SERVE_THREADS", 0)
+SERVE_TIMEOUT_S = env_int("SERVE_TIMEOUT_S", 120)
+# Time in-flight predictions get to finish after SIGTERM
+SERVE_GRACEFUL_TIMEOUT_S = env_int("SERVE_GRACEFUL_TIMEOUT_S", 30)
+SERVE_WARMUP = env_bool("SERVE_WARMUP", True)
+
+# Compress /api/predict responses (brotli if installed, else gzip) when the client accepts it
+RESPONSE_COMPRESSION = env_bool("RESPONSE_COMPRESSION", True)
+RESPONSE_COMPRESS_MIN_BYTES = env_int("RESPONSE_COMPRESS_MIN_BYTES", 512)
@@ -0,0 +1,383 @@
+"""Image embeddings and nearest-neighbour search over past predictions.
+
+The MobileNetV2 model ends in ``GlobalAveragePooling2D -> Dense -> Dropout
+-> Dense``. ``embedding_predict`` also returns the 1280-d pooled feature,
+which is the input to the classifier head.
+
+``EmbeddingIndex`` stores L2-normalised vectors as float16 rows in a
+memory-mapped file. Row numbers are allocated in the ``embeddings`` SQLite
+table, keyed by ``images.id``, so several worker processes can append to
+the same file. Search is exact (chunked dot products) up to
+``ivf_min_rows`` vectors. Beyond that a k-means inverted file (IVF) is
+trained once in the background, by whichever worker takes the training
+lease (an ``O_EXCL`` lock file next to the data). New vectors are assigned
+to their nearest list on insert, and a query scans only the ``nprobe``
+closest lists.
+"""
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+import numpy as np
+
+def build_embedding_model(model):
+    """Keras model returning ``[probs, pooled features]`` from one forward pass.
+
+    Returns ``None`` for models that provide ``predict_with_embedding``
+    themselves. Building and tracing it is slow, so callers keep the result
+    with the model version it belongs to (``ModelEntry.embedding_model``).
+    """
+    if hasattr(model, "predict_with_embedding"):
+        return None
+    from tensorflow import keras
+
+    pool = next((layer for layer in model.layers if "GlobalAveragePooling" in type(layer).__name__), None)
+    if pool is None:
+        raise ValueError("model has no pooled feature layer to take embeddings from")
+    return keras.Model(inputs=model.inputs, outputs=[model.output, pool.output])
+
+
+def embedding_predict(model, x, embedding_model=None):
+    """Return ``(probs, embeddings)`` for a batch in a single forward pass.
+
+    Without a prebuilt ``embedding_model`` one is built for this call only.
+    """
+    if hasattr(model, "predict_with_embedding"):
+        return model.predict_with_embedding(x)
+    if embedding_model is None:
+        embedding_model = build_embedding_model(model)
+    probs, emb = embedding_model.predict(x, verbose=0)
+    return probs, emb
+
+
+def _normalize(vec):
+    vec = np.asarray(vec, dtype=np.float32).reshape(-1)
+    norm = np.linalg.norm(vec)
+    return vec / norm if norm > 0 else vec
+
+
+class EmbeddingIndex:
+    # a lease older than this is assumed to belong to a crashed trainer
+    train_lease_s = 3600
+
+    def __init__(self, db_path, data_path, dim=1280, ivf_min_rows=50000, nprobe=8, chunk_rows=2048):
+        self.db_path = db_path
+        self.data_path = data_path
+        self.centroids_path = data_path + ".centroids.npy"
+        self.lease_path = data_path + ".train.lock"
+        self.dim = dim
+        self.ivf_min_rows = ivf_min_rows
+        self.nprobe = nprobe
+        self.chunk_rows = chunk_rows
+        self.size = 0
+        self.centroids = None
+        self._centroids_mtime = None
+        self._lists = {}
+        self._unassigned = []
+        # model version of every row as a small code, so search can filter before ranking
+        self._version_codes = {}
+        self._row_versions = np.empty(0, dtype=np.int32)
+        self._mm = None
+        self._capacity = 0
+        self._training = False
+        self._lock = threading.RLock()
+        self._init_table()
+        self.sync()
+
+    # storage ----------------------------------------------------------------
+
+    def _connect(self):
+        return sqlite3.connect(self.db_path, timeout=30)
+
+    def _init_table(self):
+        conn = self._connect()
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS embeddings (
+                id TEXT PRIMARY KEY,
+                row INTEGER UNIQUE NOT NULL,
+                list_id INTEGER,
+                model_version TEXT,
+                created_at TEXT
+            )
+            """
+        )
+        conn.commit()
+        conn.close()
+
+    def _map(self, rows):
+        """Make sure the memmap covers ``rows`` rows, growing the file if needed.
+
+        Callers that grow the file hold the SQLite write lock, so two
+        processes never grow it at the same time.
+        """
+        row_bytes = self.dim * 2
+        on_disk = os.path.getsize(self.data_path) // row_bytes if os.path.exists(self.data_path) else 0
+        if rows <= self._capacity and self._mm is not None:
+            return
+        capacity = max(on_disk, rows)
+        if capacity > on_disk:
+            capacity = max(capacity, 1024, 2 * on_disk)
+            with open(self.data_path, "ab") as f:
+                f.truncate(capacity * row_bytes)
+        self._mm = np.memmap(self.data_path, dtype=np.float16, mode="r+", shape=(capacity, self.dim))
+        self._capacity = capacity
+
+    def _nearest_list(self, vec):
+        return int(np.argmax(self.centroids @ vec)) if self.centroids is not None else None
+
+    def add(self, id_, vec, model_version=None):
+        """Store the embedding for ``images.id`` = ``id_``. Returns its row."""
+        vec = _normalize(vec)
+        with self._lock:
+            self._load_centroids()
+            list_id = self._nearest_list(vec)
+            conn = self._connect()
+            try:
+                conn.execute("BEGIN IMMEDIATE")
+                row = conn.execute("SELECT COALESCE(MAX(row), -1) + 1 FROM embeddings").fetchone()[0]
+                self._map(row + 1)
+                self._mm[row] = vec.astype(np.float16)
+                conn.execute(
+                    "INSERT INTO embeddings (id, row, list_id, model_version, created_at) VALUES (?,?,?,?,?)",
+                    (id_, row, list_id, model_version, datetime.utcnow().isoformat()),
+                )
+                conn.commit()
+            finally:
+                conn.close()
+        self.sync()
+        return row
+
+    def row_of(self, id_):
+        conn = self._connect()
+        found = conn.execute("SELECT row FROM embeddings WHERE id=?", (id_,)).fetchone()
+        conn.close()
+        return found[0] if found else None
+
+    def vector(self, id_):
+        row = self.row_of(id_)
+        if row is None:
+            return None
+        self.sync()
+        return np.asarray(self._mm[row], dtype=np.float32)
+
+    def ids_for_rows(self, rows):
+        if not rows:
+            return {}
+        conn = self._connect()
+        marks = ",".join("?" * len(rows))
+        found = conn.execute(f"SELECT row, id FROM embeddings WHERE row IN ({marks})", [int(r) for r in rows]).fetchall()
+        conn.close()
+        return dict(found)
+
+    # incremental index ------------------------------------------------------
+
+    def _load_centroids(self):
+        """Pick up centroids trained by this or another process."""
+        try:
+            mtime = os.path.getmtime(self.centroids_path)
+        except OSError:
+            return False
+        if mtime == self._centroids_mtime:
+            return False
+        self.centroids = np.load(self.centroids_path)
+        self._centroids_mtime = mtime
+        return True
+
+    def sync(self):
+        """Add rows written since the last sync (by any process) to the in-memory lists."""
+        with self._lock:
+            reload_all = self._load_centroids()
+            start = 0 if reload_all else self.size
+            if reload_all:
+                self._lists, self._unassigned = {}, []
+            conn = self._connect()
+            rows = conn.execute(
+                "SELECT row, list_id, model_version FROM embeddings WHERE row >= ? ORDER BY row", (start,)
+            ).fetchall()
+            conn.close()
+            if not rows:
+                return
+            self._map(rows[-1][0] + 1)
+            if len(self._row_versions) <= rows[-1][0]:
+                grown = np.full(max(rows[-1][0] + 1, 2 * len(self._row_versions)), -1, dtype=np.int32)
+                grown[: len(self._row_versions)] = self._row_versions
+                self._row_versions = grown
+            for row, list_id, model_version in rows:
+                self._row_versions[row] = self._version_code(model_version)
+                if list_id is None or self.centroids is None:
+                    self._unassigned.append(row)
+                else:
+                    self._lists.setdefault(list_id, []).append(row)
+            self.size = max(self.size, rows[-1][0] + 1)
+            if self.centroids is not None and self._unassigned:
+                self._assign_unassigned()
+            if (self.centroids is None and self.size >= self.ivf_min_rows and not self._training
+                    and self._acquire_training_lease()):
+                self._training = True
+                threading.Thread(target=self._train_in_background, name="embedding-ivf-train", daemon=True).start()
+
+    def _version_code(self, model_version):
+        if model_version is None:
+            return -1
+        return self._version_codes.setdefault(model_version, len(self._version_codes))
+
+    def _assign_unassigned(self):
+        """Put rows stored without a list (e.g. added while centroids were trained) in their nearest list."""
+        rows = np.asarray(self._unassigned, dtype=np.int64)
+        lists = np.argmax(np.asarray(self._mm[rows], dtype=np.float32) @ self.centroids.T, axis=1)
+        conn = self._connect()
+        try:
+            # another worker may assign the same rows; both pick the same nearest list
+            conn.executemany(
+                "UPDATE embeddings SET list_id=? WHERE row=? AND list_id IS NULL",
+                [(int(lst), int(row)) for row, lst in zip(rows, lists)],
+            )
+            conn.commit()
+        finally:
+            conn.close()
+        for row, lst in zip(rows, lists):
+            self._lists.setdefault(int(lst), []).append(int(row))
+        self._unassigned = []
+
+    # training ---------------------------------------------------------------
+
+    def _acquire_training_lease(self):
+        """Create the lease file; False if another process holds a live lease."""
+        for _ in range(2):
+            try:
+                fd = os.open(self.lease_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            except FileExistsError:
+                try:
+                    if time.time() - os.path.getmtime(self.lease_path) < self.train_lease_s:
+                        return False
+                    os.remove(self.lease_path)
+                except OSError:
+                    pass  # released or broken by another process meanwhile; retry once
+                continue
+            with os.fdopen(fd, "w") as f:
+                f.write(str(os.getpid()))
+            return True
+        return False
+
+    def _release_training_lease(self):
+        try:
+            os.remove(self.lease_path)
+        except OSError:
+            pass
+
+    def _train_in_background(self):
+        try:
+            # another worker may have published centroids before we took the lease
+            with self._lock:
+                self._load_centroids()
+                trained = self.centroids is not None
+            if not trained:
+                self._fit()
+        finally:
+            self._release_training_lease()
+            self._training = False
+
+    def train(self, sample=20000, iters=8, seed=0):
+        """Train IVF centroids with k-means on a sample and assign every row.
+
+        Returns False without training when another process holds the lease.
+        """
+        if not self._acquire_training_lease():
+            return False
+        try:
+            self._fit(sample, iters, seed)
+        finally:
+            self._release_training_lease()
+        return True
+
+    def _fit(self, sample=20000, iters=8, seed=0):
+        with self._lock:
+            n = self.size
+            mm = self._mm
+        if n == 0:
+            return
+        rng = np.random.default_rng(seed)
+        nlist = int(np.clip(np.sqrt(n), 16, 4096))
+        picks = np.sort(rng.choice(n, size=min(sample, n), replace=False))
+        data = np.asarray(mm[picks], dtype=np.float32)
+        centroids = data[rng.choice(len(data), size=min(nlist, len(data)), replace=False)].copy()
+        for _ in range(iters):
+            assign = np.argmax(data @ centroids.T, axis=1)
+            for c in range(len(centroids)):
+                members = data[assign == c]
+                if len(members):
+                    centroids[c] = _normalize(members.mean(axis=0))
+
+        updates = []
+        for start in range(0, n, self.chunk_rows):
+            block = np.asarray(mm[start : min(n, start + self.chunk_rows)], dtype=np.float32)
+            lists = np.argmax(block @ centroids.T, axis=1)
+            updates.extend((int(lst), start + i) for i, lst in enumerate(lists))
+        conn = self._connect()
+        conn.executemany("UPDATE embeddings SET list_id=? WHERE row=?", updates)
+        conn.commit()
+        conn.close()
+
+        tmp = self.centroids_path + ".tmp.npy"
+        np.save(tmp, centroids)
+        os.replace(tmp, self.centroids_path)
+        # picks up the centroids and assigns rows added while training
+        self.sync()
+
+    def _candidates(self, q):
+        if self.centroids is None:
+            return None
+        probe = np.argsort(-(self.centroids @ q))[: self.nprobe]
+        parts = [np.asarray(self._lists.get(int(p), []), dtype=np.int64) for p in probe]
+        parts.append(np.asarray(self._unassigned, dtype=np.int64))
+        return np.sort(np.concatenate(parts))
+
+    def search(self, vec, k=10, exclude_rows=(), model_version=None):
+        """Return ``[(row, cosine_similarity), ...]``, best first.
+
+        With ``model_version`` only rows embedded by that model version are
+        ranked; vectors from other versions live in a different space.
+        """
+        self.sync()
+        q = _normalize(vec)
+        with self._lock:
+            if self.size == 0:
+                return []
+            candidates = self._candidates(q)
+            mm = self._mm
+            n = self.size
+            if model_version is not None:
+                code = self._version_codes.get(model_version)
+                versions = self._row_versions[:n]
+                if candidates is None:
+                    candidates = np.flatnonzero(versions == code) if code is not None else np.empty(0, np.int64)
+                else:
+                    candidates = candidates[versions[candidates] == code] if code is not None else candidates[:0]
+        if candidates is None:
+            chunks = ((np.arange(s, min(n, s + self.chunk_rows)), mm[s : min(n, s + self.chunk_rows)])
+                      for s in range(0, n, self.chunk_rows))
+        else:
+            chunks = ((candidates[s : s + self.chunk_rows], mm[candidates[s : s + self.chunk_rows]])
+                      for s in range(0, len(candidates), self.chunk_rows))
+
+        # float16 has no BLAS kernel, so each chunk is widened into one small
+        # reused float32 buffer instead of copying the whole store per query
+        buf = np.empty((min(self.chunk_rows, n), self.dim), dtype=np.float32)
+        best_rows, best_scores = np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        want = k + len(exclude_rows)
+        for rows, block in chunks:
+            chunk = buf[: len(block)]
+            chunk[...] = block
+            scores = chunk @ q
+            if len(scores) > want:
+                top = np.argpartition(-scores, want - 1)[:want]
+                rows, scores = rows[top], scores[top]
+            best_rows = np.concatenate([best_rows, rows])
+            best_scores = np.concatenate([best_scores, scores])
+        order = np.argsort(-best_scores, kind="stable")
+        excluded = set(int(r) for r in exclude_rows)
+        out = [(int(best_rows[i]), float(best_scores[i])) for i in order if int(best_rows[i]) not in excluded]
+        return out[:k]
@@ -0,0 +1,95 @@
+"""Prompt building and response validation for batched Gemini lookups.
+
+One prompt asks for several ``(crop, disease)`` reports at once and expects
+a JSON array back. The parser recovers every well-formed entry, even when
+others in the same response are malformed or the array is cut off, so
+valid entries can still be cached.
+"""
+import json
+import re
+
+REPORT_FIELDS = ("symptoms", "remedy", "prevention", "estimated_recovery", "organic_treatment")
+REQUIRED_FIELDS = ("symptoms", "remedy", "prevention")
+
+
+def pair_key(crop, disease):
+    """Case/spacing-insensitive key used to match entries to requests."""
+    return (re.sub(r"[\s_]+", " ", str(crop)).strip().lower(), re.sub(r"[\s_]+", " ", str(disease)).strip().lower())
+
+
+def build_batch_prompt(pairs):
+    items = "\n".join(f"{i + 1}. crop: {crop}; disease: {disease}" for i, (crop, disease) in enumerate(pairs))
+    return f"""Provide detailed information about each of these plant diseases:
+{items}
+
+Respond with a JSON array containing exactly one object per item, in the same order, each with these exact fields:
+[{{"crop": "crop name as given", "disease": "disease name as given", "symptoms": ["symptom1", "symptom2"], "remedy": "treatment text", "prevention": "prevention text", "estimated_recovery": "time", "organic_treatment": "options"}}]
+
+Respond ONLY with the JSON array, no markdown or extra text."""
+
+
+def validate_entry(obj):
+    """Return a cleaned report dict, or ``None`` if ``obj`` is unusable."""
+    if not isinstance(obj, dict):
+        return None
+    symptoms = obj.get("symptoms")
+    if isinstance(symptoms, str):
+        symptoms = [symptoms]
+    if not isinstance(symptoms, list) or not symptoms or not all(isinstance(s, str) and s.strip() for s in symptoms):
+        return None
+    cleaned = {"symptoms": [s.strip() for s in symptoms]}
+    for field in REPORT_FIELDS[1:]:
+        value = obj.get(field)
+        if value is None and field not in REQUIRED_FIELDS:
+            continue
+        if not isinstance(value, str) or not value.strip():
+            return None
+        cleaned[field] = value.strip()
+    return cleaned
+
+
+def _json_objects(text):
+    """Parse the response as an array, or salvage each top-level object in it."""
+    start, end = text.find("["), text.rfind("]")
+    if start != -1 and end > start:
+        try:
+            parsed = json.loads(text[start : end + 1])
+            if isinstance(parsed, list):
+                return parsed
+        except ValueError:
+            pass
+    decoder = json.JSONDecoder()
+    objects, pos = [], 0
+    while True:
+        pos = text.find("{", pos)
+        if pos == -1:
+            return objects
+        try:
+            obj, pos = decoder.raw_decode(text, pos)
+            objects.append(obj)
+        except ValueError:
+            pos += 1
+
+
+def parse_batch_response(text, pairs):
+    """Split a batched response into ``{(crop, disease): report}``.
+
+    Entries are matched to the requested pairs by their ``crop``/``disease``
+    fields. When those are missing, the position in the array is used if
+    the array has one entry per request. Returns ``(valid, invalid_count)``.
+    """
+    wanted = {pair_key(c, d): (c, d) for c, d in pairs}
+    objects = _json_objects(text or "")
+    positional = len(objects) == len(pairs)
+    valid, invalid = {}, 0
+    for i, obj in enumerate(objects):
+        key = pair_key(obj.get("crop", ""), obj.get("disease", "")) if isinstance(obj, dict) else None
+        pair = wanted.get(key)
+        if pair is None and positional:
+            pair = pairs[i]
+        entry = validate_entry(obj)
+        if pair is None or entry is None or pair in valid:
+            invalid += 1
+            continue
+        valid[pair] = entry
+    return valid, invalid
@@ -0,0 +1,181 @@
+"""Label registry and vectorized post-processing of model outputs.
+
+``class_labels.json`` maps ``Crop___Disease`` strings to class indices. The
+registry splits every label once at load time and keeps index-aligned numpy
+arrays (label, crop, disease, healthy flag) plus a crop-group mask, so the
+request path never rebuilds ``{index: label}`` dicts or re-splits strings.
+
+``postprocess_batch`` works on a whole ``(N, num_classes)`` probability
+matrix, so single-image requests and batch scoring share the same code.
+"""
+import numpy as np
+
+# Defaults for the confidence checks in ``postprocess_batch`` (percent)
+LOW_CONFIDENCE_THRESHOLD = 50.0
+CLOSE_CONFIDENCE_GAP = 15.0
+AMBIGUITY_THRESHOLD = 8.0
+GOOD_CONFIDENCE_THRESHOLD = 70.0
+
+
+def split_label(label):
+    """Return raw ``(crop, disease)`` for a ``Crop___Disease`` label."""
+    if "___" in label:
+        crop, disease = label.split("___", 1)
+        return crop, disease
+    return label, ("healthy" if "healthy" in label.lower() else "unknown")
+
+
+class LabelRegistry:
+    """Index-aligned label metadata built once from ``{label: index}``."""
+
+    def __init__(self, label_to_index):
+        self.index = {str(k): int(v) for k, v in label_to_index.items()}
+        n = max(self.index.values()) + 1 if self.index else 0
+        self.labels = np.array(["unknown"] * n, dtype=object)
+        for lbl, idx in self.index.items():
+            self.labels[idx] = lbl
+
+        parts = [split_label(lbl) for lbl in self.labels]
+        self.crops = np.array([c for c, _ in parts], dtype=object)
+        self.diseases = np.array([d for _, d in parts], dtype=object)
+        self.crop_display = np.array([c.replace("_", " ") for c in self.crops], dtype=object)
+        self.disease_display = np.array([d.replace("_", " ") for d in self.diseases], dtype=object)
+        self.is_healthy = np.array(["healthy" in lbl.lower() for lbl in self.labels], dtype=bool)
+
+        # crop groups: crop_names[g] is the raw crop of group g, crop_ids[i] the group of class i
+        self.crop_names = list(dict.fromkeys(self.crops.tolist()))
+        self.crop_names_display = [c.replace("_", " ") for c in self.crop_names]
+        group_of = {c: g for g, c in enumerate(self.crop_names)}
+        self.crop_ids = np.array([group_of[c] for c in self.crops], dtype=np.int64)
+        self.crop_masks = np.zeros((len(self.crop_names), n), dtype=bool)
+        self.crop_masks[self.crop_ids, np.arange(n)] = True
+        self._parts = {lbl: p for lbl, p in zip(self.labels.tolist(), parts)}
+
+    def __len__(self):
+        return len(self.labels)
+
+    def label(self, idx):
+        idx = int(idx)
+        return self.labels[idx] if 0 <= idx < len(self.labels) else "unknown"
+
+    def parts(self, label):
+        """Raw ``(crop, disease)`` for a label, without re-splitting known ones."""
+        found = self._parts.get(label)
+        return found if found is not None else split_label(label)
+
+    def crop_of(self, label):
+        return self.parts(label)[0]
+
+    def disease_name(self, label):
+        """Readable disease name (underscores replaced)."""
+        if "___" not in label:
+            return label
+        return self.parts(label)[1].replace("_", " ")
+
+
+def temperature_scale(probs, T):
+    """Temperature-scale probability rows (1-D or 2-D) and renormalize."""
+    try:
+        T = float(T) if T and float(T) > 0 else 1.0
+    except Exception:
+        T = 1.0
+    probs = np.asarray(probs, dtype=np.float64)
+    logits = np.log(np.clip(probs, 1e-12, 1.0)) / T
+    exps = np.exp(logits - logits.max(axis=-1, keepdims=True))
+    return exps / exps.sum(axis=-1, keepdims=True)
+
+
+def top_k(probs, k=3):
+    """Indices and values of the ``k`` largest entries per row, descending.
+
+    Uses ``argpartition`` so only the selected ``k`` columns are sorted.
+    """
+    probs = np.atleast_2d(probs)
+    k = min(k, probs.shape[1])
+    part = np.argpartition(-probs, k - 1, axis=1)[:, :k]
+    vals = np.take_along_axis(probs, part, axis=1)
+    order = np.argsort(-vals, axis=1, kind="stable")
+    idx = np.take_along_axis(part, order, axis=1)
+    return idx, np.take_along_axis(vals, order, axis=1)
+
+
+def postprocess_batch(
+    registry,
+    probs,
+    k=3,
+    low_threshold=LOW_CONFIDENCE_THRESHOLD,
+    close_gap=CLOSE_CONFIDENCE_GAP,
+    ambiguity_threshold=AMBIGUITY_THRESHOLD,
+    good_threshold=GOOD_CONFIDENCE_THRESHOLD,
+):
+    """Top-k alternatives and confidence flags for a batch of probability rows.
+
+    ``probs`` are (already temperature-scaled) probabilities in [0, 1].
+    Returns a dict of arrays with one row per input:
+
+    - ``top_idx`` / ``top_labels`` / ``top_conf``: (N, k), confidence in percent
+    - ``low_reason``: ``None``, ``"top_prediction_low"`` or ``"top_2_too_close"``
+    - ``quality``: ``"poor"``, ``"moderate"`` or ``"good"``
+    - ``ambiguous``: top-1 and top-2 share a crop and are within ``ambiguity_threshold``
+    """
+    idx, vals = top_k(probs, k)
+    conf = vals * 100.0
+    n = conf.shape[0]
+    top1 = conf[:, 0]
+    if conf.shape[1] >= 2:
+        gap = conf[:, 0] - conf[:, 1]
+        same_crop = registry.crop_ids[idx[:, 0]] == registry.crop_ids[idx[:, 1]]
+    else:
+        gap = np.full(n, np.inf)
+        same_crop = np.zeros(n, dtype=bool)
+
+    low = top1 < low_threshold
+    close = ~low & (gap < close_gap)
+    low_reason = np.full(n, None, dtype=object)
+    low_reason[low] = "top_prediction_low"
+    low_reason[close] = "top_2_too_close"
+
+    quality = np.where(top1 >= good_threshold, "good", "moderate").astype(object)
+    quality[low | close] = "poor"
+
+    return {
+        "top_idx": idx,
+        "top_labels": registry.labels[idx],
+        "top_conf": conf,
+        "low_reason": low_reason,
+        "quality": quality,
+        "ambiguous": same_crop & (np.abs(gap) <= ambiguity_threshold),
+    }
+
+
+def crop_marginals(registry, probs):
+    """Per-crop probability mass, shape (N, num_crops), in [0, 1]."""
+    probs = np.atleast_2d(probs)
+    return probs @ registry.crop_masks.T.astype(probs.dtype)
+
+
+def restrict_to_crops(registry, probs, crop_groups):
+    """Zero every class outside ``crop_groups[i]`` for each row ``i``."""
+    probs = np.atleast_2d(probs)
+    return probs * registry.crop_masks[np.asarray(crop_groups)]
+
+
+def within_crop_alternatives(alternatives, crop_confidence, min_share):
+    """Keep alternatives holding at least ``min_share`` percent of their crop's probability.
+
+    ``crop_confidence`` is the crop's mass in percent. The top alternative is always kept.
+    """
+    if crop_confidence <= 0:
+        return alternatives[:1]
+    return alternatives[:1] + [
+        alt for alt in alternatives[1:] if alt["confidence"] * 100.0 / crop_confidence >= min_share
+    ]
+
+
+def alternatives_for(result, row):
+    """``[{"label", "confidence"}, ...]`` for one row of ``postprocess_batch``."""
+    return [
+        {"label": str(lbl), "confidence": float(c)}
+        for lbl, c in zip(result["top_labels"][row], result["top_conf"][row])
+        if c > 0
+    ]
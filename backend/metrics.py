@@ -0,0 +1,57 @@
+"""In-process counters and timing summaries, served at ``/api/metrics``.
+
+Values are per worker process; scrape every worker (or sum them) when
+running under gunicorn with several workers.
+"""
+import threading
+
+
+class Metrics:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._gauges = {}
+        self._timings = {}
+
+    def inc(self, name, value=1):
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+
+    def set_gauge(self, name, value):
+        with self._lock:
+            self._gauges[name] = value
+
+    def observe(self, name, value):
+        """Record one sample (e.g. milliseconds) into a count/sum/max summary."""
+        with self._lock:
+            t = self._timings.setdefault(name, {"count": 0, "sum": 0.0, "max": 0.0})
+            t["count"] += 1
+            t["sum"] += value
+            t["max"] = max(t["max"], value)
+
+    def mean(self, name, default=0.0):
+        """Mean of the samples recorded with ``observe``."""
+        with self._lock:
+            t = self._timings.get(name)
+            return t["sum"] / t["count"] if t and t["count"] else default
+
+    def get(self, name, default=0):
+        with self._lock:
+            return self._counters.get(name, self._gauges.get(name, default))
+
+    def snapshot(self):
+        with self._lock:
+            timings = {
+                name: dict(t, mean=(t["sum"] / t["count"]) if t["count"] else 0.0)
+                for name, t in self._timings.items()
+            }
+            return {"counters": dict(self._counters), "gauges": dict(self._gauges), "timings": timings}
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+            self._gauges.clear()
+            self._timings.clear()
+
+
+METRICS = Metrics()
@@ -0,0 +1,214 @@
+"""Versioned models that can be loaded, swapped and rolled back at runtime.
+
+A version is a model paired with the label map it was trained on. New
+versions are loaded and warmed up in a background thread, then made
+active by replacing a single reference. Requests that already hold the
+old entry finish on it. The previously active entry stays loaded, so
+rollback is just another swap.
+
+Each worker process has its own registry. ``write_control``/``read_control``
+store the desired version in a small JSON file. The other workers poll it
+and load or activate the same version, so one admin call reaches all of
+them.
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+from datetime import datetime
+
+import numpy as np
+
+from labels import LabelRegistry
+from metrics import METRICS
+
+LOADING = "loading"
+READY = "ready"
+FAILED = "failed"
+
+
+def file_version(model_path, labels_path):
+    """Version id from the model and label files' contents, e.g. ``MobileNetV2_best-1a2b3c4d5e6f``."""
+    digest = hashlib.sha256()
+    for path in (model_path, labels_path):
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                digest.update(block)
+    return f"{os.path.splitext(os.path.basename(model_path))[0]}-{digest.hexdigest()[:12]}"
+
+
+def warm_up(model, num_classes, batch_sizes=(1, 8), input_shape=(224, 224, 3)):
+    """Run a few batches so graph tracing and allocation happen before traffic.
+
+    Raises ``ValueError`` if the output does not match the label map.
+    """
+    started = time.perf_counter()
+    for n in batch_sizes:
+        out = np.asarray(model.predict(np.zeros((n,) + tuple(input_shape), dtype=np.float32), verbose=0))
+        if out.shape != (n, num_classes):
+            raise ValueError(f"model output shape {out.shape} does not match {num_classes} labels")
+    return (time.perf_counter() - started) * 1000.0
+
+
+class ModelEntry:
+    def __init__(self, version, model=None, labels=None, source=None, state=READY):
+        self.version = version
+        self.model = model
+        self.labels = labels
+        self.label_registry = LabelRegistry(labels) if labels is not None else None
+        self.source = source or {}
+        self.state = state
+        self.error = None
+        self.loaded_at = None
+        self.warmup_ms = None
+        # derived models (e.g. the embedding model) live and die with the version
+        self.embedding_model = None
+
+    def describe(self):
+        return {
+            "version": self.version,
+            "state": self.state,
+            "num_classes": len(self.labels) if self.labels is not None else None,
+            "source": self.source,
+            "loaded_at": self.loaded_at,
+            "warmup_ms": self.warmup_ms,
+            "error": self.error,
+        }
+
+
+class ModelRegistry:
+    """Holds loaded model versions for one process.
+
+    ``loader(model_path, num_classes)`` returns a model object (or ``None``).
+    ``on_activate(entry)`` runs under the registry lock whenever the active
+    version changes. ``prepare(entry)`` runs in the loading thread after
+    warm-up, before the version can be activated.
+    """
+
+    def __init__(self, loader=None, on_activate=None, keep=3, warmup_batches=(1, 8), prepare=None):
+        self.loader = loader
+        self.on_activate = on_activate
+        self.prepare = prepare
+        self.keep = max(2, int(keep))
+        self.warmup_batches = warmup_batches
+        self.entries = {}
+        self.active = None
+        self.previous = None
+        self._lock = threading.RLock()
+
+    def get(self, version):
+        with self._lock:
+            return self.entries.get(version)
+
+    def register(self, version, model, labels, source=None, activate=False):
+        """Add an already-loaded model (no warm-up) and optionally activate it."""
+        entry = ModelEntry(version, model, labels, source)
+        entry.loaded_at = datetime.utcnow().isoformat()
+        with self._lock:
+            self.entries[version] = entry
+            if activate:
+                self.activate(version)
+        return entry
+
+    def load(self, model_path, labels_path, version=None, activate=True):
+        """Load, warm up and register a version in the calling thread."""
+        version = version or file_version(model_path, labels_path)
+        source = {"model_path": model_path, "labels_path": labels_path}
+        with self._lock:
+            entry = self.entries.get(version)
+            if entry is None or entry.state == FAILED:
+                entry = self.entries[version] = ModelEntry(version, source=source, state=LOADING)
+            elif entry.state == LOADING:
+                return entry
+            else:
+                if activate:
+                    self.activate(version)
+                return entry
+        try:
+            with open(labels_path, "r", encoding="utf-8") as f:
+                labels = json.load(f)
+            model = self.loader(model_path, len(labels))
+            if model is None:
+                raise RuntimeError(f"could not load {model_path}")
+            warmup_ms = warm_up(model, len(labels), self.warmup_batches)
+            # not activatable until READY, so filling the entry here is safe
+            entry.model, entry.labels = model, labels
+            entry.label_registry = LabelRegistry(labels)
+            if self.prepare:
+                self.prepare(entry)
+        except Exception as e:
+            entry.model = entry.embedding_model = None
+            entry.state, entry.error = FAILED, str(e)
+            METRICS.inc("model_load_failures")
+            print(f"Model version {version} failed to load: {e}")
+            return entry
+        with self._lock:
+            entry.warmup_ms = warmup_ms
+            entry.loaded_at = datetime.utcnow().isoformat()
+            entry.state = READY
+            METRICS.inc("model_loads")
+            if activate:
+                self.activate(version)
+        return entry
+
+    def load_async(self, model_path, labels_path, version=None, activate=True):
+        """Start ``load`` in a background thread and return the version id."""
+        version = version or file_version(model_path, labels_path)
+        threading.Thread(
+            target=self.load, args=(model_path, labels_path, version, activate), name=f"model-load-{version}", daemon=True
+        ).start()
+        return version
+
+    def activate(self, version):
+        with self._lock:
+            entry = self.entries.get(version)
+            if entry is None or entry.state != READY:
+                raise KeyError(f"model version {version} is not loaded")
+            if self.active is not entry:
+                self.previous, self.active = self.active, entry
+                if self.on_activate:
+                    self.on_activate(entry)
+                METRICS.inc("model_swaps")
+                METRICS.set_gauge("model_version", version)
+                print(f"Active model version: {version}")
+            self._evict()
+            return entry
+
+    def rollback(self):
+        """Swap back to the previously active version."""
+        with self._lock:
+            if self.previous is None:
+                raise KeyError("no previous model version to roll back to")
+            return self.activate(self.previous.version)
+
+    def _evict(self):
+        """Drop the oldest ready versions beyond ``keep``, never the active or previous one."""
+        pinned = {e.version for e in (self.active, self.previous) if e is not None}
+        ready = [e for e in self.entries.values() if e.state == READY and e.version not in pinned]
+        for entry in ready[: max(0, len(ready) + len(pinned) - self.keep)]:
+            del self.entries[entry.version]
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "active": self.active.version if self.active else None,
+                "previous": self.previous.version if self.previous else None,
+                "versions": [e.describe() for e in self.entries.values()],
+            }
+
+
+def write_control(path, entry):
+    """Record ``entry`` as the version every worker should run."""
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(dict(entry.source, version=entry.version), f)
+    os.replace(tmp, path)
+
+
+def read_control(path):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
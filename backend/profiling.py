@@ -0,0 +1,235 @@
+"""Opt-in sampling profiler for individual API requests.
+
+A profiled request gets a background thread that samples the request
+thread's Python stack every ``PROFILE_INTERVAL_MS``. Samples are stored as
+collapsed stacks (``a;b;c <count>``, the flamegraph.pl / speedscope input
+format) and can be exported as speedscope JSON.
+
+When neither ``PROFILE_SAMPLE_RATE`` nor ``PROFILE_HEADER_ENABLED`` is set,
+``profile_request`` returns the view unchanged, so there is no overhead.
+"""
+import json
+import os
+import random
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from datetime import datetime
+from functools import wraps
+
+import config
+
+PROFILE_HEADER = "X-Profile"
+PROFILE_FILE_RE = re.compile(r"^[0-9a-f]{32}\.json$")
+
+
+def _frame_name(frame):
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class SamplingProfiler:
+    """Sample one thread's stack at a fixed interval until stopped."""
+
+    def __init__(self, thread_id=None, interval_ms=5.0):
+        self.thread_id = thread_id if thread_id is not None else threading.get_ident()
+        self.interval = max(interval_ms, 0.5) / 1000.0
+        self.stacks = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="request-profiler", daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            names = []
+            while frame is not None:
+                names.append(_frame_name(frame))
+                frame = frame.f_back
+            self.stacks[";".join(reversed(names))] += 1
+            self.samples += 1
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        return self
+
+
+def to_collapsed(stacks):
+    return "\n".join(f"{stack} {count}" for stack, count in sorted(stacks.items())) + "\n"
+
+
+def to_speedscope(stacks, name, interval_ms):
+    """Build a speedscope "sampled" profile from collapsed stacks."""
+    frames = []
+    index = {}
+    samples = []
+    weights = []
+    for stack, count in sorted(stacks.items()):
+        ids = []
+        for frame in stack.split(";"):
+            if frame not in index:
+                index[frame] = len(frames)
+                func, _, where = frame.partition(" (")
+                file_, _, line = where.rstrip(")").rpartition(":")
+                frames.append({"name": func, "file": file_, "line": int(line) if line.isdigit() else None})
+            ids.append(index[frame])
+        samples.append(ids)
+        weights.append(count * interval_ms)
+    total = float(sum(weights))
+    return {
+        "$schema": "https://www.speedscope.app/file-format-schema.json",
+        "shared": {"frames": frames},
+        "profiles": [
+            {
+                "type": "sampled",
+                "name": name,
+                "unit": "milliseconds",
+                "startValue": 0,
+                "endValue": total,
+                "samples": samples,
+                "weights": weights,
+            }
+        ],
+        "name": name,
+        "activeProfileIndex": 0,
+        "exporter": "plant-disease-backend",
+    }
+
+
+class ProfileStore:
+    """Keep the most recent ``keep`` profiles as files in ``directory``.
+
+    The directory is the index: every worker writes there, and listing,
+    loading and pruning all read it, so any worker can serve a profile
+    recorded by another.
+    """
+
+    def __init__(self, directory, keep=50):
+        self.directory = directory
+        self._keep = keep
+
+    def _path(self, profile_id):
+        return os.path.join(self.directory, f"{profile_id}.json")
+
+    def _files(self):
+        """``(mtime, path)`` of stored profiles, newest first."""
+        try:
+            names = os.listdir(self.directory)
+        except OSError:
+            return []
+        files = []
+        for name in names:
+            if not PROFILE_FILE_RE.match(name):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                files.append((os.path.getmtime(path), path))
+            except OSError:
+                continue  # pruned by another worker
+        files.sort(reverse=True)
+        return files
+
+    def add(self, meta, stacks):
+        os.makedirs(self.directory, exist_ok=True)
+        path = self._path(meta["id"])
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"meta": meta, "stacks": dict(stacks)}, f)
+        os.replace(tmp, path)
+        for _, old in self._files()[self._keep:]:
+            try:
+                os.remove(old)
+            except OSError:
+                pass
+
+    def _read(self, path):
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def list(self, min_ms=0.0):
+        out = []
+        for _, path in self._files()[: self._keep]:
+            doc = self._read(path)
+            if doc and doc["meta"]["duration_ms"] >= min_ms:
+                out.append(doc["meta"])
+        return out
+
+    def load(self, profile_id):
+        if not PROFILE_FILE_RE.match(f"{profile_id}.json"):
+            return None
+        doc = self._read(self._path(profile_id))
+        if doc is None:
+            return None
+        return doc["meta"], Counter(doc["stacks"])
+
+
+PROFILE_STORE = ProfileStore(config.PROFILE_DIR, keep=config.PROFILE_KEEP)
+
+
+def profiling_enabled():
+    return config.PROFILE_SAMPLE_RATE > 0 or config.PROFILE_HEADER_ENABLED
+
+
+def _requested_by_header(request):
+    if not config.PROFILE_HEADER_ENABLED or request.headers.get(PROFILE_HEADER) != "1":
+        return False
+    # profiling costs a sampler thread, so only admins may force it when a token is configured
+    return not config.ADMIN_TOKEN or request.headers.get("X-Admin-Token") == config.ADMIN_TOKEN
+
+
+def profile_request(view, store=None):
+    """Wrap a Flask view so selected requests are profiled.
+
+    A request is profiled when it sends ``X-Profile: 1`` (and header
+    triggering is enabled) or it is picked by ``PROFILE_SAMPLE_RATE``.
+    Header-triggered profiles are always kept; sampled ones only when
+    slower than ``PROFILE_SLOW_MS``.
+    """
+    if not profiling_enabled():
+        return view
+
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        from flask import make_response, request
+
+        forced = _requested_by_header(request)
+        if not forced and random.random() >= config.PROFILE_SAMPLE_RATE:
+            return view(*args, **kwargs)
+
+        profiler = SamplingProfiler(interval_ms=config.PROFILE_INTERVAL_MS).start()
+        started = time.perf_counter()
+        try:
+            resp = make_response(view(*args, **kwargs))
+        finally:
+            profiler.stop()
+            duration_ms = (time.perf_counter() - started) * 1000.0
+        if forced or duration_ms >= config.PROFILE_SLOW_MS:
+            meta = {
+                "id": uuid.uuid4().hex,
+                "method": request.method,
+                "path": request.path,
+                "status": resp.status_code,
+                "trigger": "header" if forced else "sampled",
+                "duration_ms": duration_ms,
+                "samples": profiler.samples,
+                "interval_ms": config.PROFILE_INTERVAL_MS,
+                "created_at": datetime.utcnow().isoformat(),
+            }
+            (store or PROFILE_STORE).add(meta, profiler.stacks)
+            resp.headers["X-Profile-Id"] = meta["id"]
+        return resp
+
+    return wrapper
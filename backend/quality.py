@@ -0,0 +1,89 @@
+"""Cheap image quality checks run before the model.
+
+All measurements use a small thumbnail, so a check takes a few
+milliseconds regardless of upload size. ``open_thumbnail`` builds it
+without a full-resolution decode (JPEG DCT scaling via ``draft``):
+
+- resolution: the shorter side of the original image
+- blur: variance of the Laplacian of the grayscale thumbnail
+- exposure: mean brightness
+- leaf content: fraction of "green" pixels (excess-green index)
+"""
+import time
+
+import numpy as np
+from PIL import Image
+
+THUMBNAIL_SIZE = (128, 128)
+
+
+def laplacian_variance(gray):
+    """Variance of the 4-neighbour Laplacian (low = blurry)."""
+    lap = (
+        gray[:-2, 1:-1] + gray[2:, 1:-1] + gray[1:-1, :-2] + gray[1:-1, 2:]
+        - 4.0 * gray[1:-1, 1:-1]
+    )
+    return float(lap.var()) if lap.size else 0.0
+
+
+def green_ratio(rgb, threshold=0.05):
+    """Fraction of pixels whose excess-green index ``2g - r - b`` exceeds ``threshold``.
+
+    Uses chromatic coordinates (channel / sum), so it is insensitive to brightness.
+    """
+    total = rgb.sum(axis=2) + 1e-6
+    r, g, b = (rgb[..., i] / total for i in range(3))
+    return float(((2 * g - r - b) > threshold).mean())
+
+
+def open_thumbnail(path, size=THUMBNAIL_SIZE):
+    """Decode ``path`` at reduced size. Returns ``(thumbnail, original_size)``.
+
+    JPEGs are decoded directly at 1/2 to 1/8 scale; other formats are
+    decoded and shrunk with ``reduce`` before resampling.
+    """
+    with Image.open(path) as img:
+        original_size = img.size
+        img.draft("RGB", (size[0] * 2, size[1] * 2))
+        thumb = img.convert("RGB")
+    thumb.thumbnail(size, reducing_gap=2.0)
+    return thumb, original_size
+
+
+def assess_image(img, min_side=64, min_blur_var=20.0, min_brightness=25.0, max_brightness=235.0, min_green_ratio=0.03,
+                 original_size=None):
+    """Measure a PIL image and list the checks it fails.
+
+    ``original_size`` is the upload's size when ``img`` is already a
+    thumbnail. Returns a dict with the measurements, ``reasons`` (empty when
+    the image passes) and ``elapsed_ms``.
+    """
+    start = time.perf_counter()
+    width, height = original_size or img.size
+    scale = min(THUMBNAIL_SIZE[0] / img.width, THUMBNAIL_SIZE[1] / img.height, 1.0)
+    thumb = img.resize((max(1, round(img.width * scale)), max(1, round(img.height * scale))), reducing_gap=2.0)
+    rgb = np.asarray(thumb.convert("RGB"), dtype=np.float32)
+    gray = rgb @ np.array([0.299, 0.587, 0.114], dtype=np.float32)
+
+    metrics = {
+        "width": width,
+        "height": height,
+        "blur_variance": laplacian_variance(gray),
+        "brightness": float(gray.mean()),
+        "green_ratio": green_ratio(rgb),
+    }
+    reasons = []
+    if min(width, height) < min_side:
+        reasons.append("too_small")
+    if metrics["blur_variance"] < min_blur_var:
+        reasons.append("too_blurry")
+    if metrics["brightness"] < min_brightness:
+        reasons.append("too_dark")
+    elif metrics["brightness"] > max_brightness:
+        reasons.append("overexposed")
+    if metrics["green_ratio"] < min_green_ratio:
+        reasons.append("not_a_leaf")
+    metrics["reasons"] = reasons
+    metrics["passed"] = not reasons
+    metrics["elapsed_ms"] = (time.perf_counter() - start) * 1000.0
+    return metrics
@@ -0,0 +1,139 @@
+"""Compact, compressed and binary encodings for prediction responses.
+
+Chosen per request:
+
+- compact mode (``?compact=1`` or ``Prefer: return=minimal``) replaces
+  ``alternative_reports`` with a ``reports`` map keyed by label, holding each
+  report once. The primary ``report`` keeps only a ``ref`` to its label and
+  the fields that differ from that entry (confidence, warnings, ambiguity
+  details); ``expand_report`` restores it. ``None`` values are dropped.
+- ``?fields=label,confidence,report.remedy`` keeps only the listed
+  (optionally dotted) fields.
+- ``Accept: application/msgpack`` (or ``?format=msgpack``) encodes with
+  MessagePack when ``msgpack`` is installed; otherwise the response is JSON.
+- ``Accept-Encoding`` selects brotli (if ``brotli`` is installed) or gzip
+  for bodies of at least ``min_compress_bytes``.
+"""
+import gzip
+import json
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+MSGPACK_AVAILABLE = msgpack is not None
+MSGPACK_TYPES = ("application/msgpack", "application/x-msgpack", "application/vnd.msgpack")
+
+
+def wants_compact(args, headers):
+    if args.get("compact") is not None:
+        return args.get("compact") in ("1", "true", "yes")
+    return "return=minimal" in headers.get("Prefer", "").replace(" ", "").lower()
+
+
+def compact_payload(payload):
+    """Deduplicate reports by label and drop ``None`` values."""
+    out = {k: v for k, v in payload.items() if v is not None and k != "alternative_reports"}
+    reports = {}
+    for alt in payload.get("alternative_reports") or []:
+        reports[alt["label"]] = {k: v for k, v in alt["report"].items() if k != "confidence"}
+    report = payload.get("report")
+    label = payload.get("label")
+    if isinstance(report, dict) and label in reports:
+        base = reports[label]
+        out["report"] = dict({k: v for k, v in report.items() if base.get(k, object()) != v}, ref=label)
+    if reports:
+        out["reports"] = reports
+    return out
+
+
+def expand_report(compact):
+    """The full primary report of a compact payload."""
+    report = dict(compact.get("report") or {})
+    ref = report.pop("ref", None)
+    if ref is None:
+        return report
+    return dict(compact["reports"][ref], **report)
+
+
+def _pick(value, path):
+    for part in path:
+        if not isinstance(value, dict) or part not in value:
+            return False, None
+        value = value[part]
+    return True, value
+
+
+def select_fields(payload, fields):
+    """Keep only the comma-separated (optionally dotted) ``fields``; unknown ones are ignored."""
+    out = {}
+    for field in (f.strip() for f in fields.split(",")):
+        if not field:
+            continue
+        path = field.split(".")
+        found, value = _pick(payload, path)
+        if not found:
+            continue
+        target = out
+        for part in path[:-1]:
+            target = target.setdefault(part, {})
+        target[path[-1]] = value
+    return out
+
+
+def _quality(accept, token):
+    """q-value of ``token`` in an Accept/Accept-Encoding header (0 when absent)."""
+    best = 0.0
+    for item in accept.split(","):
+        name, _, params = item.strip().partition(";")
+        if name.strip().lower() not in (token, "*"):
+            continue
+        q = 1.0
+        for param in params.split(";"):
+            key, _, val = param.strip().partition("=")
+            if key == "q":
+                try:
+                    q = float(val)
+                except ValueError:
+                    q = 0.0
+        if name.strip().lower() == token:
+            return q
+        best = max(best, q)
+    return best
+
+
+def choose_encoding(accept_encoding):
+    """``"br"``, ``"gzip"`` or ``None`` for an Accept-Encoding header."""
+    accept_encoding = accept_encoding or ""
+    options = []
+    if brotli is not None:
+        options.append(("br", _quality(accept_encoding, "br")))
+    options.append(("gzip", _quality(accept_encoding, "gzip")))
+    name, q = max(options, key=lambda o: o[1])
+    return name if q > 0 else None
+
+
+def wants_msgpack(args, headers):
+    if args.get("format"):
+        return args.get("format") == "msgpack"
+    accept = headers.get("Accept", "")
+    return any(_quality(accept, t) > _quality(accept, "application/json") for t in MSGPACK_TYPES)
+
+
+def encode(payload, use_msgpack=False, encoding=None, min_compress_bytes=512):
+    """Return ``(body, headers)`` for ``payload``."""
+    if use_msgpack and msgpack is not None:
+        body, content_type = msgpack.packb(payload, use_bin_type=True), "application/msgpack"
+    else:
+        body, content_type = json.dumps(payload, separators=(",", ":")).encode("utf-8"), "application/json"
+    headers = {"Content-Type": content_type, "Vary": "Accept, Accept-Encoding, Prefer"}
+    if encoding and len(body) >= min_compress_bytes:
+        body = brotli.compress(body, quality=5) if encoding == "br" else gzip.compress(body, compresslevel=6)
+        headers["Content-Encoding"] = encoding
+    return body, headers
@@ -1,61 +1,152 @@
 #!/usr/bin/env python3
+"""Fast inference consistency gate.
+
+Runs a fixture set of images through the model in batches and checks:
+
+1. run-to-run: repeated passes give the same probabilities (within ``--atol``)
+2. batch invariance: the first few images give the same result alone and in a batch
+3. golden: probabilities match the stored golden file (within ``--atol``) and
+   the top-1 label is unchanged
+
+Random fallbacks are never used: the script exits with an error when the
+model is not loaded. Exit code is 0 on pass, 1 on mismatch and 2 on setup
+errors, so it can gate a deploy.
+
+Usage:
+  python run_consistency_tests.py --fixtures fixtures/consistency --update-golden   # record
+  python run_consistency_tests.py --fixtures fixtures/consistency                   # check
+  python run_consistency_tests.py --synthetic 32 --stub-model --update-golden       # harness self-test
+"""
+import argparse
 import os
 import sys
-import json
-from pathlib import Path
-
-# Import backend app (loads MODEL and LABELS)
-try:
-    import app as backend_app
-except Exception as e:
-    print("Failed to import backend app:", e)
-    sys.exit(2)
-
-DATASET_ROOT = Path(r"a:\Downloads\gouri project\plant disease dataset\PlantDoc-Dataset\plant disease images")
-
-classes = [
-    "Tomato___Early_blight",
-    "Tomato___healthy",
-    "Potato___Early_blight",
-    "Apple___Apple_scab",
-]
-
-if backend_app.MODEL is None:
-    print("MODEL is not loaded (MODEL is None). Predictions will fallback to random. Fix model loading first.")
-    sys.exit(1)
-
-print("MODEL loaded. Running consistency checks...\n")
-
-for cls in classes:
-    folder = DATASET_ROOT / cls
-    if not folder.exists():
-        print(f"Folder for class {cls} not found: {folder}")
-        continue
-
-    imgs = [p for p in folder.iterdir() if p.suffix.lower() in ['.jpg', '.jpeg', '.png']]
-    if not imgs:
-        print(f"No images found in {folder}")
-        continue
-
-    sample_imgs = imgs[:3]
-    print(f"\nClass: {cls} — testing {len(sample_imgs)} images")
-    for img in sample_imgs:
-        print(f"\nImage: {img.name}")
-        results = []
-        for i in range(5):
-            try:
-                label, conf = backend_app.predict_image(str(img))
-                results.append((label, round(conf, 3)))
-            except Exception as e:
-                results.append(("ERROR", str(e)))
-        print("Results (5 runs):")
-        for r in results:
-            print(" ", r)
-        # Check if all results identical
-        uniq = set(results)
-        if len(uniq) == 1:
-            print(" -> Consistent across runs")
-        else:
-            print(" -> Inconsistent across runs")
-
-print("\nDone.")
+import time
+
+import numpy as np
+from PIL import Image
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_FIXTURES = os.path.join(HERE, "fixtures", "consistency")
+IMAGE_EXTS = (".jpg", ".jpeg", ".png")
+
+
+def load_fixtures(fixtures_dir, synthetic=0):
+    """Return ``(names, [PIL images])`` sorted by relative path."""
+    if synthetic:
+        rng = np.random.default_rng(1234)
+        images = [Image.fromarray(rng.integers(0, 256, (224, 224, 3), dtype=np.uint8)) for _ in range(synthetic)]
+        return [f"synthetic/{i:04d}" for i in range(synthetic)], images
+    names = []
+    for dirpath, _, filenames in os.walk(fixtures_dir):
+        for fn in filenames:
+            if fn.lower().endswith(IMAGE_EXTS):
+                names.append(os.path.relpath(os.path.join(dirpath, fn), fixtures_dir).replace(os.sep, "/"))
+    names.sort()
+    images = []
+    for name in names:
+        with Image.open(os.path.join(fixtures_dir, name)) as img:
+            images.append(img.convert("RGB"))
+    return names, images
+
+
+def predict_all(backend, model, images, batch_size):
+    out = []
+    for i in range(0, len(images), batch_size):
+        batch = backend.preprocess_images(images[i : i + batch_size])
+        out.append(np.asarray(model.predict(batch, verbose=0), dtype=np.float64))
+    return np.concatenate(out, axis=0)
+
+
+def main(argv=None):
+    p = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    p.add_argument("--fixtures", default=DEFAULT_FIXTURES, help="Folder of fixture images")
+    p.add_argument("--golden", default=None, help="Golden .npz (default: <fixtures>/golden.npz)")
+    p.add_argument("--update-golden", action="store_true", help="Record the current outputs as golden")
+    p.add_argument("--batch-size", type=int, default=32)
+    p.add_argument("--repeats", type=int, default=2, help="Passes for the run-to-run check")
+    p.add_argument("--invariance-samples", type=int, default=4, help="Images re-run alone for batch invariance")
+    p.add_argument("--atol", type=float, default=1e-4, help="Allowed absolute probability difference")
+    p.add_argument("--synthetic", type=int, default=0, help="Use N generated images instead of --fixtures")
+    p.add_argument("--stub-model", action="store_true", help="Use the deterministic benchmark stub model")
+    args = p.parse_args(argv)
+
+    sys.path.insert(0, HERE)
+    try:
+        import app as backend
+    except Exception as e:
+        print("Failed to import backend app:", e)
+        return 2
+
+    if args.stub_model:
+        from benchmarks.stubs import StubModel
+
+        model = StubModel(num_classes=len(backend.LABELS))
+    else:
+        model = backend.MODEL
+    if model is None:
+        print("MODEL is not loaded; refusing to run (random fallbacks would make this meaningless).")
+        return 2
+
+    golden_path = args.golden or os.path.join(
+        args.fixtures, "golden_synthetic.npz" if args.synthetic else "golden.npz"
+    )
+    names, images = load_fixtures(args.fixtures, args.synthetic)
+    if not images:
+        print(f"No fixture images found in {args.fixtures}")
+        return 2
+
+    start = time.perf_counter()
+    failures = []
+
+    runs = [predict_all(backend, model, images, args.batch_size) for _ in range(max(args.repeats, 1))]
+    probs = runs[0]
+    for r, other in enumerate(runs[1:], start=2):
+        diff = float(np.max(np.abs(other - probs)))
+        if diff > args.atol:
+            failures.append(f"run-to-run: pass {r} differs from pass 1 by {diff:.2e}")
+
+    n_inv = min(args.invariance_samples, len(images))
+    if n_inv:
+        alone = predict_all(backend, model, images[:n_inv], 1)
+        diff = float(np.max(np.abs(alone - probs[:n_inv])))
+        if diff > args.atol:
+            failures.append(f"batch invariance: batch-size 1 differs from batch-size {args.batch_size} by {diff:.2e}")
+
+    top1 = probs.argmax(axis=1)
+    if args.update_golden:
+        os.makedirs(os.path.dirname(golden_path) or ".", exist_ok=True)
+        np.savez(golden_path, names=np.array(names), probs=probs.astype(np.float32), top1=top1)
+        print(f"Wrote golden outputs for {len(names)} images to {golden_path}")
+    elif not os.path.exists(golden_path):
+        print(f"Golden file {golden_path} not found; run with --update-golden first.")
+        return 2
+    else:
+        with np.load(golden_path, allow_pickle=False) as g:
+            golden = {str(n): (gp, int(gt)) for n, gp, gt in zip(g["names"], g["probs"], g["top1"])}
+        missing = [n for n in names if n not in golden]
+        if missing:
+            failures.append(f"golden: {len(missing)} fixtures have no golden entry (e.g. {missing[0]})")
+        for i, name in enumerate(names):
+            if name not in golden:
+                continue
+            gp, gt = golden[name]
+            diff = float(np.max(np.abs(probs[i] - gp)))
+            if gt != int(top1[i]):
+                failures.append(f"golden: {name} top-1 {backend.LABEL_REGISTRY.label(top1[i])} != {backend.LABEL_REGISTRY.label(gt)}")
+            elif diff > args.atol:
+                failures.append(f"golden: {name} probabilities differ by {diff:.2e}")
+
+    elapsed = time.perf_counter() - start
+    print(f"Checked {len(images)} images x {len(runs)} passes in {elapsed:.2f}s")
+    if failures:
+        for f in failures[:50]:
+            print("FAIL", f)
+        if len(failures) > 50:
+            print(f"... and {len(failures) - 50} more")
+        return 1
+    print("All consistency checks passed")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
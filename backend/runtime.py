@@ -0,0 +1,49 @@
+"""TensorFlow runtime settings that must be applied before the model loads.
+
+Thread pools and op determinism can only be configured before TensorFlow
+creates its first context, so ``configure_tensorflow`` is called from
+``app.py`` ahead of ``load_keras_model``.
+"""
+import os
+import random
+
+import numpy as np
+
+
+def configure_tensorflow(intra_op_threads=0, inter_op_threads=0, deterministic=False, seed=None):
+    """Apply thread-pool and determinism settings. Returns what was applied.
+
+    ``0`` threads keeps TensorFlow's default. Safe to call without TensorFlow
+    installed (only the environment and numpy/random seeds are set then).
+    """
+    applied = {"intra_op_threads": intra_op_threads, "inter_op_threads": inter_op_threads,
+               "deterministic": deterministic, "seed": seed, "tensorflow": False}
+    if deterministic:
+        os.environ.setdefault("TF_DETERMINISTIC_OPS", "1")
+        os.environ.setdefault("TF_CUDNN_DETERMINISTIC", "1")
+    if seed is not None:
+        random.seed(seed)
+        np.random.seed(seed)
+
+    try:
+        import tensorflow as tf
+    except Exception:
+        return applied
+
+    applied["tensorflow"] = True
+    try:
+        if intra_op_threads:
+            tf.config.threading.set_intra_op_parallelism_threads(intra_op_threads)
+        if inter_op_threads:
+            tf.config.threading.set_inter_op_parallelism_threads(inter_op_threads)
+    except RuntimeError as e:
+        # raised when TensorFlow was already initialised by an earlier import
+        print(f"Could not set TensorFlow thread pools: {e}")
+    if seed is not None:
+        tf.random.set_seed(seed)
+    if deterministic:
+        try:
+            tf.config.experimental.enable_op_determinism()
+        except Exception as e:
+            print(f"Could not enable op determinism: {e}")
+    return applied
@@ -0,0 +1,325 @@
+#!/usr/bin/env python3
+"""Bulk offline scoring of an image folder.
+
+Walks ``--images-dir`` recursively, decodes and resizes images in a process
+pool, runs batched inference and writes one output shard per
+``--shard-size`` images to ``--out-dir``. Each row has the path, predicted
+label, calibrated confidence and top-k alternatives. Shards are written
+atomically, so after a crash re-running the same command skips everything
+already scored. Images that fail to decode are listed in ``errors.jsonl``
+and skipped on later runs unless ``--retry-errors`` is given.
+
+When the parent folder of an image names a class (exactly, after
+normalisation, or via ``--label-map``), it is used as the true label and
+per-class accuracy is reported.
+
+Usage:
+  python score_folder.py --images-dir "../ML model/PlantDoc-Dataset" --out-dir scores --format parquet
+  python score_folder.py --images-dir ./samples --out-dir /tmp/scores --stub-model   # dry run, no TensorFlow
+"""
+import argparse
+import csv
+import json
+import multiprocessing
+import os
+import re
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from PIL import Image
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+IMAGE_EXTS = (".jpg", ".jpeg", ".png", ".bmp", ".webp")
+SHARD_RE = re.compile(r"^part-(\d{5})\.(csv|parquet|npz)$")
+ERRORS_FILE = "errors.jsonl"
+
+
+def decode_chunk(paths, size=(224, 224)):
+    """Decode and resize images (runs in worker processes).
+
+    Returns ``[(path, uint8 array or None, error or None), ...]``.
+    """
+    out = []
+    for path in paths:
+        try:
+            with Image.open(path) as img:
+                # let the JPEG decoder downscale while decoding when possible
+                img.draft("RGB", (size[0] * 2, size[1] * 2))
+                arr = np.asarray(img.convert("RGB").resize(size), dtype=np.uint8)
+            out.append((path, arr, None))
+        except Exception as e:
+            out.append((path, None, str(e)))
+    return out
+
+
+def find_images(root):
+    found = []
+    for dirpath, _, filenames in os.walk(root):
+        for fn in filenames:
+            if fn.lower().endswith(IMAGE_EXTS):
+                found.append(os.path.join(dirpath, fn))
+    found.sort()
+    return found
+
+
+def _norm(name):
+    return re.sub(r"[^a-z0-9]", "", name.lower())
+
+
+def folder_label_resolver(labels, label_map=None):
+    """Map an image's parent folder name to a class label (or None)."""
+    by_norm = {_norm(lbl): lbl for lbl in labels}
+    label_map = label_map or {}
+
+    def resolve(path):
+        folder = os.path.basename(os.path.dirname(path))
+        if folder in label_map:
+            return label_map[folder]
+        if folder in labels:
+            return folder
+        return by_norm.get(_norm(folder))
+
+    return resolve
+
+
+def load_label_map(path):
+    mapping = {}
+    with open(path, newline="", encoding="utf-8") as f:
+        for row in csv.reader(f):
+            if len(row) >= 2 and row[0].strip():
+                mapping[row[0].strip()] = row[1].strip()
+    return mapping
+
+
+def shard_columns(paths, true_labels, post, top_k):
+    cols = {
+        "path": paths,
+        "true_label": [t or "" for t in true_labels],
+        "label": [str(x) for x in post["top_labels"][:, 0]],
+        "confidence": post["top_conf"][:, 0].astype(float).tolist(),
+        "low_confidence_reason": [r or "" for r in post["low_reason"]],
+    }
+    for i in range(min(top_k, post["top_labels"].shape[1])):
+        cols[f"top{i + 1}_label"] = [str(x) for x in post["top_labels"][:, i]]
+        cols[f"top{i + 1}_confidence"] = post["top_conf"][:, i].astype(float).tolist()
+    return cols
+
+
+def write_shard(out_dir, index, fmt, cols, probs=None):
+    """Write a shard to a temp file and rename it into place."""
+    final = os.path.join(out_dir, f"part-{index:05d}.{fmt}")
+    tmp = final + ".tmp"
+    if fmt == "csv":
+        names = list(cols)
+        with open(tmp, "w", newline="", encoding="utf-8") as f:
+            w = csv.writer(f)
+            w.writerow(names)
+            w.writerows(zip(*(cols[n] for n in names)))
+    elif fmt == "parquet":
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        pq.write_table(pa.table(cols), tmp)
+    else:
+        arrays = {k: np.asarray(v) for k, v in cols.items()}
+        if probs is not None:
+            arrays["probs"] = probs.astype(np.float16)
+        with open(tmp, "wb") as f:
+            np.savez(f, **arrays)
+    os.replace(tmp, final)
+    return final
+
+
+def read_shard(path):
+    """Return ``{column: list}`` for a finished shard."""
+    if path.endswith(".csv"):
+        with open(path, newline="", encoding="utf-8") as f:
+            rows = list(csv.DictReader(f))
+        return {k: [r[k] for r in rows] for k in (rows[0].keys() if rows else [])}
+    if path.endswith(".parquet"):
+        import pyarrow.parquet as pq
+
+        return pq.read_table(path).to_pydict()
+    with np.load(path, allow_pickle=False) as z:
+        return {k: z[k].tolist() for k in z.files if k != "probs"}
+
+
+def existing_shards(out_dir, fmt):
+    shards = []
+    for fn in sorted(os.listdir(out_dir)):
+        m = SHARD_RE.match(fn)
+        if m and m.group(2) == fmt:
+            shards.append((int(m.group(1)), os.path.join(out_dir, fn)))
+        elif fn.endswith(".tmp"):
+            # left behind by a crash mid-write; its images are rescored
+            os.remove(os.path.join(out_dir, fn))
+    return shards
+
+
+def read_errors(out_dir):
+    """Paths recorded as undecodable by earlier runs."""
+    path = os.path.join(out_dir, ERRORS_FILE)
+    if not os.path.exists(path):
+        return set()
+    failed = set()
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                failed.add(json.loads(line)["path"])
+            except (ValueError, KeyError):
+                continue  # partial line from a crash mid-append
+    return failed
+
+
+def record_errors(out_dir, failures):
+    """Append ``[(path, error), ...]`` to the errors file so resumed runs skip them."""
+    if not failures:
+        return
+    with open(os.path.join(out_dir, ERRORS_FILE), "a", encoding="utf-8") as f:
+        for path, err in failures:
+            f.write(json.dumps({"path": path, "error": err}) + "\n")
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def per_class_accuracy(shard_paths):
+    totals, correct = {}, {}
+    for path in shard_paths:
+        cols = read_shard(path)
+        for true, pred in zip(cols.get("true_label", []), cols.get("label", [])):
+            if not true:
+                continue
+            totals[true] = totals.get(true, 0) + 1
+            correct[true] = correct.get(true, 0) + int(true == pred)
+    per_class = {k: {"n": totals[k], "accuracy": correct[k] / totals[k]} for k in sorted(totals)}
+    n = sum(totals.values())
+    overall = sum(correct.values()) / n if n else None
+    return overall, per_class
+
+
+def main(argv=None):
+    p = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    p.add_argument("--images-dir", required=True)
+    p.add_argument("--out-dir", required=True)
+    p.add_argument("--format", choices=("csv", "parquet", "npz"), default="csv")
+    p.add_argument("--batch-size", type=int, default=64)
+    p.add_argument("--shard-size", type=int, default=1024, help="Images per output shard (checkpoint granularity)")
+    p.add_argument("--workers", type=int, default=max(1, (os.cpu_count() or 2) - 1), help="Decode processes")
+    p.add_argument("--top-k", type=int, default=3)
+    p.add_argument("--label-map", default=None, help="CSV folder_name,label for true labels")
+    p.add_argument("--save-probs", action="store_true", help="Also store full probability rows (npz only)")
+    p.add_argument("--limit", type=int, default=0, help="Score at most this many new images (0 = all)")
+    p.add_argument("--retry-errors", action="store_true", help=f"Retry images listed in {ERRORS_FILE}")
+    p.add_argument("--stub-model", action="store_true", help="Use the deterministic benchmark stub model")
+    args = p.parse_args(argv)
+    if args.save_probs and args.format != "npz":
+        p.error("--save-probs needs --format npz")
+
+    sys.path.insert(0, HERE)
+    import app
+    from labels import postprocess_batch, temperature_scale
+
+    if args.stub_model:
+        from benchmarks.stubs import StubModel
+
+        model = StubModel(num_classes=len(app.LABELS))
+    else:
+        model = app.MODEL
+    if model is None:
+        print("Model not loaded in backend.app; use --stub-model for a dry run.")
+        return 3
+    if args.format == "parquet":
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            print("--format parquet needs pyarrow (pip install pyarrow); use csv or npz instead.")
+            return 2
+
+    os.makedirs(args.out_dir, exist_ok=True)
+    shards = existing_shards(args.out_dir, args.format)
+    done = set()
+    for _, path in shards:
+        done.update(read_shard(path).get("path", []))
+    next_index = shards[-1][0] + 1 if shards else 0
+    failed = read_errors(args.out_dir)
+    if args.retry_errors:
+        # a retried image that fails again is simply appended once more
+        failed = set()
+
+    todo = [path for path in find_images(args.images_dir) if path not in done and path not in failed]
+    if args.limit:
+        todo = todo[: args.limit]
+    print(f"{len(done)} images already scored, {len(failed)} known decode failures, {len(todo)} to go")
+
+    T = app.get_calibration_temperature()
+    resolve = folder_label_resolver(app.LABELS, load_label_map(args.label_map) if args.label_map else None)
+    size = (224, 224)
+    chunk = max(8, args.batch_size // 2)
+    groups = [todo[i : i + args.shard_size] for i in range(0, len(todo), args.shard_size)]
+    scored = errors = 0
+    start = time.perf_counter()
+
+    def submit(pool, paths):
+        return [pool.submit(decode_chunk, paths[i : i + chunk], size) for i in range(0, len(paths), chunk)]
+
+    # the app (and TensorFlow) is already imported here, and TensorFlow is not
+    # fork-safe, so decode workers start from a fresh interpreter
+    with ProcessPoolExecutor(max_workers=args.workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+        pending = submit(pool, groups[0]) if groups else []
+        for gi in range(len(groups)):
+            decoded = [row for fut in pending for row in fut.result()]
+            # overlap: decode the next shard while this one runs through the model
+            pending = submit(pool, groups[gi + 1]) if gi + 1 < len(groups) else []
+
+            ok = [(path, arr) for path, arr, err in decoded if err is None]
+            failures = [(path, err) for path, _, err in decoded if err is not None]
+            for path, err in failures:
+                print(f"Failed to decode {path}: {err}")
+            errors += len(failures)
+            if not ok:
+                record_errors(args.out_dir, failures)
+                continue
+
+            paths = [path for path, _ in ok]
+            probs = np.empty((len(ok), len(app.LABEL_REGISTRY)), dtype=np.float32)
+            for b in range(0, len(ok), args.batch_size):
+                batch = np.stack([arr for _, arr in ok[b : b + args.batch_size]])
+                probs[b : b + len(batch)] = model.predict(app.preprocess_batch(batch), verbose=0)
+            scaled = temperature_scale(probs, T)
+            post = postprocess_batch(app.LABEL_REGISTRY, scaled, k=args.top_k)
+            cols = shard_columns(paths, [resolve(path) for path in paths], post, args.top_k)
+            write_shard(args.out_dir, next_index, args.format, cols, scaled if args.save_probs else None)
+            record_errors(args.out_dir, failures)
+            next_index += 1
+            scored += len(ok)
+            elapsed = time.perf_counter() - start
+            print(f"shard {next_index - 1}: {scored}/{len(todo)} images, {scored / elapsed:.1f} img/s")
+
+    elapsed = time.perf_counter() - start
+    all_shards = [path for _, path in existing_shards(args.out_dir, args.format)]
+    overall, per_class = per_class_accuracy(all_shards)
+    summary = {
+        "scored_this_run": scored,
+        "decode_errors": errors,
+        "elapsed_s": elapsed,
+        "images_per_sec": scored / elapsed if elapsed > 0 else 0.0,
+        "temperature": T,
+        "shards": len(all_shards),
+        "accuracy": overall,
+        "per_class_accuracy": per_class,
+    }
+    with open(os.path.join(args.out_dir, "summary.json"), "w", encoding="utf-8") as f:
+        json.dump(summary, f, indent=2)
+
+    print(f"Scored {scored} images in {elapsed:.1f}s ({summary['images_per_sec']:.1f} img/s), {errors} errors")
+    if overall is not None:
+        print(f"Accuracy over labelled images: {overall:.3f}")
+        for lbl, stats in per_class.items():
+            print(f"  {lbl:<60} n={stats['n']:<6} acc={stats['accuracy']:.3f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
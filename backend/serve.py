@@ -0,0 +1,230 @@
+#!/usr/bin/env python3
+"""Production entry point for the backend.
+
+Runs the Flask app under gunicorn with one of three profiles:
+
+  sync     one request at a time per worker, one worker per CPU
+  gthread  fewer workers with a thread pool each; threads overlap
+           Gemini/DB waits with inference (default)
+  async    gevent workers for deployments dominated by Gemini calls
+           (needs ``gevent``; model calls still block the worker)
+
+Workers and TensorFlow intra-op threads are sized together from the CPUs
+this process may use (affinity and cgroup quota), so that workers x
+TF threads roughly equals the CPU count instead of oversubscribing it.
+Every worker warms the model up before it accepts connections. On SIGTERM
+workers stop accepting and in-flight requests get
+``SERVE_GRACEFUL_TIMEOUT_S`` to finish.
+
+Where gunicorn is unavailable (Windows), the app is served by waitress if
+installed, otherwise by Werkzeug's threaded server.
+
+Usage:
+  python serve.py                                  # SERVE_* settings from the environment
+  python serve.py --profile sync --bind 127.0.0.1:8000
+  python serve.py --dry-run                        # print the sizing plan and exit
+  python serve.py --stub-model                     # benchmark stub model, no TensorFlow
+"""
+import argparse
+import json
+import math
+import os
+import sys
+import tempfile
+
+import config
+from admission import threads_to_shed
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+PROFILES = ("sync", "gthread", "async")
+
+
+def available_cpus():
+    """CPUs usable by this process, honouring affinity and a cgroup v2 quota."""
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cpus = os.cpu_count() or 1
+    try:
+        with open("/sys/fs/cgroup/cpu.max", "r") as f:
+            quota, period = f.read().split()[:2]
+        if quota != "max":
+            cpus = min(cpus, max(1, math.ceil(int(quota) / int(period))))
+    except (OSError, ValueError):
+        pass
+    return max(1, cpus)
+
+
+def plan_profile(profile, cpus, workers=0, threads=0, tf_intra=0):
+    """Worker class, worker/thread counts and TensorFlow threads for a profile.
+
+    Explicit (non-zero) ``workers``, ``threads`` and ``tf_intra`` override the
+    sizing; TensorFlow threads default to an equal share of the CPUs per worker.
+    """
+    if profile not in PROFILES:
+        raise ValueError(f"unknown profile {profile!r}; choose from {', '.join(PROFILES)}")
+    if profile == "sync":
+        worker_class, default_workers, default_threads = "sync", cpus, 1
+    elif profile == "gthread":
+        # enough threads for the in-app admission queue to fill up and shed
+        default_threads = threads_to_shed(config.ADMISSION_MAX_IN_FLIGHT, config.ADMISSION_MAX_QUEUE)
+        worker_class, default_workers = "gthread", max(1, cpus // 2)
+    else:
+        worker_class, default_workers, default_threads = "gevent", max(1, cpus // 2), 1
+    workers = workers or default_workers
+    return {
+        "profile": profile,
+        "cpus": cpus,
+        "worker_class": worker_class,
+        "workers": workers,
+        "threads": threads or default_threads,
+        "tf_intra_op_threads": tf_intra or max(1, cpus // workers),
+        "tf_inter_op_threads": 1 if profile != "async" else 2,
+        "admission_max_in_flight": config.ADMISSION_MAX_IN_FLIGHT,
+        "admission_max_queue": config.ADMISSION_MAX_QUEUE,
+    }
+
+
+def admission_warning(plan):
+    """Explain why admission control cannot shed with this plan's threads, or ``None``."""
+    needed = threads_to_shed(plan["admission_max_in_flight"], plan["admission_max_queue"])
+    if plan["worker_class"] == "gevent" or plan["threads"] >= needed:
+        return None
+    return (
+        f"{plan['threads']} thread(s) per worker cannot fill ADMISSION_MAX_IN_FLIGHT="
+        f"{plan['admission_max_in_flight']} + ADMISSION_MAX_QUEUE={plan['admission_max_queue']}; "
+        f"excess requests wait in the socket backlog instead of getting 503 (use {needed} threads)"
+    )
+
+
+def apply_plan(plan):
+    """Make the TensorFlow thread settings visible to workers (forked after this)."""
+    config.TF_INTRA_OP_THREADS = plan["tf_intra_op_threads"]
+    config.TF_INTER_OP_THREADS = plan["tf_inter_op_threads"]
+    os.environ["TF_INTRA_OP_THREADS"] = str(plan["tf_intra_op_threads"])
+    os.environ["TF_INTER_OP_THREADS"] = str(plan["tf_inter_op_threads"])
+    os.environ.setdefault("OMP_NUM_THREADS", str(plan["tf_intra_op_threads"]))
+
+
+def prepare_worker(stub_model=False, stub_latency_ms=0.0, warmup=True):
+    """Import the app in this process, optionally install stubs, and warm up."""
+    if HERE not in sys.path:
+        sys.path.insert(0, HERE)
+    import app as backend
+
+    if stub_model:
+        from benchmarks.stubs import install_stubs
+
+        install_stubs(backend, workdir=os.environ.get("SERVE_STUB_WORKDIR"), model_latency_ms=stub_latency_ms)
+    if warmup:
+        backend.warm_up_model()
+    return backend
+
+
+def run_gunicorn(plan, bind, timeout, graceful_timeout, stub_model, stub_latency_ms, warmup):
+    from gunicorn.app.base import BaseApplication
+
+    def post_worker_init(worker):
+        # runs after load() and before the worker's accept loop starts,
+        # so no request sees a cold model
+        if warmup:
+            sys.modules["app"].warm_up_model()
+
+    def worker_int(worker):
+        worker.log.info("worker %s interrupted", worker.pid)
+
+    def worker_exit(server, worker):
+        backend = sys.modules.get("app")
+        if backend is not None:
+            in_flight = backend.PREDICT_ADMISSION.snapshot().get("in_flight")
+            server.log.info("worker %s exiting with %s predictions in flight", worker.pid, in_flight)
+
+    options = {
+        "bind": bind,
+        "workers": plan["workers"],
+        "worker_class": plan["worker_class"],
+        "threads": plan["threads"],
+        "timeout": timeout,
+        "graceful_timeout": graceful_timeout,
+        "keepalive": 5,
+        # TensorFlow is not fork-safe: each worker loads the model after forking
+        "preload_app": False,
+        "post_worker_init": post_worker_init,
+        "worker_int": worker_int,
+        "worker_exit": worker_exit,
+    }
+
+    class ServeApplication(BaseApplication):
+        def load_config(self):
+            for key, value in options.items():
+                self.cfg.set(key, value)
+
+        def load(self):
+            return prepare_worker(stub_model, stub_latency_ms, warmup=False).app
+
+    ServeApplication().run()
+
+
+def run_fallback(plan, bind, stub_model, stub_latency_ms, warmup):
+    """Single-process server for platforms without gunicorn."""
+    host, _, port = bind.rpartition(":")
+    backend = prepare_worker(stub_model, stub_latency_ms, warmup)
+    try:
+        from waitress import serve
+
+        print(f"Serving with waitress on {bind} ({plan['threads']} threads)")
+        serve(backend.app, host=host or "0.0.0.0", port=int(port), threads=max(plan["threads"], 4))
+    except ImportError:
+        from werkzeug.serving import make_server
+
+        print(f"Serving with Werkzeug's threaded server on {bind} (install gunicorn or waitress for production)")
+        server = make_server(host or "0.0.0.0", int(port), backend.app, threaded=True)
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            server.shutdown()
+
+
+def main(argv=None):
+    p = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    p.add_argument("--profile", choices=PROFILES, default=config.SERVE_PROFILE)
+    p.add_argument("--bind", default=config.SERVE_BIND)
+    p.add_argument("--workers", type=int, default=config.SERVE_WORKERS, help="0 = size from available CPUs")
+    p.add_argument("--threads", type=int, default=config.SERVE_THREADS, help="0 = profile default")
+    p.add_argument("--timeout", type=int, default=config.SERVE_TIMEOUT_S)
+    p.add_argument("--graceful-timeout", type=int, default=config.SERVE_GRACEFUL_TIMEOUT_S)
+    p.add_argument("--no-warmup", action="store_true", help="Accept traffic without warming up the model")
+    p.add_argument("--dry-run", action="store_true", help="Print the sizing plan and exit")
+    p.add_argument("--stub-model", action="store_true", help="Use the deterministic benchmark stub model")
+    p.add_argument("--stub-latency-ms", type=float, default=0.0, help="Simulated cost per stub model call")
+    args = p.parse_args(argv)
+
+    plan = plan_profile(args.profile, available_cpus(), args.workers, args.threads, config.TF_INTRA_OP_THREADS)
+    print(json.dumps(plan))
+    warning = admission_warning(plan)
+    if warning:
+        print(f"Warning: {warning}")
+    if args.dry_run:
+        return 0
+    apply_plan(plan)
+    if args.stub_model:
+        os.environ.setdefault("SERVE_STUB_WORKDIR", tempfile.mkdtemp(prefix="plant-serve-"))
+    warmup = config.SERVE_WARMUP and not args.no_warmup
+
+    try:
+        import gunicorn  # noqa: F401
+    except ImportError:
+        run_fallback(plan, args.bind, args.stub_model, args.stub_latency_ms, warmup)
+        return 0
+    if plan["worker_class"] == "gevent":
+        try:
+            import gevent  # noqa: F401
+        except ImportError:
+            print("The async profile needs gevent (pip install gevent)")
+            return 2
+    run_gunicorn(plan, args.bind, args.timeout, args.graceful_timeout, args.stub_model, args.stub_latency_ms, warmup)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
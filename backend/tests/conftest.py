@@ -0,0 +1,21 @@
+import os
+import sys
+
+import pytest
+
+HERE = os.path.dirname(__file__)
+ROOT = os.path.dirname(HERE)
+sys.path.insert(0, ROOT)
+
+import app as backend
+from benchmarks.stubs import install_stubs
+
+
+@pytest.fixture(autouse=True, scope="session")
+def stub_backend(tmp_path_factory):
+    """Run the API tests against a throwaway DB, and a stub model when TensorFlow is unavailable."""
+    real = backend.MODEL_REGISTRY.active
+    model, client, workdir = install_stubs(backend, workdir=str(tmp_path_factory.mktemp("backend")))
+    if real is not None:
+        backend.MODEL_REGISTRY.activate(real.version)
+    return model, client, workdir
@@ -0,0 +1,66 @@
+import io
+import threading
+
+from PIL import Image
+
+import app as backend
+from admission import AdmissionController, RateLimiter, TokenBucket
+
+
+def upload():
+    buf = io.BytesIO()
+    Image.new("RGB", (224, 224), (60, 140, 70)).save(buf, format="PNG")
+    buf.seek(0)
+    return buf
+
+
+def test_admission_queues_then_sheds():
+    ctl = AdmissionController(max_in_flight=1, max_queue=1, queue_timeout_s=0.05)
+    assert ctl.acquire()[0]
+
+    results = []
+    waiter = threading.Thread(target=lambda: results.append(ctl.acquire()))
+    waiter.start()
+    while ctl.waiting == 0:
+        pass
+    # queue is full: the next caller is rejected immediately
+    assert ctl.acquire() == (False, 0.0, "queue_full")
+    waiter.join()
+    assert results[0][0] is False and results[0][2] == "queue_timeout"
+
+    ctl.release(0.2)
+    admitted, wait_ms, _ = ctl.acquire()
+    assert admitted and wait_ms >= 0
+    assert ctl.retry_after() >= 1
+
+
+def test_token_bucket_refills():
+    bucket = TokenBucket(rate_per_s=1.0, burst=2)
+    now = bucket.updated
+    assert bucket.take(now)[0] and bucket.take(now)[0]
+    allowed, retry = bucket.take(now)
+    assert not allowed and 0 < retry <= 1.0
+    assert bucket.take(now + 1.0)[0]
+
+
+def test_predict_rate_limited_with_retry_after(monkeypatch):
+    monkeypatch.setattr(backend, "RATE_LIMITER", RateLimiter(per_minute=1, burst=1))
+    client = backend.app.test_client()
+    ok = client.post("/api/predict", data={"image": (upload(), "a.png")})
+    assert ok.status_code == 200
+    assert ok.get_json()["timing"]["queue_wait_ms"] >= 0
+    assert "queue;dur=" in ok.headers["Server-Timing"]
+
+    limited = client.post("/api/predict", data={"image": (upload(), "a.png")})
+    assert limited.status_code == 429
+    assert int(limited.headers["Retry-After"]) >= 1
+
+
+def test_predict_sheds_when_saturated(monkeypatch):
+    ctl = AdmissionController(max_in_flight=1, max_queue=0, queue_timeout_s=0.0)
+    monkeypatch.setattr(backend, "PREDICT_ADMISSION", ctl)
+    ctl.acquire()
+    resp = backend.app.test_client().post("/api/predict", data={"image": (upload(), "a.png")})
+    assert resp.status_code == 503
+    assert resp.get_json()["reason"] == "queue_full"
+    assert "Retry-After" in resp.headers
@@ -2,6 +2,7 @@ import io
 import os
 import sys
 import json
+import numpy as np
 from PIL import Image
 
 import pytest
@@ -42,3 +43,47 @@ def test_predict_endpoint_smoke():
     assert "crop" in report
     assert "disease" in report
     assert "status" in report
+
+
+class FixedModel:
+    """Returns the same probability vector for every image."""
+
+    def __init__(self, probs):
+        self.probs = np.asarray(probs, dtype=np.float32)
+
+    def predict(self, x, verbose=0):
+        return np.repeat(self.probs[None, :], len(x), axis=0)
+
+
+def test_hierarchical_mode_limits_enrichment_to_top_crop(monkeypatch):
+    import app as backend
+
+    reg = backend.LABEL_REGISTRY
+    probs = np.full(len(reg), 1e-4)
+    probs[reg.index["Tomato___Early_blight"]] = 0.60
+    probs[reg.index["Tomato___Late_blight"]] = 0.34
+    probs[reg.index["Potato___Early_blight"]] = 0.05
+    monkeypatch.setattr(backend, "MODEL", FixedModel(probs / probs.sum()))
+    lookups = []
+    real_generate_report = backend.generate_report
+
+    def counting_generate_report(label, *args, **kwargs):
+        lookups.append(label)
+        return real_generate_report(label, *args, **kwargs)
+
+    monkeypatch.setattr(backend, "generate_report", counting_generate_report)
+
+    client = app.test_client()
+    flat = client.post("/api/predict?mode=flat", data={"image": (create_test_image(), "t.png")}).get_json()
+    assert [a["label"] for a in flat["alternative_reports"]][-1] == "Potato___Early_blight"
+    assert flat["crop_prediction"]["crop"] == "Tomato"
+    flat_lookups, lookups[:] = len(lookups), []
+
+    hier = client.post("/api/predict?mode=hierarchical", data={"image": (create_test_image(), "t.png")}).get_json()
+    # the remaining tomato classes hold ~0% of the crop, so they get no report
+    assert [a["label"] for a in hier["alternative_reports"]] == ["Tomato___Early_blight", "Tomato___Late_blight"]
+    assert len(lookups) < flat_lookups
+    assert hier["crop_prediction"]["certain"] is True
+    assert hier["crop_probabilities"]["Tomato"] > 90.0
+    assert all(a["label"].startswith("Tomato___") for a in hier["alternative_reports"])
+    assert hier["label"] == "Tomato___Early_blight"
@@ -0,0 +1,137 @@
+import json
+import sqlite3
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+from urllib import request as ureq
+
+import pytest
+
+import app as backend
+from circuit_breaker import CLOSED, HALF_OPEN, OPEN, CallTimeout, CircuitBreaker, CircuitOpenError
+
+REPORT = {"symptoms": ["spots"], "remedy": "r", "prevention": "p", "estimated_recovery": "1w", "organic_treatment": "o"}
+
+
+class FakeGemini:
+    """Local HTTP endpoint whose delay and failures are set per test."""
+
+    def __init__(self):
+        self.delay_s = 0.0
+        self.fail_next = 0
+        self.requests = 0
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                fake.requests += 1
+                time.sleep(fake.delay_s)
+                if fake.fail_next > 0:
+                    fake.fail_next -= 1
+                    self.send_response(500)
+                    self.end_headers()
+                    return
+                body = json.dumps(REPORT).encode()
+                self.send_response(200)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_port}/generate"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def client(self):
+        """Object shaped like the SDK client, calling the fake endpoint over HTTP."""
+
+        def generate_content(model=None, contents=None):
+            req = ureq.Request(self.url, data=b"{}", method="POST")
+            with ureq.urlopen(req, timeout=5) as resp:
+                return SimpleNamespace(text=resp.read().decode())
+
+        return SimpleNamespace(models=SimpleNamespace(generate_content=generate_content))
+
+
+@pytest.fixture
+def fake():
+    server = FakeGemini()
+    yield server
+    server.server.shutdown()
+
+
+def breaker(**kw):
+    opts = dict(failure_threshold=2, reset_timeout_s=0.2, call_timeout_s=0.1, max_retries=0,
+                backoff_base_s=0.001, budget_s=1.0)
+    opts.update(kw)
+    return CircuitBreaker("test", **opts)
+
+
+def test_retries_recover_from_transient_errors(fake):
+    fake.fail_next = 2
+    b = breaker(max_retries=2, failure_threshold=5)
+    resp = b.call(fake.client().models.generate_content, contents="x")
+    assert json.loads(resp.text) == REPORT
+    assert fake.requests == 3
+    assert b.state == CLOSED
+
+
+def test_timeouts_open_breaker_then_half_open_recovers(fake):
+    fake.delay_s = 0.3
+    b = breaker()
+    gen = fake.client().models.generate_content
+    for _ in range(2):
+        with pytest.raises(CallTimeout):
+            b.call(gen)
+    assert b.state == OPEN
+
+    start = time.perf_counter()
+    with pytest.raises(CircuitOpenError):
+        b.call(gen)
+    assert time.perf_counter() - start < 0.05
+
+    fake.delay_s = 0.0
+    time.sleep(0.25)
+    assert b.snapshot()["retry_in_s"] == 0.0
+    b.call(gen)  # half-open trial succeeds
+    assert b.state == CLOSED
+
+
+def test_failed_half_open_trial_reopens(fake):
+    fake.fail_next = 3
+    b = breaker(failure_threshold=1)
+    gen = fake.client().models.generate_content
+    with pytest.raises(Exception):
+        b.call(gen)
+    time.sleep(0.25)
+    assert b.allow_request() and b.state == HALF_OPEN
+    assert not b.allow_request()  # only one trial at a time
+
+
+def test_open_breaker_falls_back_to_local_report(fake, monkeypatch):
+    fake.delay_s = 0.3
+    monkeypatch.setattr(backend, "GEMINI_BREAKER", breaker(reset_timeout_s=30))
+    monkeypatch.setattr(backend, "GEMINI_CLIENT", fake.client())
+    monkeypatch.setattr(backend, "GEMINI_INITIALIZED", True)
+    label = next(lbl for lbl in backend.LABELS if lbl not in backend.DISEASE_DB and "healthy" not in lbl)
+    conn = sqlite3.connect(backend.DB_PATH)
+    conn.execute("DELETE FROM gemini_cache")
+    conn.commit()
+    conn.close()
+
+    for _ in range(2):
+        backend.fetch_disease_info_from_gemini("Breaker crop", "timeout disease")
+    assert backend.GEMINI_BREAKER.state == OPEN
+
+    before = fake.requests
+    start = time.perf_counter()
+    report = backend.generate_report(label, 80.0)
+    assert time.perf_counter() - start < 0.1
+    assert fake.requests == before
+    assert "Follow local extension guidance" in report["remedy"]
+
+    health = backend.app.test_client().get("/api/health").get_json()
+    assert health["gemini"]["state"] == OPEN
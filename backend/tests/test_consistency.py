@@ -0,0 +1,24 @@
+import pytest
+
+import app as backend
+import run_consistency_tests
+
+
+def test_strict_mode_raises_instead_of_random(monkeypatch, tmp_path):
+    monkeypatch.setattr(backend, "MODEL", None)
+    with pytest.raises(backend.InferenceError):
+        backend.predict_image(str(tmp_path / "missing.png"), strict=True)
+    label, _ = backend.predict_image(str(tmp_path / "missing.png"), strict=False)
+    assert label in backend.LABELS
+
+
+def test_harness_records_and_checks_golden(tmp_path):
+    golden = str(tmp_path / "golden.npz")
+    args = ["--synthetic", "12", "--stub-model", "--batch-size", "5", "--golden", golden]
+    assert run_consistency_tests.main(args + ["--update-golden"]) == 0
+    assert run_consistency_tests.main(args) == 0
+
+
+def test_harness_refuses_without_model(monkeypatch):
+    monkeypatch.setattr(backend, "MODEL", None)
+    assert run_consistency_tests.main(["--synthetic", "2"]) == 2
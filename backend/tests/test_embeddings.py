@@ -0,0 +1,122 @@
+import io
+import os
+import sqlite3
+
+import numpy as np
+
+import app as backend
+import config
+from benchmarks.stubs import make_image_bytes
+from embeddings import EmbeddingIndex
+
+
+def clustered(n, dim=32, clusters=20, seed=0):
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(clusters, dim))
+    return (centers[rng.integers(0, clusters, n)] + 0.3 * rng.normal(size=(n, dim))).astype(np.float32)
+
+
+def test_exact_search_and_sharing_between_instances(tmp_path):
+    db, data = str(tmp_path / "e.db"), str(tmp_path / "e.f16")
+    index = EmbeddingIndex(db, data, dim=32)
+    vecs = clustered(300)
+    for i, v in enumerate(vecs):
+        index.add(f"img{i}", v)
+
+    hits = index.search(vecs[7], k=3)
+    assert hits[0][0] == 7 and abs(hits[0][1] - 1.0) < 1e-2
+    assert 7 not in [r for r, _ in index.search(vecs[7], k=3, exclude_rows=(7,))]
+
+    # a second process/worker sees rows written by the first
+    other = EmbeddingIndex(db, data, dim=32)
+    other.add("late", vecs[0])
+    index.sync()
+    assert index.size == 301
+    assert index.ids_for_rows([300]) == {300: "late"}
+
+
+def test_ivf_recall_and_incremental_adds(tmp_path):
+    index = EmbeddingIndex(str(tmp_path / "e.db"), str(tmp_path / "e.f16"), dim=32, ivf_min_rows=10**9, nprobe=4)
+    vecs = clustered(2000)
+    for i, v in enumerate(vecs):
+        index.add(str(i), v)
+    exact = [[r for r, _ in index.search(v, k=10)] for v in vecs[:50]]
+
+    index.train()
+    assert index.centroids is not None
+    approx = [[r for r, _ in index.search(v, k=10)] for v in vecs[:50]]
+    recall = np.mean([len(set(a) & set(e)) / 10 for a, e in zip(approx, exact)])
+    assert recall > 0.8
+
+    row = index.add("new", vecs[3])
+    assert row in [r for r, _ in index.search(vecs[3], k=2)]
+
+
+def test_similar_endpoint(stub_backend, monkeypatch):
+    monkeypatch.setattr(config, "EMBEDDINGS_ENABLED", True)
+    client = backend.app.test_client()
+    ids = []
+    for seed in (0, 0, 1):
+        res = client.post("/api/predict", data={"image": (io.BytesIO(make_image_bytes(seed=seed)), "a.jpg")})
+        ids.append(res.get_json()["id"])
+
+    res = client.get(f"/api/images/{ids[0]}/similar?k=2")
+    assert res.status_code == 200
+    results = res.get_json()["results"]
+    assert results[0]["id"] == ids[1] and results[0]["similarity"] > 0.99
+    assert ids[0] not in [r["id"] for r in results]
+
+    res = client.post("/api/predict?embedding=1", data={"image": (io.BytesIO(make_image_bytes()), "b.jpg")})
+    assert len(res.get_json()["embedding"]) == config.EMBEDDING_DIM
+    assert client.get("/api/images/missing/similar").status_code == 404
+
+
+def test_training_lease_and_rows_added_while_training(tmp_path):
+    db, data = str(tmp_path / "e.db"), str(tmp_path / "e.f16")
+    vecs = clustered(600)
+    other = EmbeddingIndex(db, data, dim=32, ivf_min_rows=10**9)
+
+    class AddsWhileTraining(EmbeddingIndex):
+        def _fit(self, *args, **kwargs):
+            other.add("during", vecs[5])  # another worker inserts before the centroids exist
+            super()._fit(*args, **kwargs)
+
+    index = AddsWhileTraining(db, data, dim=32, ivf_min_rows=10**9)
+    for i, v in enumerate(vecs[:500]):
+        index.add(str(i), v)
+
+    # a live lease held by another worker blocks training; a stale one is broken
+    open(index.lease_path, "w").close()
+    assert index.train() is False and index.centroids is None
+    os.utime(index.lease_path, (0, 0))
+    assert index.train() is True
+    assert not os.path.exists(index.lease_path)
+
+    conn = sqlite3.connect(db)
+    assert conn.execute("SELECT COUNT(*) FROM embeddings WHERE list_id IS NULL").fetchone()[0] == 0
+    conn.close()
+    assert index._unassigned == []
+    during = index.row_of("during")
+    assert any(during in rows for rows in index._lists.values())
+    other.sync()
+    assert other.centroids is not None and other._unassigned == []
+
+
+def test_search_filters_by_model_version_before_ranking(tmp_path):
+    index = EmbeddingIndex(str(tmp_path / "e.db"), str(tmp_path / "e.f16"), dim=32, ivf_min_rows=10**9)
+    vecs = clustered(400)
+    # many old-version rows close to the query, few new-version rows
+    for i, v in enumerate(vecs[:390]):
+        index.add(f"old{i}", vecs[0] + 0.01 * v, model_version="v1")
+    for i, v in enumerate(vecs[390:]):
+        index.add(f"new{i}", v, model_version="v2")
+
+    new_ids = {f"new{i}" for i in range(10)}
+    hits = index.search(vecs[0], k=5, model_version="v2")
+    assert len(hits) == 5 and set(index.ids_for_rows([r for r, _ in hits]).values()) <= new_ids
+    assert index.search(vecs[0], k=5, model_version="missing") == []
+
+    index.train()
+    index.nprobe = len(index.centroids)
+    hits = index.search(vecs[0], k=5, model_version="v2")
+    assert len(hits) == 5 and set(index.ids_for_rows([r for r, _ in hits]).values()) <= new_ids
@@ -0,0 +1,98 @@
+import json
+import sqlite3
+
+import app as backend
+from gemini_batch import parse_batch_response, validate_entry
+
+GOOD = {"symptoms": ["spots"], "remedy": "spray", "prevention": "rotate"}
+
+
+def clear_cache():
+    conn = sqlite3.connect(backend.DB_PATH)
+    conn.execute("DELETE FROM gemini_cache")
+    conn.commit()
+    conn.close()
+
+
+def test_validate_entry():
+    assert validate_entry(dict(GOOD, symptoms="spots"))["symptoms"] == ["spots"]
+    assert validate_entry({"symptoms": [], "remedy": "x", "prevention": "y"}) is None
+    assert validate_entry(dict(GOOD, remedy="")) is None
+    assert validate_entry(dict(GOOD, estimated_recovery=3)) is None
+
+
+def test_partially_malformed_response_keeps_valid_entries():
+    pairs = [("Tomato", "Early blight"), ("Potato", "Late blight"), ("Corn", "Common rust")]
+    text = "```json\n[" + ", ".join([
+        json.dumps(dict(GOOD, crop="tomato", disease="early_blight")),
+        json.dumps({"crop": "Potato", "disease": "Late blight", "symptoms": ""}),
+        json.dumps(dict(GOOD, crop="Corn", disease="Common rust")),
+    ]) + ", {\"crop\": \"trunc"  # cut off mid-array
+    valid, invalid = parse_batch_response(text, pairs)
+    assert set(valid) == {("Tomato", "Early blight"), ("Corn", "Common rust")}
+    assert invalid == 1
+
+
+def test_cold_request_uses_one_batched_prompt(stub_backend, monkeypatch):
+    _, client, _ = stub_backend
+    labels = [lbl for lbl in backend.LABELS if lbl not in backend.DISEASE_DB][:5]
+    clear_cache()
+    before = client.calls
+    found = backend.fetch_disease_info_batch(backend.report_pairs(labels))
+    assert len(found) == 5
+    assert client.calls == before + 1
+
+    # every report is now a cache hit
+    for lbl in labels:
+        backend.generate_report(lbl, 80.0)
+    assert client.calls == before + 1
+
+
+def test_prewarm_endpoint(stub_backend, monkeypatch):
+    import config
+
+    monkeypatch.setattr(config, "ADMIN_TOKEN", "t")
+    monkeypatch.setattr(config, "GEMINI_BATCH_SIZE", 4)
+    clear_cache()
+    _, client, _ = stub_backend
+    before = client.calls
+    resp = backend.app.test_client().post("/api/admin/prewarm", headers={"X-Admin-Token": "t"}).get_json()
+    assert resp["missing"] == 0 and resp["cached"] == resp["requested"]
+    assert client.calls - before == -(-resp["requested"] // 4)
+
+
+def test_labels_missing_from_batch_are_not_fetched_singly(stub_backend, monkeypatch):
+    import io
+    import re
+    from types import SimpleNamespace
+
+    from benchmarks.stubs import make_image_bytes
+
+    _, client, _ = stub_backend
+    clear_cache()
+    kinds = []
+
+    def empty_batch(model=None, contents=None, **kwargs):
+        kinds.append("batch" if re.search(r"^\d+\. crop: ", contents or "", flags=re.M) else "single")
+        return SimpleNamespace(text="[]")
+
+    monkeypatch.setattr(client.models, "generate_content", empty_batch)
+    res = backend.app.test_client().post(
+        "/api/predict", data={"image": (io.BytesIO(make_image_bytes(seed=35)), "a.jpg")}
+    )
+    assert res.status_code == 200
+    assert "batch" in kinds and "single" not in kinds
+
+
+def test_reports_use_the_request_label_registry(stub_backend):
+    from labels import LabelRegistry
+
+    class Snapshot(LabelRegistry):
+        # stands in for a registry whose labels differ from the active one
+        def parts(self, label):
+            return ("Okra", "Leaf_curl")
+
+    snapshot = Snapshot({"Okra___Leaf_curl": 0})
+    assert backend.report_key("Other___label", snapshot) == ("Okra", "Leaf curl")
+    report = backend.generate_report("Other___label", 70.0, {}, snapshot)
+    assert (report["crop"], report["disease"]) == ("Okra", "Leaf curl")
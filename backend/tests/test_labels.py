@@ -0,0 +1,62 @@
+import numpy as np
+
+import app as backend
+from labels import LabelRegistry, postprocess_batch, temperature_scale, top_k, within_crop_alternatives
+
+
+LABELS = {
+    "Tomato___Early_blight": 0,
+    "Tomato___Late_blight": 1,
+    "Tomato___healthy": 2,
+    "Potato___Early_blight": 3,
+}
+
+
+def test_registry_precomputes_label_parts():
+    reg = LabelRegistry(LABELS)
+    assert reg.label(1) == "Tomato___Late_blight"
+    assert reg.label(99) == "unknown"
+    assert reg.crop_names == ["Tomato", "Potato"]
+    assert reg.crop_masks.sum(axis=1).tolist() == [3, 1]
+    assert reg.is_healthy.tolist() == [False, False, True, False]
+    assert reg.disease_name("Tomato___Late_blight") == "Late blight"
+
+
+def test_top_k_matches_full_sort():
+    rng = np.random.default_rng(1)
+    probs = rng.dirichlet(np.ones(38), size=16)
+    idx, vals = top_k(probs, 3)
+    expected = np.argsort(-probs, axis=1)[:, :3]
+    assert np.array_equal(idx, expected)
+    assert np.allclose(vals, np.take_along_axis(probs, expected, axis=1))
+
+
+def test_postprocess_batch_flags():
+    reg = LabelRegistry(LABELS)
+    probs = np.array(
+        [
+            [0.90, 0.05, 0.03, 0.02],  # confident
+            [0.40, 0.35, 0.15, 0.10],  # low top-1, same crop and close -> ambiguous
+            [0.55, 0.03, 0.02, 0.40],  # close gap across crops, not ambiguous
+        ]
+    )
+    post = postprocess_batch(reg, probs)
+    assert post["top_labels"][0, 0] == "Tomato___Early_blight"
+    assert post["low_reason"].tolist() == [None, "top_prediction_low", None]
+    assert post["quality"].tolist() == ["good", "poor", "moderate"]
+    assert post["ambiguous"].tolist() == [False, True, False]
+
+
+def test_temperature_scale_batch_matches_rows():
+    rng = np.random.default_rng(2)
+    probs = rng.dirichlet(np.ones(5), size=4)
+    batch = temperature_scale(probs, 2.0)
+    for i in range(4):
+        assert np.allclose(batch[i], backend.apply_temperature(probs[i], 2.0))
+    assert np.allclose(batch.sum(axis=1), 1.0)
+
+
+def test_within_crop_alternatives_keeps_top_and_substantial_shares():
+    alts = [{"label": "a", "confidence": 60.0}, {"label": "b", "confidence": 30.0}, {"label": "c", "confidence": 3.0}]
+    assert [a["label"] for a in within_crop_alternatives(alts, 93.0, 10.0)] == ["a", "b"]
+    assert [a["label"] for a in within_crop_alternatives(alts, 93.0, 50.0)] == ["a"]
@@ -0,0 +1,89 @@
+import io
+import json
+import sqlite3
+import time
+
+import app as backend
+import config
+from benchmarks.stubs import StubModel, make_image_bytes
+from model_registry import FAILED, READY, ModelRegistry, file_version
+
+
+def write_version(tmp_path, name, labels):
+    model_path, labels_path = tmp_path / f"{name}.h5", tmp_path / f"{name}.json"
+    model_path.write_bytes(name.encode())
+    labels_path.write_text(json.dumps(labels))
+    return str(model_path), str(labels_path)
+
+
+def test_load_activate_rollback_and_shape_check(tmp_path):
+    swaps = []
+    registry = ModelRegistry(loader=lambda path, n: StubModel(num_classes=n), on_activate=swaps.append, keep=2)
+    a = registry.load(*write_version(tmp_path, "a", {"x___y": 0, "x___z": 1}))
+    b = registry.load(*write_version(tmp_path, "b", {"x___y": 0, "x___z": 1, "x___w": 2}))
+    assert a.state == b.state == READY
+    assert registry.active is b and registry.previous is a
+    assert b.version == file_version(str(tmp_path / "b.h5"), str(tmp_path / "b.json"))
+
+    held = registry.active.model  # an in-flight request keeps its model across the swap
+    registry.rollback()
+    assert registry.active is a and held is b.model
+    assert [e.version for e in swaps] == [a.version, b.version, a.version]
+
+    registry.loader = lambda path, n: StubModel(num_classes=n + 1)
+    bad = registry.load(*write_version(tmp_path, "c", {"x___y": 0}))
+    assert bad.state == FAILED and "does not match" in bad.error
+    assert registry.active is a
+
+
+def test_admin_swap_records_version(stub_backend, monkeypatch, tmp_path):
+    monkeypatch.setattr(config, "ADMIN_TOKEN", "t")
+    monkeypatch.setattr(backend.MODEL_REGISTRY, "loader", lambda path, n: StubModel(num_classes=n, seed=1))
+    client = backend.app.test_client()
+    headers = {"X-Admin-Token": "t"}
+    before = backend.MODEL_VERSION
+    model_path, labels_path = write_version(tmp_path, "v2", backend.LABELS)
+
+    res = client.post("/api/admin/models/load", json={"model_path": model_path, "labels_path": labels_path}, headers=headers)
+    assert res.status_code == 202
+    version = res.get_json()["version"]
+    deadline = time.time() + 10
+    while backend.MODEL_VERSION != version and time.time() < deadline:
+        time.sleep(0.01)
+    try:
+        res = client.post("/api/predict", data={"image": (io.BytesIO(make_image_bytes()), "a.jpg")})
+        body = res.get_json()
+        assert body["model_version"] == version
+        conn = sqlite3.connect(backend.DB_PATH)
+        stored = conn.execute("SELECT model_version FROM images WHERE id=?", (body["id"],)).fetchone()[0]
+        conn.close()
+        assert stored == version
+    finally:
+        res = client.post("/api/admin/models/rollback", headers=headers)
+    assert res.status_code == 200
+    assert backend.MODEL_VERSION == before
+    assert backend.MODEL_REGISTRY.snapshot()["active"] == before
+
+
+def test_prepare_runs_before_activation_and_dies_with_the_version(tmp_path):
+    import gc
+    import weakref
+
+    class Derived:
+        pass
+
+    def prepare(entry):
+        assert entry.state != READY and entry.model is not None
+        entry.embedding_model = Derived()
+
+    registry = ModelRegistry(loader=lambda path, n: StubModel(num_classes=n), prepare=prepare, keep=2)
+    labels = {"x___y": 0, "x___z": 1}
+    first = registry.load(*write_version(tmp_path, "a", labels))
+    derived = weakref.ref(first.embedding_model)
+    registry.load(*write_version(tmp_path, "b", labels))
+    registry.load(*write_version(tmp_path, "c", labels))
+
+    assert registry.get(first.version) is None
+    del first
+    gc.collect()
+    assert derived() is None
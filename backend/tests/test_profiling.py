@@ -0,0 +1,74 @@
+import os
+import time
+
+from flask import Flask
+
+import app as backend
+import config
+import profiling
+
+
+def busy_wait(ms):
+    end = time.perf_counter() + ms / 1000.0
+    while time.perf_counter() < end:
+        pass
+
+
+def test_profiled_request_is_downloadable(monkeypatch, tmp_path):
+    monkeypatch.setattr(config, "PROFILE_HEADER_ENABLED", True)
+    monkeypatch.setattr(config, "PROFILE_INTERVAL_MS", 1.0)
+    monkeypatch.setattr(config, "ADMIN_TOKEN", "secret")
+    monkeypatch.setattr(profiling.PROFILE_STORE, "directory", str(tmp_path))
+
+    view_app = Flask(__name__)
+
+    def slow_view():
+        busy_wait(60)
+        return "ok"
+
+    view_app.add_url_rule("/slow", "slow", profiling.profile_request(slow_view))
+    resp = view_app.test_client().get("/slow", headers={"X-Profile": "1", "X-Admin-Token": "secret"})
+    assert resp.status_code == 200
+    profile_id = resp.headers["X-Profile-Id"]
+
+    client = backend.app.test_client()
+    headers = {"X-Admin-Token": "secret"}
+    listed = client.get("/api/admin/profiles", headers=headers).get_json()["profiles"]
+    assert any(p["id"] == profile_id for p in listed)
+
+    collapsed = client.get(f"/api/admin/profiles/{profile_id}?format=collapsed", headers=headers)
+    assert b"busy_wait" in collapsed.data
+
+    speedscope = client.get(f"/api/admin/profiles/{profile_id}", headers=headers).get_json()
+    assert speedscope["profiles"][0]["type"] == "sampled"
+    assert any(f["name"] == "busy_wait" for f in speedscope["shared"]["frames"])
+
+    assert client.get("/api/admin/profiles").status_code == 403
+
+
+def test_disabled_profiling_returns_view_unchanged(monkeypatch):
+    monkeypatch.setattr(config, "PROFILE_HEADER_ENABLED", False)
+    monkeypatch.setattr(config, "PROFILE_SAMPLE_RATE", 0.0)
+
+    def view():
+        return "ok"
+
+    assert profiling.profile_request(view) is view
+
+
+def test_store_is_shared_through_directory(tmp_path):
+    writer = profiling.ProfileStore(str(tmp_path), keep=2)
+    reader = profiling.ProfileStore(str(tmp_path), keep=2)
+    ids = []
+    for i in range(3):
+        meta = {"id": f"{i:032x}", "duration_ms": 10.0 * i}
+        writer.add(meta, {"a;b": 1})
+        os.utime(tmp_path / f"{meta['id']}.json", (i, i))
+        ids.append(meta["id"])
+    writer.add({"id": "f" * 32, "duration_ms": 5.0}, {"a": 1})
+
+    assert [m["id"] for m in reader.list()] == ["f" * 32, ids[2]]
+    assert len(os.listdir(tmp_path)) == 2
+    assert reader.load(ids[2])[1]["a;b"] == 1
+    assert reader.load(ids[0]) is None
+    assert reader.load("../etc/passwd") is None
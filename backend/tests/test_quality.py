@@ -0,0 +1,72 @@
+import io
+
+import numpy as np
+from PIL import Image, ImageFilter
+
+import app as backend
+from metrics import METRICS
+from quality import assess_image, open_thumbnail
+
+
+def leaf_image(size=(224, 224), seed=0):
+    rng = np.random.default_rng(seed)
+    arr = np.zeros((size[1], size[0], 3), dtype=np.uint8)
+    arr[..., 1] = rng.integers(90, 200, size=(size[1], size[0]))
+    arr[..., 0] = rng.integers(20, 80, size=(size[1], size[0]))
+    arr[..., 2] = rng.integers(10, 60, size=(size[1], size[0]))
+    return Image.fromarray(arr)
+
+
+def png(img):
+    buf = io.BytesIO()
+    img.save(buf, format="PNG")
+    buf.seek(0)
+    return buf
+
+
+def test_assess_image_reasons():
+    assert assess_image(leaf_image())["reasons"] == []
+    blurred = leaf_image().filter(ImageFilter.GaussianBlur(8))
+    assert "too_blurry" in assess_image(blurred)["reasons"]
+    dark = Image.fromarray((np.asarray(leaf_image()) // 12).astype(np.uint8))
+    assert "too_dark" in assess_image(dark)["reasons"]
+    gray = leaf_image().convert("L").convert("RGB")
+    assert "not_a_leaf" in assess_image(gray)["reasons"]
+    assert "too_small" in assess_image(leaf_image((40, 40)))["reasons"]
+
+
+def test_reject_mode_skips_model(stub_backend):
+    model = stub_backend[0]
+    calls = model.calls
+    saved = METRICS.get("quality_model_calls_saved")
+    client = backend.app.test_client()
+
+    bad = client.post("/api/predict?quality=reject", data={"image": (png(Image.new("RGB", (224, 224), (5, 5, 5))), "d.png")})
+    assert bad.status_code == 422
+    assert "too_dark" in bad.get_json()["reasons"]
+    assert model.calls == calls
+    assert METRICS.get("quality_model_calls_saved") == saved + 1
+
+    ok = client.post("/api/predict?quality=reject", data={"image": (png(leaf_image()), "l.png")})
+    assert ok.status_code == 200
+    assert ok.get_json()["quality"]["passed"] is True
+
+    # after an accepted prediction, a rejection also counts the report work it skipped
+    lookups = METRICS.get("quality_report_lookups_saved")
+    client.post("/api/predict?quality=reject", data={"image": (png(Image.new("RGB", (224, 224), (5, 5, 5))), "d.png")})
+    per_prediction = METRICS.mean("report_lookups_per_prediction")
+    assert per_prediction >= 1
+    assert METRICS.get("quality_report_lookups_saved") == lookups + per_prediction
+
+
+def test_open_thumbnail_skips_full_decode(tmp_path):
+    path = tmp_path / "big.jpg"
+    leaf_image((200, 150)).resize((2400, 1800)).save(path, quality=90)
+    thumb, original_size = open_thumbnail(str(path))
+    assert original_size == (2400, 1800)
+    assert max(thumb.size) <= 128
+
+    full = assess_image(Image.open(path).convert("RGB"))
+    fast = assess_image(thumb, original_size=original_size)
+    assert fast["width"] == 2400 and fast["reasons"] == full["reasons"] == []
+    assert abs(fast["brightness"] - full["brightness"]) < 2.0
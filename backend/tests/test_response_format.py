@@ -0,0 +1,72 @@
+import gzip
+import io
+import json
+
+import pytest
+
+import app as backend
+from benchmarks.stubs import make_image_bytes
+from response_format import MSGPACK_AVAILABLE, choose_encoding, compact_payload, expand_report, select_fields
+
+
+def test_compact_keeps_each_report_once():
+    shared = {"crop": "Tomato", "disease": "Early blight", "remedy": "Fungicide", "symptoms": ["spots"]}
+    payload = {
+        "label": "Tomato___Early_blight",
+        "confidence": 80.0,
+        "tta": None,
+        "report": dict(shared, confidence=80.0, low_confidence_warning=True),
+        "alternative_reports": [
+            {"label": "Tomato___Early_blight", "confidence": 80.0, "report": dict(shared, confidence=80.0)},
+            {"label": "Tomato___healthy", "confidence": 20.0, "report": {"crop": "Tomato", "confidence": 20.0}},
+        ],
+    }
+    out = compact_payload(payload)
+    assert "alternative_reports" not in out and "tta" not in out
+    assert out["report"] == {"ref": "Tomato___Early_blight", "confidence": 80.0, "low_confidence_warning": True}
+    assert out["reports"]["Tomato___Early_blight"] == shared
+    assert expand_report(out) == payload["report"]
+    unreferenced = compact_payload(dict(payload, alternative_reports=[]))
+    assert unreferenced["report"] == payload["report"]
+    assert select_fields(out, "label,report.ref,missing") == {"label": payload["label"], "report": {"ref": payload["label"]}}
+
+
+def test_choose_encoding():
+    assert choose_encoding("gzip, deflate") in ("gzip", "br")
+    assert choose_encoding("gzip;q=0") is None
+    assert choose_encoding("") is None
+
+
+def test_payload_size_reductions(stub_backend):
+    client = backend.app.test_client()
+
+    def post(query="", headers=None):
+        data = {"image": (io.BytesIO(make_image_bytes()), "a.jpg")}
+        return client.post(f"/api/predict{query}", data=data, headers=headers or {})
+
+    full = post().data
+    compact = post("?compact=1").data
+    compact_gz = post("?compact=1", {"Accept-Encoding": "gzip"})
+    minimal = post("?fields=label,confidence,alternatives").data
+    assert compact_gz.headers["Content-Encoding"] == "gzip"
+    compact_gz_body = compact_gz.data
+    # measured: full 2812 B, compact 2257 B, compact+gzip 915 B (see README)
+    assert json.loads(gzip.decompress(compact_gz_body))["reports"]
+    assert len(compact) < 0.85 * len(full)
+    assert len(compact_gz_body) < 0.4 * len(full)
+    assert set(json.loads(minimal)) == {"label", "confidence", "alternatives"}
+
+    full_body, compact_body = json.loads(full), json.loads(compact)
+    expected = {k: v for k, v in full_body["report"].items() if v is not None}
+    assert expand_report(compact_body) == expected
+
+
+def test_msgpack_format(stub_backend):
+    client = backend.app.test_client()
+    res = client.post("/api/predict?format=msgpack", data={"image": (io.BytesIO(make_image_bytes()), "a.jpg")})
+    if not MSGPACK_AVAILABLE:
+        assert res.status_code == 406
+        return
+    msgpack = pytest.importorskip("msgpack")
+    assert res.headers["Content-Type"] == "application/msgpack"
+    assert msgpack.unpackb(res.data)["label"]
@@ -0,0 +1,49 @@
+import json
+import os
+
+import numpy as np
+import pytest
+from PIL import Image
+
+import score_folder
+
+
+def make_folder(root, per_class=3):
+    rng = np.random.default_rng(0)
+    for cls in ("Tomato___healthy", "Apple Apple scab"):
+        os.makedirs(root / cls, exist_ok=True)
+        for i in range(per_class):
+            arr = rng.integers(0, 256, (64, 80, 3), dtype=np.uint8)
+            Image.fromarray(arr).save(root / cls / f"{i}.jpg")
+    (root / "Tomato___healthy" / "broken.jpg").write_bytes(b"not an image")
+
+
+def test_scores_folder_and_resumes(tmp_path):
+    images, out = tmp_path / "images", tmp_path / "out"
+    make_folder(images)
+    args = ["--images-dir", str(images), "--out-dir", str(out), "--stub-model",
+            "--workers", "1", "--shard-size", "2", "--batch-size", "2", "--format", "npz"]
+
+    assert score_folder.main(args + ["--limit", "3"]) == 0
+    first = sorted(os.listdir(out))
+    assert "part-00000.npz" in first
+
+    assert score_folder.main(args) == 0
+    rows = [score_folder.read_shard(str(out / fn)) for fn in sorted(os.listdir(out)) if fn.endswith(".npz")]
+    paths = [p for r in rows for p in r["path"]]
+    assert len(paths) == len(set(paths)) == 6
+    # folder names resolve to labels, including the normalised "Apple Apple scab"
+    assert {t for r in rows for t in r["true_label"]} == {"Tomato___healthy", "Apple___Apple_scab"}
+    assert os.path.exists(out / "summary.json")
+    assert score_folder.read_errors(str(out)) == {str(images / "Tomato___healthy" / "broken.jpg")}
+
+    # the broken image is checkpointed as a failure, so a third run has nothing to do
+    assert score_folder.main(args) == 0
+    with open(out / "summary.json") as f:
+        summary = json.load(f)
+    assert summary["scored_this_run"] == summary["decode_errors"] == 0
+
+
+def test_save_probs_requires_npz(tmp_path):
+    with pytest.raises(SystemExit):
+        score_folder.main(["--images-dir", str(tmp_path), "--out-dir", str(tmp_path / "out"), "--save-probs"])
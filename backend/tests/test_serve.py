@@ -0,0 +1,128 @@
+import json
+import os
+import signal
+import socket
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+
+import pytest
+
+import config
+from admission import threads_to_shed
+from benchmarks.load import encode_multipart
+from benchmarks.stubs import make_image_bytes
+from serve import admission_warning, main, plan_profile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_plan_sizes_tf_threads_to_cpu_share():
+    sync = plan_profile("sync", 8)
+    assert (sync["workers"], sync["threads"], sync["tf_intra_op_threads"]) == (8, 1, 1)
+    gthread = plan_profile("gthread", 8)
+    threads = threads_to_shed(config.ADMISSION_MAX_IN_FLIGHT, config.ADMISSION_MAX_QUEUE)
+    assert (gthread["workers"], gthread["threads"], gthread["tf_intra_op_threads"]) == (4, threads, 2)
+    assert plan_profile("gthread", 1)["workers"] == 1
+    assert plan_profile("gthread", 8, workers=2, tf_intra=3)["tf_intra_op_threads"] == 3
+    assert plan_profile("async", 4)["worker_class"] == "gevent"
+    with pytest.raises(ValueError):
+        plan_profile("eventlet", 4)
+
+
+def test_dry_run_reports_admission_limits(capsys):
+    assert main(["--profile", "gthread", "--threads", "2", "--dry-run"]) == 0
+    out = capsys.readouterr().out
+    plan = json.loads(out.splitlines()[0])
+    assert plan["admission_max_in_flight"] == config.ADMISSION_MAX_IN_FLIGHT
+    assert plan["admission_max_queue"] == config.ADMISSION_MAX_QUEUE
+    assert "Warning" in out and "socket backlog" in out
+    assert admission_warning(plan_profile("gthread", 4)) is None
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def wait_healthy(url, proc, timeout=60):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"server exited with {proc.returncode}")
+        try:
+            with urllib.request.urlopen(url + "/api/health", timeout=1) as resp:
+                return json.loads(resp.read())
+        except OSError:
+            time.sleep(0.1)
+    raise TimeoutError("server did not become healthy")
+
+
+def test_sigterm_drains_in_flight_prediction():
+    pytest.importorskip("gunicorn")
+    port = free_port()
+    url = f"http://127.0.0.1:{port}"
+    proc = subprocess.Popen(
+        [sys.executable, "serve.py", "--profile", "gthread", "--workers", "1", "--bind", f"127.0.0.1:{port}",
+         "--stub-model", "--stub-latency-ms", "1500", "--graceful-timeout", "10"],
+        cwd=ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        assert wait_healthy(url, proc)["model_version"] == "stub"
+        body, content_type = encode_multipart("image", "a.jpg", make_image_bytes())
+        result = {}
+
+        def slow_request():
+            req = urllib.request.Request(url + "/api/predict", data=body, headers={"Content-Type": content_type})
+            with urllib.request.urlopen(req, timeout=30) as resp:
+                result["status"] = resp.status
+
+        t = threading.Thread(target=slow_request)
+        t.start()
+        time.sleep(0.5)
+        proc.send_signal(signal.SIGTERM)
+        t.join(timeout=30)
+        assert result.get("status") == 200
+        assert proc.wait(timeout=15) == 0
+    finally:
+        if proc.poll() is None:
+            proc.kill()
+
+
+def test_gthread_worker_sheds_beyond_admission_queue():
+    pytest.importorskip("gunicorn")
+    port = free_port()
+    url = f"http://127.0.0.1:{port}"
+    env = dict(os.environ, ADMISSION_MAX_IN_FLIGHT="1", ADMISSION_MAX_QUEUE="1", ADMISSION_QUEUE_TIMEOUT_S="10", SERVE_THREADS="0")
+    proc = subprocess.Popen(
+        [sys.executable, "serve.py", "--profile", "gthread", "--workers", "1", "--bind", f"127.0.0.1:{port}",
+         "--stub-model", "--stub-latency-ms", "1000"],
+        cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        wait_healthy(url, proc)
+        body, content_type = encode_multipart("image", "a.jpg", make_image_bytes())
+        statuses = []
+
+        def post():
+            req = urllib.request.Request(url + "/api/predict", data=body, headers={"Content-Type": content_type})
+            try:
+                with urllib.request.urlopen(req, timeout=30) as resp:
+                    statuses.append(resp.status)
+            except urllib.error.HTTPError as e:
+                statuses.append(e.code)
+
+        threads = [threading.Thread(target=post) for _ in range(4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join(timeout=30)
+        # one in flight, one queued, the rest shed by the app rather than stuck in the backlog
+        assert sorted(statuses) == [200, 200, 503, 503]
+    finally:
+        proc.terminate()
+        proc.wait(timeout=30)
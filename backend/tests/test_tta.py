@@ -0,0 +1,46 @@
+import io
+
+import numpy as np
+from PIL import Image
+
+import app as backend
+import config
+from metrics import METRICS
+from tta import TTACostModel, plan_views, run_tta
+
+
+def upload():
+    buf = io.BytesIO()
+    rng = np.random.default_rng(3)
+    Image.fromarray(rng.integers(0, 256, (224, 224, 3), dtype=np.uint8)).save(buf, format="PNG")
+    buf.seek(0)
+    return buf
+
+
+def test_plan_views_respects_budget():
+    assert plan_views(100, 30, 6) == 3
+    assert plan_views(100, 30, 2) == 2
+    assert plan_views(10, 30, 6) == 0
+
+
+def test_run_tta_batches_views_in_one_call(stub_backend):
+    model = stub_backend[0]
+    img = Image.new("RGB", (256, 256), (40, 140, 60))
+    base = model.predict(backend.preprocess_images([img]))[0]
+    calls = model.calls
+    probs, info = run_tta(model, img, base, backend.preprocess_images, 1.0, 1000, 4, cost_model=TTACostModel())
+    assert model.calls == calls + 1
+    assert len(info["views"]) == 4
+    assert np.isclose(probs.sum(), 1.0, atol=1e-5)
+
+
+def test_predict_reports_tta_on_low_confidence(monkeypatch):
+    monkeypatch.setattr(config, "LOW_CONFIDENCE_THRESHOLD", 101.0)  # force low confidence
+    monkeypatch.setattr(config, "TTA_MAX_EXTRA_MS", 10_000.0)
+    before = METRICS.get("tta_applied")
+    j = backend.app.test_client().post("/api/predict?tta=1", data={"image": (upload(), "u.png")}).get_json()
+    assert j["tta"]["applied"] is True
+    assert isinstance(j["tta"]["top1_changed"], bool)
+    assert METRICS.get("tta_applied") == before + 1
+    stats = backend.app.test_client().get("/api/metrics").get_json()["tta"]
+    assert stats["applied"] >= 1
@@ -0,0 +1,102 @@
+import base64
+import io
+import os
+import re
+import tracemalloc
+
+import numpy as np
+import pytest
+from PIL import Image
+
+import app as backend
+import config
+from benchmarks.stubs import make_image_bytes
+from uploads import UploadTooLarge, check_image, receive_upload
+
+
+def data_url(raw, ext="png"):
+    return f"data:image/{ext};base64," + base64.b64encode(raw).decode()
+
+
+def legacy_receive(request, upload_dir):
+    """The pre-streaming base64 path: whole field string, regex, full decode, write."""
+    m = re.match(r"data:image/(.+);base64,(.*)$", request.form["image"].strip())
+    content = base64.b64decode(m.group(2))
+    path = os.path.join(upload_dir, "legacy." + m.group(1))
+    with open(path, "wb") as f:
+        f.write(content)
+    return path
+
+
+def field_multipart(name, value):
+    boundary = "testboundary"
+    body = (
+        f"--{boundary}\r\nContent-Disposition: form-data; name=\"{name}\"\r\n\r\n{value}\r\n--{boundary}--\r\n"
+    ).encode()
+    return body, f"multipart/form-data; boundary={boundary}"
+
+
+def peak_bytes(fn):
+    tracemalloc.start()
+    try:
+        fn()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def test_streaming_base64_peak_memory(tmp_path):
+    raw = np.random.default_rng(0).bytes(6 * 1024 * 1024)
+    body, content_type = field_multipart("image", data_url(raw))
+
+    def run(receive):
+        with backend.app.test_request_context("/api/predict", method="POST", data=body, content_type=content_type):
+            from flask import request
+
+            return receive(request)
+
+    legacy = peak_bytes(lambda: run(lambda r: legacy_receive(r, str(tmp_path))))
+    streaming = peak_bytes(lambda: run(lambda r: receive_upload(r, str(tmp_path), 10 * 1024 * 1024)))
+    # measured for this 8 MB body: ~24 MB legacy, ~0.3 MB streaming
+    assert legacy > 2 * len(raw)
+    assert streaming < 0.25 * legacy
+    assert streaming < 1024 * 1024
+
+    path, _ = run(lambda r: receive_upload(r, str(tmp_path), 10 * 1024 * 1024))
+    with open(path, "rb") as f:
+        assert f.read() == raw
+
+
+def test_limits(tmp_path, monkeypatch):
+    client = backend.app.test_client()
+    big = make_image_bytes((256, 256), fmt="PNG")
+
+    monkeypatch.setattr(config, "MAX_UPLOAD_BYTES", len(big) - 1)
+    res = client.post("/api/predict", data={"image": data_url(big)})
+    assert res.status_code == 413
+    assert not [f for f in os.listdir(backend.UPLOAD_FOLDER) if f.endswith(".part")]
+    monkeypatch.undo()
+
+    monkeypatch.setitem(backend.app.config, "MAX_CONTENT_LENGTH", 1000)
+    res = client.post("/api/predict", data=big, content_type="image/png")
+    assert res.status_code == 413
+    monkeypatch.undo()
+
+    res = client.post("/api/predict", data={"image": (io.BytesIO(b"not an image"), "x.png")})
+    assert res.status_code == 422
+
+    path = tmp_path / "wide.png"
+    Image.new("RGB", (4000, 4000)).save(path)
+    with pytest.raises(UploadTooLarge):
+        check_image(str(path), 1000 * 1000)
+    assert client.post("/api/predict", data={"image": "data:text/plain;base64,aGk="}).status_code == 422
+
+
+def test_raw_body_and_data_url_field(stub_backend):
+    client = backend.app.test_client()
+    raw = make_image_bytes()
+    res = client.post("/api/predict", data=raw, content_type="image/jpeg")
+    assert res.status_code == 200
+    res = client.post("/api/predict", data={"image": data_url(raw, "jpeg")})
+    assert res.status_code == 200
+    assert res.get_json()["filename"].endswith(".jpeg")
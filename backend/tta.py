@@ -0,0 +1,85 @@
+"""Test-time augmentation (TTA) for low-confidence predictions.
+
+Extra views of the upload (flips, centre crops, zoom) go through the model
+in one batched ``predict`` call. Their raw probabilities are averaged with
+the original prediction before temperature scaling. The number of views is
+capped so the estimated extra model time stays within ``TTA_MAX_EXTRA_MS``.
+"""
+import threading
+import time
+
+import numpy as np
+from PIL import Image, ImageOps
+
+
+def _center_crop(img, fraction):
+    w, h = img.size
+    cw, ch = max(1, int(w * fraction)), max(1, int(h * fraction))
+    left, top = (w - cw) // 2, (h - ch) // 2
+    return img.crop((left, top, left + cw, top + ch))
+
+
+# Ordered by how much they usually help on field photos; the first N are used.
+AUGMENTATIONS = (
+    ("hflip", ImageOps.mirror),
+    ("crop_90", lambda im: _center_crop(im, 0.9)),
+    ("vflip", ImageOps.flip),
+    ("crop_75", lambda im: _center_crop(im, 0.75)),
+    ("hflip_crop_90", lambda im: ImageOps.mirror(_center_crop(im, 0.9))),
+    ("rot90", lambda im: im.transpose(Image.Transpose.ROTATE_90)),
+)
+
+
+class TTACostModel:
+    """Running estimate of the per-view cost of a batched TTA call."""
+
+    def __init__(self, smoothing=0.3):
+        self._per_view_ms = None
+        self._smoothing = smoothing
+        self._lock = threading.Lock()
+
+    def estimate(self, single_call_ms):
+        # before any TTA run, assume a view costs as much as a single-image call
+        with self._lock:
+            return self._per_view_ms if self._per_view_ms is not None else single_call_ms
+
+    def update(self, elapsed_ms, views):
+        per_view = elapsed_ms / max(views, 1)
+        with self._lock:
+            if self._per_view_ms is None:
+                self._per_view_ms = per_view
+            else:
+                self._per_view_ms += self._smoothing * (per_view - self._per_view_ms)
+
+
+COST_MODEL = TTACostModel()
+
+
+def plan_views(budget_ms, per_view_ms, max_views):
+    """How many augmented views fit in the time budget."""
+    if budget_ms <= 0 or max_views <= 0:
+        return 0
+    if per_view_ms <= 0:
+        return min(max_views, len(AUGMENTATIONS))
+    return int(min(max_views, len(AUGMENTATIONS), budget_ms // per_view_ms))
+
+
+def run_tta(model, img, base_probs, preprocess, single_call_ms, budget_ms, max_views, cost_model=COST_MODEL):
+    """Average ``base_probs`` with predictions on augmented views of ``img``.
+
+    ``preprocess`` turns a list of PIL images into a model-ready batch.
+    Returns ``(probs, info)``. ``probs`` is ``base_probs`` unchanged when no
+    view fits in the budget. ``info`` holds the views used and the time spent.
+    """
+    n = plan_views(budget_ms, cost_model.estimate(single_call_ms), max_views)
+    if n < 1:
+        return base_probs, {"applied": False, "reason": "over_budget", "views": []}
+
+    start = time.perf_counter()
+    names = [name for name, _ in AUGMENTATIONS[:n]]
+    batch = preprocess([fn(img) for _, fn in AUGMENTATIONS[:n]])
+    preds = np.asarray(model.predict(batch, verbose=0), dtype=np.float64)
+    averaged = np.vstack([np.asarray(base_probs, dtype=np.float64)[None, :], preds]).mean(axis=0)
+    elapsed_ms = (time.perf_counter() - start) * 1000.0
+    cost_model.update(elapsed_ms, n)
+    return averaged, {"applied": True, "views": names, "extra_ms": elapsed_ms}
@@ -0,0 +1,216 @@
+"""Memory-bounded upload handling for ``/api/predict``.
+
+The image goes to disk in fixed-size chunks. Base64 data URLs are decoded
+as they arrive, so a request holds about one chunk in memory no matter
+how large the upload is. Accepted bodies:
+
+- ``multipart/form-data`` with an ``image`` file part, or with an
+  ``image`` field holding a ``data:image/...;base64,`` URL
+- ``application/x-www-form-urlencoded`` with an ``image`` data URL field
+  (Werkzeug buffers this one, within ``MAX_FORM_MEMORY_SIZE``)
+- a raw ``image/*`` or ``application/octet-stream`` body
+
+Size limits are enforced while streaming. ``check_image`` then reads only
+the image header to reject decompression bombs before decoding.
+"""
+import base64
+import binascii
+import os
+import re
+import uuid
+
+from PIL import Image
+from werkzeug.exceptions import RequestEntityTooLarge
+from werkzeug.sansio.multipart import Data, Epilogue, Field, File, MultipartDecoder, NeedData
+from werkzeug.utils import secure_filename
+
+CHUNK_SIZE = 64 * 1024
+DATA_URL_RE = re.compile(rb"^\s*data:image/([\w.+-]+);base64,")
+MAX_DATA_URL_HEADER = 128
+
+
+class UploadError(ValueError):
+    """The upload cannot be used; ``status`` is the HTTP status to return."""
+
+    status = 400
+
+
+class UploadTooLarge(UploadError):
+    status = 413
+
+
+class ImageRejected(UploadError):
+    status = 422
+
+
+class _LimitedFile:
+    """Binary file that refuses to grow past ``max_bytes``."""
+
+    def __init__(self, path, max_bytes):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.written = 0
+        self._f = open(path, "wb")
+
+    def write(self, data):
+        self.written += len(data)
+        if self.written > self.max_bytes:
+            raise UploadTooLarge(f"image exceeds {self.max_bytes} bytes")
+        self._f.write(data)
+
+    def close(self):
+        self._f.close()
+
+
+class _DataURLDecoder:
+    """Incrementally decodes a ``data:image/<ext>;base64,`` URL into ``out``."""
+
+    def __init__(self, out):
+        self.out = out
+        self.ext = None
+        self._head = b""
+        self._pending = b""
+
+    def write(self, chunk):
+        if self.ext is None:
+            self._head += chunk
+            match = DATA_URL_RE.match(self._head)
+            if match is None:
+                if len(self._head) > MAX_DATA_URL_HEADER or b"," in self._head:
+                    raise ImageRejected("image field is not a base64 data:image URL")
+                return
+            self.ext = match.group(1).decode().split("/")[-1]
+            chunk, self._head = self._head[match.end():], b""
+        data = self._pending + chunk.translate(None, b" \t\r\n")
+        usable = len(data) - len(data) % 4
+        self._pending = data[usable:]
+        if usable:
+            self._decode(data[:usable])
+
+    def _decode(self, data):
+        try:
+            self.out.write(base64.b64decode(data, validate=True))
+        except binascii.Error as e:
+            raise ImageRejected(f"invalid base64 image data: {e}")
+
+    def close(self):
+        if self.ext is None:
+            raise ImageRejected("image field is not a base64 data:image URL")
+        if self._pending:
+            self._decode(self._pending + b"=" * (-len(self._pending) % 4))
+
+
+def _read_chunks(stream):
+    try:
+        while True:
+            chunk = stream.read(CHUNK_SIZE)
+            if not chunk:
+                return
+            yield chunk
+    except RequestEntityTooLarge:
+        raise UploadTooLarge("request body too large")
+
+
+def _multipart_image(stream, boundary):
+    """Yield ``(kind, filename)`` once for the ``image`` part, then its data chunks."""
+    decoder = MultipartDecoder(boundary.encode())
+    current = None
+    ended = False
+    chunks = _read_chunks(stream)
+    while True:
+        event = decoder.next_event()
+        if isinstance(event, NeedData):
+            if ended:
+                raise UploadError("truncated multipart body")
+            data = next(chunks, None)
+            ended = data is None
+            decoder.receive_data(data)
+        elif isinstance(event, (File, Field)):
+            current = event.name
+            if current == "image":
+                yield ("file", event.filename) if isinstance(event, File) else ("field", None)
+        elif isinstance(event, Data):
+            if current == "image" and event.data:
+                yield event.data
+            if current == "image" and not event.more_data:
+                return
+        elif isinstance(event, Epilogue):
+            return
+
+
+def receive_upload(request, upload_dir, max_bytes):
+    """Write the request's image to ``upload_dir``; returns ``(path, filename)``.
+
+    Raises ``UploadError`` (413 for size limits) and removes any partial file.
+    """
+    if request.content_length is not None and request.max_content_length is not None \
+            and request.content_length > request.max_content_length:
+        raise UploadTooLarge("request body too large")
+
+    mimetype = request.mimetype
+    if mimetype == "multipart/form-data":
+        boundary = request.mimetype_params.get("boundary")
+        if not boundary:
+            raise UploadError("multipart body without boundary")
+        parts = _multipart_image(request.stream, boundary)
+        first = next(parts, None)
+        if first is None:
+            raise UploadError("no image provided")
+        kind, original = first
+        chunks = parts
+    elif mimetype == "application/x-www-form-urlencoded":
+        try:
+            value = request.form.get("image")
+        except RequestEntityTooLarge:
+            raise UploadTooLarge("form field too large")
+        if value is None:
+            raise UploadError("no image provided")
+        kind, original = "field", None
+        chunks = (value[i : i + CHUNK_SIZE].encode("ascii", "replace") for i in range(0, len(value), CHUNK_SIZE))
+    elif mimetype.startswith("image/") or mimetype == "application/octet-stream":
+        kind, original = "file", request.headers.get("X-Filename") or f"upload.{mimetype.split('/')[-1]}"
+        chunks = _read_chunks(request.stream)
+    else:
+        raise UploadError("no image provided")
+
+    tmp_path = os.path.join(upload_dir, f".{uuid.uuid4().hex}.part")
+    out = _LimitedFile(tmp_path, max_bytes)
+    try:
+        writer = _DataURLDecoder(out) if kind == "field" else out
+        for chunk in chunks:
+            writer.write(chunk)
+        if kind == "field":
+            writer.close()
+            fname = f"{uuid.uuid4().hex}.{secure_filename(writer.ext) or 'png'}"
+        else:
+            fname = f"{uuid.uuid4().hex}_{secure_filename(original or '') or 'upload'}"
+        out.close()
+        if out.written == 0:
+            raise UploadError("empty image")
+        path = os.path.join(upload_dir, fname)
+        os.replace(tmp_path, path)
+        return path, fname
+    except BaseException:
+        out.close()
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+def check_image(path, max_pixels):
+    """Read the image header and reject undecodable or oversized (pixel count) images.
+
+    Returns ``(width, height)``. Nothing is decompressed here.
+    """
+    try:
+        with Image.open(path) as img:
+            width, height = img.size
+    except Image.DecompressionBombError as e:
+        raise UploadTooLarge(str(e))
+    except Exception:
+        raise ImageRejected("file is not a decodable image")
+    if max_pixels and width * height > max_pixels:
+        raise UploadTooLarge(f"image is {width}x{height}; the limit is {max_pixels} pixels")
+    return width, height